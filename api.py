@@ -1,11 +1,26 @@
 import io
 import os
+import asyncio
+import re
+import json
+import time
 import base64
+import hashlib
+import threading
+import uuid
+import tracemalloc
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import asynccontextmanager
+from functools import partial
+from datetime import datetime
 import torch
 import torch.nn.functional as F
-from fastapi import FastAPI, File, UploadFile
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, File, Form, HTTPException, Query, UploadFile
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
+from pydantic import BaseModel, Field
 from monai.transforms import LoadImage, EnsureChannelFirst, Resize, NormalizeIntensity
 from pytorch_grad_cam import GradCAM
 from pytorch_grad_cam.utils.image import show_cam_on_image
@@ -14,43 +29,120 @@ from PIL import Image
 
 from fastapi.middleware.cors import CORSMiddleware
 
+from utils import (history_export, history_store, memory, metrics, model_registry, profiling, reports,
+                   runtime, scheduler)
+
 # ------------------------
 # Config
 # ------------------------
-DEVICE = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+# serve.py imports this module and then forks, and CUDA state does not survive fork:
+# when preloaded the models stay on the CPU and CUDA is never even queried
+if os.environ.get("EARSCOPE_PRELOAD") == "1":
+    DEVICE = torch.device("cpu")
+else:
+    DEVICE = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 CLASS_NAMES_STAGE1 = ["Normal", "Abnormal", "Earwax"]
 CLASS_NAMES_STAGE2 = ["AOM", "COM"]
 
-MODEL_STAGE1_PATH = "3OM_86_mobilenet_model.pth"
-MODEL_STAGE2_PATH = "AOM_COM_MODEL.pth"
-OUTPUT_DIR = "outputs"
+MODEL_STAGE1_PATH = os.environ.get("EARSCOPE_MODEL_STAGE1", "3OM_86_mobilenet_model.pth")
+MODEL_STAGE2_PATH = os.environ.get("EARSCOPE_MODEL_STAGE2", "AOM_COM_MODEL.pth")
+# POST /models only loads files from this directory. The active version is recorded
+# in MODEL_STATE so restarted and sibling serve.py workers follow swaps.
+MODEL_DIR = os.environ.get("EARSCOPE_MODEL_DIR", os.path.dirname(os.path.abspath(MODEL_STAGE1_PATH)))
+MODEL_STATE = os.environ.get("EARSCOPE_MODEL_STATE", "model_state.json")
+OUTPUT_DIR = os.environ.get("EARSCOPE_OUTPUT_DIR", "outputs")
+HISTORY_DB = os.environ.get("EARSCOPE_HISTORY_DB", "history.db")
+
+# Resized inputs are retained per analysis so cases can be re-scored without re-upload
+CASE_DIR = os.environ.get("EARSCOPE_CASE_DIR", "cases")
+RETAIN_CASES = os.environ.get("EARSCOPE_RETAIN_CASES", "1") == "1"
+REPROCESS_BATCH_SIZE = 16
+
+# Inference slots are shared between these queues (see utils/scheduler.py): under
+# contention interactive /predict gets `weight` slots for each one /batch_predict
+# gets. Requests beyond max_pending are shed with 503 and those beyond a client's
+# client_limit or an address's address_limit get 429; both carry Retry-After. A
+# client is its address plus the optional X-Client-ID header, which only divides
+# that address's allowance between sessions (the UI sends one per browser session,
+# all from the UI server's address). These limits are advisory, for fair sharing
+# between cooperating callers: the header is unauthenticated, callers behind one
+# proxy or NAT share an address, and nothing stops a caller spreading over several.
+SCHEDULER_QUEUES = {
+    "interactive": {"weight": 8, "max_pending": 64, "client_limit": 4, "address_limit": 16},
+    "bulk": {"weight": 1, "max_pending": 16, "client_limit": 4, "address_limit": 8},
+}
+SCHEDULED_PATHS = {"/predict": "interactive", "/batch_predict": "bulk", "/reprocess": "bulk"}
+
+# Images per warmup batch; above 1 the batched /reprocess shapes are warmed up too
+WARMUP_BATCH = int(os.environ.get("EARSCOPE_WARMUP_BATCH", "1"))
+
+# Torch thread pools, core pinning and executor sizes (see utils/runtime.py).
+# serve.py preloads this module and applies them in each forked worker instead.
+RUNTIME = runtime.load_settings()
+if os.environ.get("EARSCOPE_PRELOAD") != "1":
+    runtime.apply(RUNTIME)
+
+# Rendered PDF reports, cached on disk by a hash of the results they contain
+REPORT_DIR = os.environ.get("EARSCOPE_REPORT_DIR", "reports")
+REPORT_WORKERS = RUNTIME["report_workers"]
+REPORT_CACHE_MAX = 200
+REPORT_MAX_CASES = 500  # per PDF; the UI splits larger batches into several reports
+
+# Opt-in profiling: requests slower than the threshold keep their profile on disk.
+# Covers the event loop and the inference executor, not Starlette's threadpool.
+PROFILE_REQUESTS = os.environ.get("EARSCOPE_PROFILE", "0") == "1"
+PROFILE_TORCH = os.environ.get("EARSCOPE_PROFILE_TORCH", "0") == "1"
+PROFILE_THRESHOLD = float(os.environ.get("EARSCOPE_PROFILE_THRESHOLD", "5"))
+PROFILE_PATHS = os.environ.get("EARSCOPE_PROFILE_PATHS", "/predict,/batch_predict").split(",")
+PROFILE_DIR = os.environ.get("EARSCOPE_PROFILE_DIR", "profiles")
+PROFILE_KEEP = int(os.environ.get("EARSCOPE_PROFILE_KEEP", "20"))
+
+# tracemalloc adds Python/numpy allocation peaks per stage to /metrics, at a CPU cost
+MEMORY_TRACE = os.environ.get("EARSCOPE_MEMORY_TRACE", "0") == "1"
+if MEMORY_TRACE:
+    tracemalloc.start()
 
 os.makedirs(OUTPUT_DIR, exist_ok=True)
+os.makedirs(CASE_DIR, exist_ok=True)
+os.makedirs(REPORT_DIR, exist_ok=True)
+if PROFILE_REQUESTS:
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+history_store.init_db(HISTORY_DB)
 
 # ------------------------
 # Load Models
 # ------------------------
-model_stage1 = torch.load(MODEL_STAGE1_PATH, map_location=DEVICE)
-model_stage1.eval()
-target_layers_stage1 = [model_stage1.features[-1]]
+# Versions are loaded, warmed up and swapped through the registry (see /models);
+# every result is tagged with the version that produced it
+def load_model(path):
+    # The files are whole pickled modules, which torch >= 2.6 refuses by default. Only
+    # files the operator put in MODEL_DIR are ever loaded (see model_path)
+    model = torch.load(path, map_location=DEVICE, weights_only=False)
+    model.eval()
+    return model
 
-model_stage2 = torch.load(MODEL_STAGE2_PATH, map_location=DEVICE)
-model_stage2.eval()
-target_layers_stage2 = [model_stage2.features[-1]]
+def target_layers(model):
+    return [model.features[-1]]
 
 # ------------------------
 # Preprocessing
 # ------------------------
-def preprocess_image(image_bytes):
+def load_resized(image_bytes):
     # Open with PIL directly from bytes
     pil_img = Image.open(io.BytesIO(image_bytes)).convert("RGB")
     img_np = np.array(pil_img)
+    del pil_img  # full-resolution decode; not needed once copied
 
     # Make channels-first (C, H, W)
     img = np.transpose(img_np, (2, 0, 1))
 
-    # MONAI transforms but applied to numpy arrays
-    img = Resize((500, 500))(img)
+    # MONAI transforms but applied to numpy arrays. Rounding back to 8-bit levels makes
+    # the input reproducible from a 500x500 PNG: the retained case image and client-side
+    # downscaling (utils/image_prep.area_resize) both feed the models identical tensors
+    resized = np.asarray(Resize((500, 500))(img))
+    return np.clip(np.rint(resized), 0, 255).astype(np.float32)
+
+def normalize_to_tensor(img):
     img = NormalizeIntensity()(img)
 
     # To tensor
@@ -58,17 +150,43 @@ def preprocess_image(image_bytes):
 
     return img, img_tensor  # img is (C,H,W) numpy, used for visualization
 
+def preprocess_image(image_bytes):
+    return normalize_to_tensor(load_resized(image_bytes))
+
+# ------------------------
+# Case Storage
+# ------------------------
+def save_case_image(resized, analysis_id):
+    """Keep the resized input as a lossless uint8 PNG (~0.5 MB vs multi-MB originals)"""
+    arr = np.clip(np.rint(np.asarray(resized)), 0, 255).astype(np.uint8)
+    Image.fromarray(np.transpose(arr, (1, 2, 0))).save(os.path.join(CASE_DIR, f"{analysis_id}.png"))
+
+def load_case_image(analysis_id):
+    """Return the stored (C,H,W) input for an analysis, or None if it was not retained"""
+    path = os.path.join(CASE_DIR, f"{analysis_id}.png")
+    if not os.path.exists(path):
+        return None
+    img_np = np.array(Image.open(path).convert("RGB"))
+    return np.transpose(img_np, (2, 0, 1)).astype(np.float32)
+
 
 
 # ------------------------
 # Grad-CAM Generator
 # ------------------------
 def generate_gradcam(model, target_layers, input_tensor, orig_img_np):
-    cam = GradCAM(model=model, target_layers=target_layers)
-    grayscale_cam = cam(input_tensor=input_tensor)[0, :]
-    orig_img_norm = (orig_img_np - orig_img_np.min()) / (orig_img_np.max() - orig_img_np.min())
-    overlay = show_cam_on_image(orig_img_norm.astype(np.float32), grayscale_cam, use_rgb=True)
-    return overlay
+    return generate_gradcam_batch(model, target_layers, input_tensor, [orig_img_np])[0]
+
+def generate_gradcam_batch(model, target_layers, input_tensor, orig_imgs):
+    """One Grad-CAM pass over an (N,C,H,W) batch; orig_imgs are the matching (H,W,C) arrays"""
+    # The context manager removes the hooks holding activations and gradients
+    with GradCAM(model=model, target_layers=target_layers) as cam:
+        grayscale_cams = cam(input_tensor=input_tensor)
+    overlays = []
+    for orig_img_np, grayscale_cam in zip(orig_imgs, grayscale_cams):
+        orig_img_norm = (orig_img_np - orig_img_np.min()) / (orig_img_np.max() - orig_img_np.min())
+        overlays.append(show_cam_on_image(orig_img_norm.astype(np.float32), grayscale_cam, use_rgb=True))
+    return overlays
 
 def encode_image_to_base64(img_np):
     pil_img = Image.fromarray(img_np.astype(np.uint8))
@@ -92,10 +210,40 @@ def get_referral(stage1_class, stage1_confidence):
     else:
         return "No Referral"
 
+# ------------------------
+# Metrics
+# ------------------------
+metrics.register("earscope_request_peak_rss_bytes", "histogram",
+                 "Peak resident set size sampled during a prediction request", metrics.BYTES_BUCKETS)
+metrics.register("earscope_request_rss_growth_bytes", "histogram",
+                 "Growth of resident set size over a prediction request", metrics.BYTES_BUCKETS)
+metrics.register("earscope_stage_alloc_peak_bytes", "gauge",
+                 "Largest tracemalloc peak seen per pipeline stage (EARSCOPE_MEMORY_TRACE=1)")
+metrics.register("earscope_process_rss_bytes", "gauge", "Current resident set size")
+metrics.register("earscope_process_max_rss_bytes", "gauge", "Peak resident set size since start")
+_stage_alloc_peaks = {}
+
+def record_memory(endpoint, tracker):
+    summary = tracker.summary()
+    metrics.observe("earscope_request_peak_rss_bytes", summary["rss_peak"], endpoint=endpoint)
+    metrics.observe("earscope_request_rss_growth_bytes", summary["rss_growth"], endpoint=endpoint)
+    if summary["alloc_peak"] is not None:
+        for stage, entry in summary["stages"].items():
+            key = (endpoint, stage)
+            _stage_alloc_peaks[key] = max(_stage_alloc_peaks.get(key, 0), entry["alloc_peak"])
+            metrics.set_gauge("earscope_stage_alloc_peak_bytes", _stage_alloc_peaks[key],
+                              endpoint=endpoint, stage=stage)
+
 # ------------------------
 # FastAPI App
 # ------------------------
-app = FastAPI(title="EarScope API", description="Otitis Media Screening with Grad-CAM")
+@asynccontextmanager
+async def lifespan(app):
+    # On the inference executor, so the threads that serve requests are the ones warmed up
+    asyncio.get_running_loop().run_in_executor(get_inference_executor(), warm_active_models)
+    yield
+
+app = FastAPI(title="EarScope API", description="Otitis Media Screening with Grad-CAM", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -105,118 +253,814 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# One profiler per process can be active at a time; concurrent requests run unprofiled
+_profile_lock = threading.Lock()
+
+async def profile_slow_requests(request, call_next):
+    if request.url.path not in PROFILE_PATHS or not _profile_lock.acquire(blocking=False):
+        return await call_next(request)
+    try:
+        profile = profiling.RequestProfile(torch_trace=PROFILE_TORCH)
+        start = time.perf_counter()
+        profile.start()
+        token = profiling.current_profile.set(profile)
+        try:
+            response = await call_next(request)
+        finally:
+            profiling.current_profile.reset(token)
+            profile.stop()
+        elapsed = time.perf_counter() - start
+        if elapsed >= PROFILE_THRESHOLD:
+            profile.save(PROFILE_DIR, {
+                "method": request.method,
+                "path": request.url.path,
+                "status_code": response.status_code,
+                "duration_s": round(elapsed, 3),
+                "content_length": request.headers.get("content-length"),
+                "created_at": datetime.now().isoformat(timespec="seconds"),
+            })
+            profiling.prune_profiles(PROFILE_DIR, PROFILE_KEEP)
+        return response
+    finally:
+        _profile_lock.release()
+
+# Registered only when enabled so normal serving pays nothing for it
+if PROFILE_REQUESTS:
+    app.middleware("http")(profile_slow_requests)
 
 app.mount("/outputs", StaticFiles(directory=OUTPUT_DIR), name="outputs")
 
 # ------------------------
-# Single Prediction
+# Inference
 # ------------------------
-@app.post("/predict")
-async def predict(file: UploadFile = File(...)):
-    contents = await file.read()
-    orig_img, img_tensor = preprocess_image(contents)
+# Image pipelines run on this pool rather than the event loop, so uploads, history
+# queries and health checks stay responsive. Created lazily so serve.py forks
+# workers before any threads exist.
+_inference_executor = None
 
+def get_inference_executor():
+    global _inference_executor
+    if _inference_executor is None:
+        workers = (runtime.effective or RUNTIME)["inference_workers"]
+        _inference_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="inference")
+    return _inference_executor
 
-    # Stage 1 inference
-    with torch.no_grad():
-        outputs1 = model_stage1(img_tensor)
-        probs1 = F.softmax(outputs1, dim=1).detach().cpu().numpy().flatten()
-        pred1 = int(np.argmax(probs1))
-        stage1_class = CLASS_NAMES_STAGE1[pred1]
-        stage1_conf = float(probs1[pred1])
+async def run_inference(fn, *args, **kwargs):
+    call = partial(fn, *args, **kwargs)
+    profile = profiling.current_profile.get()
+    if profile is not None:
+        call = partial(profile.run, call)
+    return await asyncio.get_running_loop().run_in_executor(get_inference_executor(), call)
+
+def analyze_image(contents, tracker, include_gradcam=False, include_original=False):
+    """Decode one upload, run both stages and save its Grad-CAM overlay; returns the result"""
+    with registry.use() as models:
+        return _analyze_image(models, contents, tracker, include_gradcam, include_original)
+
+def _analyze_image(models, contents, tracker, include_gradcam, include_original):
+    analysis_id = history_store.new_analysis_id()
+    with tracker.stage("decode"):
+        resized = load_resized(contents)
+        orig_img, img_tensor = normalize_to_tensor(resized)
+        if RETAIN_CASES:
+            save_case_image(resized, analysis_id)
+        del resized
 
-    referral = get_referral(stage1_class, stage1_conf)
+    # Forward passes and Grad-CAM take turns on the shared models (see ModelVersion.lock);
+    # decoding and encoding around them still overlap between inference workers
+    with models.lock:
+        overlay, result = _run_models(models, analysis_id, orig_img, img_tensor, tracker)
+    del img_tensor
+
+    # The base64 original is ~0.5 MB per image held until the response is sent
+    if include_original:
+        with tracker.stage("encode"):
+            result["original_image"] = encode_image_to_base64(np.transpose(orig_img, (1, 2, 0)))
+
+    # Always generate heatmap, kept on disk so history entries can show it later
+    with tracker.stage("gradcam"):
+        overlay_path = save_overlay_to_disk(overlay, f"{analysis_id}_gradcam.png")
+        result["gradcam_url"] = f"/outputs/{os.path.basename(overlay_path)}"
+        if include_gradcam:
+            result["gradcam"] = encode_image_to_base64(overlay)
+    return result
+
+def _run_models(models, analysis_id, orig_img, img_tensor, tracker):
+    """Both stages and the Grad-CAM overlay for one image; returns (overlay, result)"""
+    # Stage 1
+    with tracker.stage("stage1"), torch.no_grad():
+        outputs1 = models.stage1(img_tensor)
+        probs1 = F.softmax(outputs1, dim=1).detach().cpu().numpy().flatten()
+    pred1 = int(np.argmax(probs1))
+    stage1_class = CLASS_NAMES_STAGE1[pred1]
+    stage1_conf = float(probs1[pred1])
+    orig_img_np = np.transpose(orig_img, (1, 2, 0))  # (H,W,C)
 
     result = {
+        "analysis_id": analysis_id,
         "stage1_prediction": stage1_class,
         "stage1_probabilities": {cls: float(p) for cls, p in zip(CLASS_NAMES_STAGE1, probs1)},
-        "referral": referral
+        "referral": get_referral(stage1_class, stage1_conf),
+        "confidence": stage1_conf,
+        "model_version": models.version,
     }
 
-    # Always generate heatmap
+    # Stage 2 if abnormal
+    cam_model = models.stage1
     if stage1_class == "Abnormal":
-        # Stage 2 inference
-        with torch.no_grad():
-            outputs2 = model_stage2(img_tensor)
+        with tracker.stage("stage2"), torch.no_grad():
+            outputs2 = models.stage2(img_tensor)
             probs2 = F.softmax(outputs2, dim=1).detach().cpu().numpy().flatten()
-            pred2 = int(np.argmax(probs2))
-            stage2_class = CLASS_NAMES_STAGE2[pred2]
+        pred2 = int(np.argmax(probs2))
+        result["stage2_prediction"] = CLASS_NAMES_STAGE2[pred2]
+        result["stage2_probabilities"] = {cls: float(p) for cls, p in zip(CLASS_NAMES_STAGE2, probs2)}
+        result["stage2_confidence"] = float(probs2[pred2])
+        cam_model = models.stage2
 
-        overlay = generate_gradcam(model_stage2, target_layers_stage2, img_tensor, np.transpose(orig_img, (1, 2, 0)))
-        overlay_b64 = encode_image_to_base64(overlay)
+    with tracker.stage("gradcam"):
+        overlay = generate_gradcam(cam_model, target_layers(cam_model), img_tensor, orig_img_np)
+    return overlay, result
 
-        result["stage2_prediction"] = stage2_class
-        result["stage2_probabilities"] = {cls: float(p) for cls, p in zip(CLASS_NAMES_STAGE2, probs2)}
-        result["gradcam"] = overlay_b64
+# ------------------------
+# Scheduling
+# ------------------------
+metrics.register("earscope_queue_wait_seconds", "histogram",
+                 "Time an image waited for an inference slot", metrics.SECONDS_BUCKETS)
+metrics.register("earscope_queue_waiting", "gauge", "Images waiting for an inference slot")
+metrics.register("earscope_queue_admitted", "gauge", "Requests admitted and not yet finished")
+metrics.register("earscope_requests_rejected_total", "counter", "Requests shed by admission control")
 
-    else:
-        overlay = generate_gradcam(model_stage1, target_layers_stage1, img_tensor, np.transpose(orig_img, (1, 2, 0)))
-        overlay_b64 = encode_image_to_base64(overlay)
-        result["gradcam"] = overlay_b64
+# Sized like the inference executor, so the executor itself never queues work
+_scheduler = None
 
-    return JSONResponse(content=result)
+def get_scheduler():
+    global _scheduler
+    if _scheduler is None:
+        slots = (runtime.effective or RUNTIME)["inference_workers"]
+        _scheduler = scheduler.Scheduler(slots, SCHEDULER_QUEUES)
+    return _scheduler
+
+async def run_scheduled(queue, fn, *args, **kwargs):
+    """run_inference once queue's turn for an inference slot comes up"""
+    async with get_scheduler().slot(queue) as wait_s:
+        metrics.observe("earscope_queue_wait_seconds", wait_s, queue=queue)
+        return await run_inference(fn, *args, **kwargs)
+
+async def admission_control(request, call_next):
+    # Runs before the upload is read, so shed requests cost next to nothing
+    queue = SCHEDULED_PATHS.get(request.url.path)
+    if queue is None or request.method != "POST":
+        return await call_next(request)
+    address = request.client.host if request.client else "-"
+    try:
+        ticket = get_scheduler().admit(queue, request.headers.get("x-client-id"), address)
+    except scheduler.Rejected as e:
+        reason = "client_limit" if e.status_code == 429 else "overloaded"
+        metrics.inc("earscope_requests_rejected_total", queue=queue, reason=reason)
+        return JSONResponse(status_code=e.status_code, content={"detail": e.detail},
+                            headers={"Retry-After": str(e.retry_after)})
+    try:
+        return await call_next(request)
+    finally:
+        get_scheduler().leave(ticket)
+
+# Added after the profiling middleware so it runs first and shed requests are not profiled
+app.middleware("http")(admission_control)
 
 # ------------------------
-# Batch Prediction
+# Model Versions
 # ------------------------
+def warmup_models(version):
+    """Synthetic images through both stages and the Grad-CAM of each, at the batch shapes requests use"""
+    rng = np.random.default_rng(0)
+    for size in sorted({1, WARMUP_BATCH}):
+        normalized, tensors = zip(*(normalize_to_tensor(rng.uniform(0, 255, (3, 500, 500)).astype(np.float32))
+                                    for _ in range(size)))
+        batch = torch.cat(tensors)
+        orig_imgs = [np.transpose(img, (1, 2, 0)) for img in normalized]
+        for model in (version.stage1, version.stage2):
+            with version.lock:
+                with torch.no_grad():
+                    model(batch)
+                generate_gradcam_batch(model, target_layers(model), batch, orig_imgs)
+
+def read_model_state():
+    try:
+        with open(MODEL_STATE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def write_model_state(version):
+    tmp = f"{MODEL_STATE}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump({"version": version.version, "stage1_path": version.stage1_path,
+                   "stage2_path": version.stage2_path, "activated_at": version.activated_at}, f)
+    os.replace(tmp, MODEL_STATE)
+
+registry = model_registry.ModelRegistry(load_model, warmup_models)
+_state = read_model_state()
+_initial = (_state["stage1_path"], _state["stage2_path"]) if _state else (MODEL_STAGE1_PATH, MODEL_STAGE2_PATH)
+# Warmed up by lifespan() in each serving process instead: serve.py's parent must not
+# run torch ops before forking, and /health/live should answer while it runs
+registry.load(*_initial, warmup=False)
+_state_mtime = os.stat(MODEL_STATE).st_mtime_ns if _state else None
+_sync_lock = threading.Lock()
+
+def sync_model_version():
+    """Follow a swap or rollback made through another worker, as recorded in MODEL_STATE
+
+    Called at the start of inference requests; costs one stat() when nothing changed.
+    The request that notices a new version is still served by the current one.
+    """
+    global _state_mtime
+    try:
+        mtime = os.stat(MODEL_STATE).st_mtime_ns
+    except OSError:
+        return
+    if mtime == _state_mtime or not _sync_lock.acquire(blocking=False):
+        return
+    try:
+        state = read_model_state()
+        if state is None or state["version"] == registry.active.version:
+            _state_mtime = mtime
+            return
+        previous = registry.previous
+        if previous is not None and previous.version == state["version"] and previous.stage1 is not None:
+            registry.rollback()
+        else:
+            registry.load_in_background(state["stage1_path"], state["stage2_path"])
+        _state_mtime = mtime
+    except (RuntimeError, LookupError, OSError):
+        pass  # a load is already running or the files are gone; retried on the next request
+    finally:
+        _sync_lock.release()
+
+def model_path(name):
+    """Resolve a model file name inside MODEL_DIR, refusing anything outside it"""
+    model_dir = os.path.realpath(MODEL_DIR)
+    path = os.path.realpath(os.path.join(model_dir, name))
+    if os.path.commonpath([model_dir, path]) != model_dir or not os.path.isfile(path):
+        raise HTTPException(status_code=400, detail=f"No model file {name!r} in the model directory")
+    return path
+
+class ModelLoadRequest(BaseModel):
+    stage1_path: str  # file names relative to EARSCOPE_MODEL_DIR
+    stage2_path: str
+
+@app.get("/models")
+def list_models():
+    sync_model_version()
+    return registry.info()
+
+@app.post("/models", status_code=202)
+def load_models(request: ModelLoadRequest):
+    """Load, warm up and swap in a new version without dropping in-flight requests"""
+    stage1_path, stage2_path = model_path(request.stage1_path), model_path(request.stage2_path)
+    try:
+        version = registry.load_in_background(stage1_path, stage2_path, on_active=write_model_state)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return version.info()
+
+@app.post("/models/rollback")
+def rollback_models():
+    try:
+        version = registry.rollback()
+    except LookupError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    write_model_state(version)
+    return version.info()
+
+# ------------------------
+# Health
+# ------------------------
+STARTED_AT = datetime.now().isoformat(timespec="seconds")
+warmup_error = None
+# Under serve.py: one byte per worker, 1 once that worker is warm. Created by the
+# parent before forking so every worker sees the others' flags; None otherwise.
+worker_ready = None
+
+metrics.register("earscope_ready", "gauge", "1 once the active model version is warmed up in this process")
+metrics.register("earscope_model_warmup_seconds", "gauge", "Warmup duration of the active model version")
+
+def warm_active_models():
+    """Warm up the version loaded at import; versions swapped in later are warmed before activation"""
+    global warmup_error
+    version = registry.active
+    try:
+        if version.warmup_s is None:
+            registry.warm(version)
+    except Exception as e:
+        warmup_error = f"{type(e).__name__}: {e}"
+        return
+    if worker_ready is not None:
+        worker_ready[int(os.environ["EARSCOPE_WORKER"])] = 1
+
+def is_warm():
+    version = registry.active
+    return version is not None and version.warmup_s is not None
+
+def is_ready():
+    """Warm in this process and, under serve.py, in every sibling worker too"""
+    return is_warm() and (worker_ready is None or all(worker_ready))
+
+# Both run on the event loop, so a blocked loop fails the liveness probe too
+@app.get("/health/live")
+async def health_live():
+    """The process is up and serving HTTP; says nothing about the models"""
+    return {"status": "alive", "pid": os.getpid(), "started_at": STARTED_AT}
+
+@app.get("/health/ready")
+async def health_ready():
+    """200 once the active model version is warmed up in this process and every sibling worker, else 503
+
+    A probe reaches whichever serve.py worker accepts it, so readiness is only
+    reported once no worker can still answer requests cold.
+    """
+    version = registry.active
+    ready = is_ready()
+    status = "ready" if ready else "failed" if warmup_error else "warming"
+    return JSONResponse(status_code=200 if ready else 503, content={
+        "status": status,
+        "workers_ready": f"{sum(worker_ready)}/{len(worker_ready)}" if worker_ready is not None else None,
+        "model_version": version.version if version else None,
+        "warmup_s": version.warmup_s if version else None,
+        "warmed_at": version.warmed_at if version else None,
+        "started_at": STARTED_AT,
+        "error": warmup_error,
+    })
+
+# ------------------------
+# Single Prediction
+# ------------------------
+@app.post("/predict")
+async def predict(file: UploadFile = File(...), patient_id: str = Form(None), clinician: str = Form(None)):
+    sync_model_version()
+    tracker = memory.MemoryTracker()
+    with tracker.stage("read"):
+        contents = await file.read()
+    result = await run_scheduled("interactive", analyze_image, contents, tracker, include_gradcam=True)
+    del contents
+
+    history_store.record_results([
+        history_store.make_record(result["analysis_id"], result, file.filename, patient_id, clinician)
+    ])
+    record_memory("predict", tracker)
+
+    return JSONResponse(content=result)
+
 # ------------------------
 # Batch Prediction
 # ------------------------
 @app.post("/batch_predict")
-async def batch_predict(files: list[UploadFile] = File(...)):
+async def batch_predict(files: list[UploadFile] = File(...), clinician: str = Form(None),
+                        batch_id: str = Form(None), include_images: bool = Form(True)):
+    # Clients uploading one batch in several chunks pass the same batch_id with each
+    batch_id = batch_id or history_store.new_batch_id()
+    sync_model_version()
+    tracker = memory.MemoryTracker()
     results = []
+    records = []
     for file in files:
-        contents = await file.read()
-        orig_img, img_tensor = preprocess_image(contents)
+        # Images go through one at a time and each upload is dropped once analysed,
+        # so at most one image's upload, arrays and overlay are alive per request
+        with tracker.stage("read"):
+            contents = await file.read()
+            await file.close()
+        result = await run_scheduled("bulk", analyze_image, contents, tracker, include_original=include_images)
+        del contents
+        result["filename"] = file.filename
+
+        results.append(result)
+        records.append(history_store.make_record(result["analysis_id"], result, file.filename,
+                                                 clinician=clinician, batch_id=batch_id))
+
+    history_store.record_results(records)
+    record_memory("batch_predict", tracker)
 
-        # Stage 1
-        with torch.no_grad():
-            outputs1 = model_stage1(img_tensor)
-            probs1 = F.softmax(outputs1, dim=1).detach().cpu().numpy().flatten()
-            pred1 = int(np.argmax(probs1))
-            stage1_class = CLASS_NAMES_STAGE1[pred1]
-            stage1_conf = float(probs1[pred1])
+    return JSONResponse(content={"batch_id": batch_id, "results": results})
 
-        referral = get_referral(stage1_class, stage1_conf)
+# ------------------------
+# Reprocessing
+# ------------------------
+def rescore_batch(cases):
+    """Run stored (analysis_id, resized) cases through both stages as one batch"""
+    with registry.use() as models:
+        return _rescore_batch(models, cases)
 
-        # Encode original image to base64
-        orig_img_np = np.transpose(orig_img, (1, 2, 0))  # (H,W,C)
-        orig_img_b64 = encode_image_to_base64(orig_img_np)
+def _rescore_batch(models, cases):
+    normalized, tensors = zip(*(normalize_to_tensor(resized) for _, resized in cases))
+    batch = torch.cat(tensors)
+    reprocessed_at = datetime.now().isoformat(timespec="seconds")
 
-        result = {
-            "filename": file.filename,
+    # Model passes take turns on the shared models (see ModelVersion.lock)
+    with models.lock, torch.no_grad():
+        probs1 = F.softmax(models.stage1(batch), dim=1).detach().cpu().numpy()
+
+    results, abnormal, other = [], [], []
+    for i, ((analysis_id, _), p) in enumerate(zip(cases, probs1)):
+        pred1 = int(np.argmax(p))
+        stage1_class = CLASS_NAMES_STAGE1[pred1]
+        stage1_conf = float(p[pred1])
+        results.append({
+            "analysis_id": analysis_id,
             "stage1_prediction": stage1_class,
-            "stage1_probabilities": {cls: float(p) for cls, p in zip(CLASS_NAMES_STAGE1, probs1)},
-            "referral": referral,
+            "stage1_probabilities": {cls: float(v) for cls, v in zip(CLASS_NAMES_STAGE1, p)},
+            "referral": get_referral(stage1_class, stage1_conf),
             "confidence": stage1_conf,
-            "original_image": orig_img_b64  # <-- ADDED
+            "reprocessed_at": reprocessed_at,
+            "model_version": models.version,
+        })
+        (abnormal if stage1_class == "Abnormal" else other).append(i)
+
+    if abnormal:
+        with models.lock, torch.no_grad():
+            probs2 = F.softmax(models.stage2(batch[abnormal]), dim=1).detach().cpu().numpy()
+        for i, p in zip(abnormal, probs2):
+            pred2 = int(np.argmax(p))
+            results[i]["stage2_prediction"] = CLASS_NAMES_STAGE2[pred2]
+            results[i]["stage2_probabilities"] = {cls: float(v) for cls, v in zip(CLASS_NAMES_STAGE2, p)}
+            results[i]["stage2_confidence"] = float(p[pred2])
+
+    # Grad-CAM once per model over its whole sub-batch
+    for model, idx in ((models.stage2, abnormal), (models.stage1, other)):
+        if not idx:
+            continue
+        orig_imgs = [np.transpose(normalized[i], (1, 2, 0)) for i in idx]
+        with models.lock:
+            overlays = generate_gradcam_batch(model, target_layers(model), batch[idx], orig_imgs)
+        for i, overlay in zip(idx, overlays):
+            overlay_path = save_overlay_to_disk(overlay, f"{results[i]['analysis_id']}_gradcam.png")
+            # Versioned so clients caching by URL pick up the new overlay
+            version = reprocessed_at.replace(":", "").replace("-", "")
+            results[i]["gradcam_url"] = f"/outputs/{os.path.basename(overlay_path)}?v={version}"
+
+    return results
+
+def reprocess_chunk(ids):
+    """Re-score the stored cases among ids and save the new results
+
+    Returns (reprocessed, changed, missing): the number re-scored, the IDs whose
+    condition or referral changed, and the IDs without a retained image.
+    """
+    records = history_store.get_records(ids)
+    cases, missing = [], []
+    for analysis_id in ids:
+        resized = load_case_image(analysis_id) if analysis_id in records else None
+        if resized is None:
+            missing.append(analysis_id)
+        else:
+            cases.append((analysis_id, resized))
+    if not cases:
+        return 0, [], missing
+
+    results = rescore_batch(cases)
+    history_store.update_results(results)
+
+    changed = []
+    for result in results:
+        old = records[result["analysis_id"]]
+        condition, _ = history_store.condition_of(result)
+        if (old["condition"], old["referral"]) != (condition, result["referral"]):
+            changed.append(result["analysis_id"])
+    return len(results), changed, missing
+
+# Re-scoring every stored case runs as a background job. Its status is written to
+# REPROCESS_JOB_DIR after each chunk so any serve.py worker can answer a poll.
+REPROCESS_JOB_DIR = os.path.join(CASE_DIR, "jobs")
+REPROCESS_JOBS_KEPT = 20
+os.makedirs(REPROCESS_JOB_DIR, exist_ok=True)
+_reprocess_task = None
+
+def reprocess_job_path(job_id):
+    return os.path.join(REPROCESS_JOB_DIR, f"{job_id}.json")
+
+def write_reprocess_job(job):
+    tmp = f"{reprocess_job_path(job['job_id'])}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(job, f)
+    os.replace(tmp, reprocess_job_path(job["job_id"]))
+
+def prune_reprocess_jobs():
+    """Keep only the newest REPROCESS_JOBS_KEPT job records"""
+    paths = sorted((os.path.join(REPROCESS_JOB_DIR, f) for f in os.listdir(REPROCESS_JOB_DIR)
+                    if f.endswith(".json")), key=os.path.getmtime)
+    for path in paths[:-REPROCESS_JOBS_KEPT]:
+        os.remove(path)
+
+async def reprocess_all(job, batch_size):
+    """Re-score every stored case, oldest first, through the bulk queue
+
+    History is read a keyset page at a time, so no read transaction stays open
+    while a chunk is being scored and new analyses never shift the pages.
+    """
+    cursor = None
+    try:
+        while True:
+            page = history_store.query_history(sort="date", order="asc", limit=batch_size, cursor=cursor)
+            if job["total"] is None:
+                job["total"] = page["total"]
+            ids = [row["id"] for row in page["results"]]
+            if ids:
+                reprocessed, changed, missing = await run_scheduled("bulk", reprocess_chunk, ids)
+                job["reprocessed"] += reprocessed
+                job["changed"] += len(changed)
+                job["missing"] += len(missing)
+                write_reprocess_job(job)
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+        job["status"] = "done"
+    except Exception as e:
+        job["status"], job["error"] = "failed", f"{type(e).__name__}: {e}"
+    job["finished_at"] = datetime.now().isoformat(timespec="seconds")
+    write_reprocess_job(job)
+
+class ReprocessRequest(BaseModel):
+    analysis_ids: list[str] | None = None  # None starts a job re-scoring every stored case
+    batch_size: int = Field(REPROCESS_BATCH_SIZE, ge=1, le=128)
+
+@app.post("/reprocess")
+async def reprocess(request: ReprocessRequest):
+    """Re-score the given cases and return a summary, or with no IDs start a job over all of them
+
+    The job answers 202 with its job_id; poll GET /reprocess/{job_id}. Only one
+    such job runs per worker process at a time (409 otherwise).
+    """
+    global _reprocess_task
+    sync_model_version()
+    if request.analysis_ids is None:
+        if _reprocess_task is not None and not _reprocess_task.done():
+            raise HTTPException(status_code=409, detail="A reprocessing job is already running")
+        job = {
+            "job_id": f"R-{uuid.uuid4().hex[:12].upper()}",
+            "status": "running",
+            "total": None,
+            "reprocessed": 0,
+            "changed": 0,
+            "missing": 0,
+            "started_at": datetime.now().isoformat(timespec="seconds"),
+            "finished_at": None,
+            "error": None,
         }
+        write_reprocess_job(job)
+        prune_reprocess_jobs()
+        _reprocess_task = asyncio.create_task(reprocess_all(job, request.batch_size))
+        return JSONResponse(status_code=202, content=job)
+
+    ids = request.analysis_ids
+    summary = {"reprocessed": 0, "changed": [], "missing": []}
+    for i in range(0, len(ids), request.batch_size):
+        reprocessed, changed, missing = await run_scheduled("bulk", reprocess_chunk, ids[i:i + request.batch_size])
+        summary["reprocessed"] += reprocessed
+        summary["changed"] += changed
+        summary["missing"] += missing
+    return summary
+
+@app.get("/reprocess/{job_id}")
+def get_reprocess_job(job_id: str):
+    """Progress of a reprocessing job; changed and missing are counts"""
+    if not re.fullmatch(r"R-[0-9A-F]{12}", job_id):
+        raise HTTPException(status_code=404, detail="Unknown reprocessing job")
+    try:
+        with open(reprocess_job_path(job_id)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        raise HTTPException(status_code=404, detail="Unknown reprocessing job")
 
-        # Stage 2 if abnormal
-        if stage1_class == "Abnormal":
-            with torch.no_grad():
-                outputs2 = model_stage2(img_tensor)
-                probs2 = F.softmax(outputs2, dim=1).detach().cpu().numpy().flatten()
-                pred2 = int(np.argmax(probs2))
-                stage2_class = CLASS_NAMES_STAGE2[pred2]
-                stage2_conf = float(probs2[pred2])
+# ------------------------
+# PDF Reports
+# ------------------------
+# Rendering runs in spawned worker processes: they never inherit the models and
+# ReportLab's CPU time does not compete with inference for the GIL
+_report_executor = None
+report_jobs = {}
+report_lock = threading.Lock()
 
-            overlay = generate_gradcam(model_stage2, target_layers_stage2, img_tensor, orig_img_np)
-            overlay_path = save_overlay_to_disk(overlay, f"{file.filename}_gradcam.png")
+def get_report_executor():
+    global _report_executor
+    if _report_executor is None:
+        _report_executor = ProcessPoolExecutor(max_workers=REPORT_WORKERS,
+                                               mp_context=multiprocessing.get_context("spawn"))
+    return _report_executor
 
-            result["stage2_prediction"] = stage2_class
-            result["stage2_probabilities"] = {cls: float(p) for cls, p in zip(CLASS_NAMES_STAGE2, probs2)}
-            result["stage2_confidence"] = stage2_conf
-            result["gradcam_url"] = f"/outputs/{os.path.basename(overlay_path)}"
+def reset_report_executor(executor):
+    """Drop a pool whose worker died; the next get_report_executor() starts a fresh one"""
+    global _report_executor
+    with report_lock:
+        if _report_executor is executor:
+            _report_executor = None
+    executor.shutdown(wait=False)
+
+def submit_report(cases, path):
+    """Queue a render, replacing the pool once if it is broken; returns (executor, future)"""
+    executor = get_report_executor()
+    try:
+        return executor, executor.submit(reports.render_report_file, cases, path)
+    except BrokenProcessPool:
+        reset_report_executor(executor)
+        executor = get_report_executor()
+        return executor, executor.submit(reports.render_report_file, cases, path)
+
+def report_path(report_id):
+    return os.path.join(REPORT_DIR, f"{report_id}.pdf")
+
+def report_case(row):
+    """Stored result plus on-disk image paths for one history row"""
+    result = json.loads(row["result"])
+    result.update(
+        analysis_id=row["analysis_id"],
+        filename=row["filename"],
+        patient_id=row["patient_id"],
+        analysis_date=row["created_at"].replace("T", " "),
+    )
+    gradcam_path = None
+    if row["gradcam_url"]:
+        gradcam_path = os.path.join(OUTPUT_DIR, os.path.basename(row["gradcam_url"].split("?")[0]))
+    return {
+        "result": result,
+        "original_path": os.path.join(CASE_DIR, f"{row['analysis_id']}.png"),
+        "gradcam_path": gradcam_path,
+    }
 
+def prune_reports():
+    """Keep only the newest REPORT_CACHE_MAX rendered reports"""
+    paths = sorted((os.path.join(REPORT_DIR, f) for f in os.listdir(REPORT_DIR) if f.endswith(".pdf")),
+                   key=os.path.getmtime)
+    for path in paths[:-REPORT_CACHE_MAX]:
+        os.remove(path)
+        report_jobs.pop(os.path.basename(path)[:-len(".pdf")], None)
+
+def _report_done(report_id, executor, future):
+    if isinstance(future.exception(), BrokenProcessPool):
+        reset_report_executor(executor)
+    with report_lock:
+        job = report_jobs.get(report_id)
+        if job is None:
+            return  # pruned meanwhile
+        job["render_seconds"] = round(time.time() - job["submitted_at"], 3)
+        if future.exception() is not None:
+            job["status"] = "failed"
+            job["error"] = str(future.exception())
         else:
-            overlay = generate_gradcam(model_stage1, target_layers_stage1, img_tensor, orig_img_np)
-            overlay_path = save_overlay_to_disk(overlay, f"{file.filename}_gradcam.png")
-            result["gradcam_url"] = f"/outputs/{os.path.basename(overlay_path)}"
+            job["status"] = "ready"
+            prune_reports()
 
-        results.append(result)
+def report_status(report_id):
+    with report_lock:
+        job = report_jobs.get(report_id)
+        if job is not None:
+            return dict(job, report_id=report_id)
+    if os.path.exists(report_path(report_id)):
+        # Rendered earlier (or by another worker process)
+        return {"report_id": report_id, "status": "ready"}
+    return None
+
+class ReportRequest(BaseModel):
+    analysis_ids: list[str] = Field(..., min_length=1, max_length=REPORT_MAX_CASES)
+
+@app.post("/reports")
+def create_report(request: ReportRequest):
+    records = history_store.get_records(request.analysis_ids)
+    missing = [a for a in request.analysis_ids if a not in records]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Unknown analysis IDs: {', '.join(missing[:10])}")
+
+    cases = [report_case(records[a]) for a in request.analysis_ids]
+    # Same cases with the same stored results (reprocessing changes them) -> same report
+    digest_input = json.dumps([c["result"] for c in cases], sort_keys=True).encode("utf-8")
+    report_id = hashlib.sha256(digest_input).hexdigest()[:24]
+
+    with report_lock:
+        job = report_jobs.get(report_id)
+        submit = (job is None or job["status"] == "failed") and not os.path.exists(report_path(report_id))
+    if submit:
+        # Outside report_lock: submitting may reset a broken pool, and a callback added to
+        # an already finished future runs at once on this thread and takes the lock itself.
+        # Two identical requests racing here both render; the PDF is written atomically.
+        submitted_at = time.time()
+        executor, future = submit_report(cases, report_path(report_id))
+        with report_lock:
+            report_jobs[report_id] = {"status": "pending", "cases": len(cases), "submitted_at": submitted_at}
+        future.add_done_callback(partial(_report_done, report_id, executor))
+
+    return report_status(report_id)
+
+@app.get("/reports/{report_id}")
+def get_report(report_id: str):
+    status = report_status(report_id) if re.fullmatch(r"[0-9a-f]{24}", report_id) else None
+    if status is None:
+        raise HTTPException(status_code=404, detail="Unknown report")
+    return status
+
+@app.get("/reports/{report_id}/pdf")
+def download_report(report_id: str):
+    status = get_report(report_id)
+    if status["status"] != "ready":
+        raise HTTPException(status_code=409, detail=f"Report is {status['status']}")
+    return FileResponse(report_path(report_id), media_type="application/pdf",
+                        filename=f"otoscopy_report_{report_id}.pdf")
+
+# ------------------------
+# Analysis History
+# ------------------------
+@app.get("/history")
+def get_history(
+    date_range: str = Query("all", enum=history_store.DATE_RANGES),
+    condition: str = None,
+    referral: str = None,
+    search: str = None,
+    sort: str = Query("date", enum=list(history_store.SORT_COLUMNS)),
+    order: str = Query("desc", enum=["asc", "desc"]),
+    limit: int = Query(15, ge=1, le=500),
+    cursor: str = None,
+):
+    try:
+        return history_store.query_history(date_range, condition, referral, search, sort, order, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/history/export")
+def export_history(
+    format: str = Query("csv", enum=list(history_export.EXPORT_FORMATS)),
+    date_range: str = Query("all", enum=history_store.DATE_RANGES),
+    condition: str = None,
+    referral: str = None,
+    search: str = None,
+    sort: str = Query("date", enum=list(history_store.SORT_COLUMNS)),
+    order: str = Query("desc", enum=["asc", "desc"]),
+):
+    if format == "parquet" and not history_export.parquet_available():
+        raise HTTPException(status_code=501, detail="Parquet export requires pyarrow to be installed")
+
+    chunks = history_store.iter_history(date_range, condition, referral, search, sort, order)
+    if format == "parquet":
+        body = history_export.parquet_stream(chunks)
+    else:
+        body = history_export.csv_stream(chunks)
+
+    media_type, extension = history_export.EXPORT_FORMATS[format]
+    filename = f"analysis_history_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}"
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+@app.get("/history/stats")
+def get_history_stats(
+    date_range: str = Query("all", enum=history_store.DATE_RANGES),
+    condition: str = None,
+    referral: str = None,
+    search: str = None,
+):
+    return history_store.history_stats(date_range, condition, referral, search)
+
+# ------------------------
+# Admin
+# ------------------------
+@app.get("/metrics")
+def get_metrics():
+    """Prometheus text format; values are per worker process"""
+    metrics.set_gauge("earscope_process_rss_bytes", memory.rss_bytes() or 0)
+    metrics.set_gauge("earscope_process_max_rss_bytes", memory.max_rss_bytes() or 0)
+    metrics.set_gauge("earscope_ready", int(is_warm()))
+    for name, queue in get_scheduler().stats()["queues"].items():
+        metrics.set_gauge("earscope_queue_waiting", queue["waiting"], queue=name)
+        metrics.set_gauge("earscope_queue_admitted", queue["admitted"], queue=name)
+    if registry.active.warmup_s is not None:
+        metrics.set_gauge("earscope_model_warmup_seconds", registry.active.warmup_s)
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/admin/scheduler")
+async def get_scheduler_stats():
+    """Queue depths, limits and free inference slots in this worker"""
+    return get_scheduler().stats()
+
+@app.get("/admin/runtime")
+def get_runtime():
+    """Thread, pinning and executor settings in effect in this worker"""
+    return runtime.effective or RUNTIME
+
+@app.get("/admin/profiles")
+def list_profiles():
+    if not PROFILE_REQUESTS:
+        raise HTTPException(status_code=404, detail="Profiling is disabled (set EARSCOPE_PROFILE=1)")
+    return {
+        "backend": profiling.backend(),
+        "threshold_s": PROFILE_THRESHOLD,
+        "profiles": profiling.list_profiles(PROFILE_DIR),
+    }
 
-    return JSONResponse(content={"results": results})
+@app.get("/admin/profiles/{profile_id}/{kind}")
+def download_profile(profile_id: str, kind: str):
+    path = None
+    if PROFILE_REQUESTS and re.fullmatch(r"\d{8}-\d{6}-[0-9a-f]{6}", profile_id):
+        path = profiling.profile_file(PROFILE_DIR, profile_id, kind)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type=profiling.PROFILE_FILES[kind][1], filename=os.path.basename(path))
 
 
 
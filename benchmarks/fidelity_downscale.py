@@ -0,0 +1,91 @@
+"""Check that client-side downscaling (utils/image_prep.py) does not change predictions.
+
+Runs every image through api.py's preprocessing and both model stages twice,
+once as uploaded and once after image_prep.prepare_upload, and compares the
+preprocessed input tensors and the predictions made from them.
+
+    python benchmarks/fidelity_downscale.py eardrumDs/*.tiff
+    python benchmarks/fidelity_downscale.py            # synthetic 2048x1536 and 777x555 TIFFs
+
+Exits non-zero unless every input tensor is bit-identical and the predicted
+classes, referral and probabilities are unchanged.
+"""
+import argparse
+import glob
+import os
+import sys
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+
+import harness
+from utils.image_prep import UPLOAD_ENCODINGS, prepare_upload
+
+
+def synthetic_images(n=8, sizes=((2048, 1536), (777, 555))):
+    """Synthetic TIFFs at an otoscope size and an awkward (non-integer ratio) one"""
+    for i in range(n):
+        size = sizes[i % len(sizes)]
+        yield f"synthetic_{i:02d}_{size[0]}x{size[1]}.tiff", harness.synthetic_image(size, "TIFF", seed=i)
+
+
+def score(api, image_bytes):
+    _, img_tensor = api.preprocess_image(image_bytes)
+    with api.registry.use() as models, torch.no_grad():
+        probs1 = F.softmax(models.stage1(img_tensor), dim=1).cpu().numpy().flatten()
+        probs2 = F.softmax(models.stage2(img_tensor), dim=1).cpu().numpy().flatten()
+    stage1 = api.CLASS_NAMES_STAGE1[int(np.argmax(probs1))]
+    referral = api.get_referral(stage1, float(probs1.max()))
+    stage2 = api.CLASS_NAMES_STAGE2[int(np.argmax(probs2))] if stage1 == "Abnormal" else None
+    return {"stage1": stage1, "stage2": stage2, "referral": referral,
+            "probs": np.concatenate([probs1, probs2]), "tensor": img_tensor}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("images", nargs="*", help="image files or globs (default: synthetic)")
+    parser.add_argument("--encoding", default="PNG", choices=list(UPLOAD_ENCODINGS))
+    args = parser.parse_args()
+
+    api, standins = harness.load_api()
+    if standins:
+        print(f"note: using random mobilenet_v3_large stand-ins for {', '.join(standins)}", file=sys.stderr)
+
+    if args.images:
+        paths = sorted({p for pattern in args.images for p in glob.glob(pattern)})
+        images = ((os.path.basename(p), open(p, "rb").read()) for p in paths)
+    else:
+        images = synthetic_images()
+
+    failures = 0
+    total_in = total_out = 0
+    print(f"{'image':32} {'bytes in':>10} {'bytes out':>10} {'max |dp|':>9} {'max |dx|':>9}  result")
+    for name, data in images:
+        prepared = prepare_upload(data, encoding=args.encoding)
+        full, small = score(api, data), score(api, prepared)
+
+        prob_delta = float(np.abs(full["probs"] - small["probs"]).max())
+        input_delta = float((full["tensor"] - small["tensor"]).abs().max())
+        same = all(full[k] == small[k] for k in ("stage1", "stage2", "referral"))
+        ok = same and prob_delta == 0 and torch.equal(full["tensor"], small["tensor"])
+        failures += not ok
+
+        total_in += len(data)
+        total_out += len(prepared)
+        if ok:
+            verdict = "ok"
+        elif same:
+            verdict = "MISMATCH input drifted"
+        else:
+            verdict = f"MISMATCH {full['stage1']}/{full['referral']} -> {small['stage1']}/{small['referral']}"
+        print(f"{name[:32]:32} {len(data):>10} {len(prepared):>10} {prob_delta:>9.5f} {input_delta:>9.5f}  {verdict}")
+
+    if total_in:
+        print(f"\nUpload size: {total_in} -> {total_out} bytes ({total_out / total_in:.1%})")
+    print("FAIL" if failures else "PASS", f"({failures} mismatches)")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""Shared helpers for the benchmark scripts in this directory.
+
+Scripts run as `python benchmarks/<name>.py`, which puts this directory on
+sys.path, so they can simply `import harness`.
+"""
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# (label, size, PIL format): what the clinic otoscopes produce, plus an
+# upload already downscaled by utils/image_prep.py
+IMAGE_CASES = [
+    ("jpeg_2048x1536", (2048, 1536), "JPEG"),
+    ("png_2048x1536", (2048, 1536), "PNG"),
+    ("tiff_2048x1536", (2048, 1536), "TIFF"),
+    ("png_500x500", (500, 500), "PNG"),
+]
+
+
+# ------------------------
+# Synthetic inputs
+# ------------------------
+def synthetic_image(size=(2048, 1536), fmt="PNG", seed=0):
+    """Smooth random RGB image encoded as fmt; compresses like a real photo, unlike white noise"""
+    rng = np.random.default_rng(seed)
+    coarse = rng.integers(0, 256, (max(1, size[1] // 64), max(1, size[0] // 64), 3), dtype=np.uint8)
+    img = Image.fromarray(coarse).resize(size, Image.Resampling.BICUBIC)
+    noise = rng.normal(0, 6, (size[1], size[0], 3))
+    img = Image.fromarray(np.clip(np.asarray(img) + noise, 0, 255).astype(np.uint8))
+    buf = io.BytesIO()
+    img.save(buf, format=fmt, **({"quality": 92} if fmt == "JPEG" else {}))
+    return buf.getvalue()
+
+
+# ------------------------
+# API under test
+# ------------------------
+def load_api(workdir=None):
+    """Import api.py with its state in a scratch directory; returns (api, standins)"""
+    standins = prepare_environment(workdir)
+    cwd = os.getcwd()
+    os.chdir(ROOT)
+    try:
+        import api
+    finally:
+        os.chdir(cwd)
+    return api, standins
+
+
+def prepare_environment(workdir=None):
+    """Point api.py's EARSCOPE_* paths at a scratch directory, for this process and its children
+
+    When the trained .pth files are not present, randomly initialised
+    mobilenet_v3_large models with the same heads stand in for them. Timings
+    are representative; predictions are meaningless. Returns the model env
+    vars that use stand-ins.
+    """
+    workdir = workdir or tempfile.mkdtemp(prefix="earscope-bench-")
+    for name, sub in (("EARSCOPE_HISTORY_DB", "history.db"), ("EARSCOPE_CASE_DIR", "cases"),
+                      ("EARSCOPE_REPORT_DIR", "reports"), ("EARSCOPE_OUTPUT_DIR", "outputs"),
+                      ("EARSCOPE_MODEL_STATE", "model_state.json")):
+        os.environ.setdefault(name, os.path.join(workdir, sub))
+
+    standins = []
+    for env, default, classes in (("EARSCOPE_MODEL_STAGE1", "3OM_86_mobilenet_model.pth", 3),
+                                  ("EARSCOPE_MODEL_STAGE2", "AOM_COM_MODEL.pth", 2)):
+        path = os.environ.get(env, os.path.join(ROOT, default))
+        if not os.path.exists(path):
+            path = os.path.join(workdir, f"standin_{classes}class.pth")
+            save_standin_model(path, classes)
+            standins.append(env)
+        os.environ[env] = path
+    return standins
+
+
+def save_standin_model(path, num_classes):
+    import torch
+    from torchvision.models import mobilenet_v3_large
+
+    torch.manual_seed(num_classes)
+    torch.save(mobilenet_v3_large(num_classes=num_classes).eval(), path)
+
+
+# ------------------------
+# Timing
+# ------------------------
+def measure(fn, repeat=20, warmup=3, min_time=0.0):
+    """Call fn warmup + repeat times (more if min_time is not yet reached); returns per-call seconds"""
+    for _ in range(warmup):
+        fn()
+    times = []
+    start = time.perf_counter()
+    while len(times) < repeat or time.perf_counter() - start < min_time:
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return times
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+
+def summarize(times):
+    return {
+        "n": len(times),
+        "min": min(times),
+        "median": statistics.median(times),
+        "mean": statistics.fmean(times),
+        "p95": percentile(times, 95),
+        "stdev": statistics.stdev(times) if len(times) > 1 else 0.0,
+    }
+
+
+def environment():
+    """Metadata stored alongside results so runs from different machines are not confused"""
+    info = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "commit": None,
+    }
+    try:
+        info["commit"] = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                        capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        pass
+    try:
+        import torch
+        info.update(torch=torch.__version__, torch_threads=torch.get_num_threads(),
+                    device="cuda" if torch.cuda.is_available() else "cpu")
+    except ImportError:
+        pass
+    return info
+
+
+def write_json(path, payload):
+    with open(path, "w") as f:
+        json.dump(payload, f, indent=2)
+        f.write("\n")
+
+
+def read_json(path):
+    with open(path) as f:
+        return json.load(f)
@@ -0,0 +1,97 @@
+"""Measure the cold start of ui.py and check it against a time budget.
+
+Each run executes ui.py in a fresh interpreter (Streamlit "bare" mode, no
+server) and records the wall time plus which heavy optional modules ended up
+imported. Only the default page (Dashboard) should be loaded; the other
+sections are imported on navigation.
+
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py --budget 3.0 --runs 7
+    python benchmarks/import_time.py --top 15     # slowest imports via -X importtime
+
+Exits non-zero if the median cold start exceeds --budget seconds, or if any
+run imported another section's module or something only those pages use.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ["reportlab", "plotly", "pandas", "PIL", "numpy", "torch"]
+
+# The Dashboard itself uses plotly and pandas; nothing on the cold path needs reportlab
+DEFAULT_SECTION = "sections.dashboard"
+NOT_ON_COLD_START = ["reportlab"]
+
+CHILD = """
+import json, runpy, sys, time
+start = time.perf_counter()
+runpy.run_path("ui.py", run_name="__main__")
+elapsed = time.perf_counter() - start
+pages = [module for module, _ in sys.modules["sections"].SECTIONS.values()]
+print(json.dumps({"seconds": elapsed, "modules": sorted(m for m in %r if m in sys.modules),
+                  "sections": sorted(m for m in pages if m in sys.modules)}))
+""" % (HEAVY_MODULES,)
+
+
+def cold_start():
+    """Run ui.py once in a new interpreter; returns {"seconds", "modules", "sections"}"""
+    proc = subprocess.run([sys.executable, "-c", CHILD], cwd=ROOT, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr else "ui.py failed")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def slowest_imports(n):
+    """Top-n imports by cumulative time from python -X importtime"""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", CHILD], cwd=ROOT,
+                          capture_output=True, text=True)
+    rows = []
+    for line in proc.stderr.splitlines():
+        # "import time:       self [us] |  cumulative | imported package"
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        rows.append((int(cumulative_us), name))
+    return sorted(rows, reverse=True)[:n]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget", type=float, default=4.0, help="max median cold start in seconds")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=0, help="also list the N slowest imports")
+    args = parser.parse_args()
+
+    runs = [cold_start() for _ in range(args.runs)]
+    times = [r["seconds"] for r in runs]
+    median = statistics.median(times)
+    print(f"ui.py cold start: median {median:.2f}s, min {min(times):.2f}s, max {max(times):.2f}s "
+          f"over {args.runs} runs (budget {args.budget:.2f}s)")
+    print(f"heavy modules loaded: {', '.join(runs[-1]['modules']) or 'none'}")
+    print(f"sections loaded: {', '.join(runs[-1]['sections']) or 'none'}")
+    unexpected = sorted({m for r in runs for m in r["sections"] if m != DEFAULT_SECTION}
+                        | {m for r in runs for m in r["modules"] if m in NOT_ON_COLD_START})
+
+    if args.top:
+        print("\nslowest imports (cumulative):")
+        for cumulative_us, name in slowest_imports(args.top):
+            print(f"  {cumulative_us / 1e6:8.3f}s  {name.strip()}")
+
+    failed = False
+    if median > args.budget:
+        print("FAIL: cold start exceeds budget")
+        failed = True
+    if unexpected:
+        print(f"FAIL: cold start imported {', '.join(unexpected)}")
+        failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
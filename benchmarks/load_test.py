@@ -0,0 +1,171 @@
+"""Drive the API (real or mock_api.py) with concurrent clients and report capacity.
+
+Each client thread sends requests back to back on its own keep-alive session
+for --duration seconds. Reports throughput (requests and images per second),
+p50/p95/p99 latency of successful requests, and error rates by status.
+
+    python mock_api.py --latency lognormal:0.35,0.4 --slots 4 &
+    python benchmarks/load_test.py --url http://127.0.0.1:8002 --concurrency 1 2 4 8 16
+
+    python benchmarks/load_test.py --endpoint batch_predict --batch-size 8 --out load.json
+
+Several --concurrency levels are run one after another, which gives the
+throughput/latency curve to read capacity from. --background-batches N keeps N
+/batch_predict clients busy throughout, to check that single predictions keep
+their latency while bulk jobs run (the API schedules them ahead of batches).
+
+    python benchmarks/load_test.py --url http://127.0.0.1:8000 --concurrency 1 2 --background-batches 4
+"""
+import argparse
+import sys
+import threading
+import time
+from collections import Counter
+
+import requests
+
+import harness
+
+ENDPOINTS = ("predict", "batch_predict")
+
+
+def make_payloads(endpoint, batch_size, size, fmt, variants=4):
+    """A few distinct request bodies, reused round-robin so encoding is not measured"""
+    images = [(f"load_{i}.{fmt.lower()}", harness.synthetic_image(size, fmt, seed=i))
+              for i in range(max(variants, batch_size))]
+    if endpoint == "predict":
+        return [{"file": images[i]} for i in range(variants)], 1
+    batches = [[("files", images[(i + j) % len(images)]) for j in range(batch_size)] for i in range(variants)]
+    return batches, batch_size
+
+
+def run_level(url, endpoint, payloads, images_per_request, concurrency, duration, timeout):
+    """Run one concurrency level; returns the summary dict"""
+    latencies = []
+    statuses = Counter()
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + duration
+
+    def client(worker):
+        session = requests.Session()
+        session.headers["X-Client-ID"] = f"load-{worker}"  # the API limits concurrency per client
+        i = worker
+        while time.perf_counter() < stop_at:
+            files = payloads[i % len(payloads)]
+            i += 1
+            t0 = time.perf_counter()
+            try:
+                status = session.post(f"{url}/{endpoint}", files=files, timeout=timeout).status_code
+            except requests.RequestException as e:
+                status = type(e).__name__
+            elapsed = time.perf_counter() - t0
+            with lock:
+                statuses[status] += 1
+                if status == 200:
+                    latencies.append(elapsed)
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(w,), daemon=True) for w in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - started
+
+    total = sum(statuses.values())
+    ok = statuses.get(200, 0)
+    summary = {
+        "concurrency": concurrency,
+        "requests": total,
+        "ok": ok,
+        "error_rate": (total - ok) / total if total else 0.0,
+        "errors": {str(k): v for k, v in statuses.items() if k != 200},
+        "requests_per_s": ok / wall,
+        "images_per_s": ok * images_per_request / wall,
+    }
+    for q in (50, 95, 99):
+        summary[f"p{q}"] = harness.percentile(latencies, q) if latencies else None
+    return summary
+
+
+def background_batches(url, clients, batch_size, stop, timeout):
+    """Start clients that post /batch_predict back to back until stop is set"""
+    payloads, _ = make_payloads("batch_predict", batch_size, (2048, 1536), "JPEG")
+
+    def client(worker):
+        session = requests.Session()
+        session.headers["X-Client-ID"] = f"background-{worker}"
+        i = worker
+        while not stop.is_set():
+            try:
+                session.post(f"{url}/batch_predict", files=payloads[i % len(payloads)], timeout=timeout)
+            except requests.RequestException:
+                time.sleep(1)
+            i += 1
+
+    threads = [threading.Thread(target=client, args=(w,), daemon=True) for w in range(clients)]
+    for t in threads:
+        t.start()
+    return threads
+
+
+def format_ms(seconds):
+    return f"{seconds * 1e3:9.1f}" if seconds is not None else f"{'-':>9}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8002", help="API base URL (default: mock API)")
+    parser.add_argument("--endpoint", default="predict", choices=ENDPOINTS)
+    parser.add_argument("--batch-size", type=int, default=8, help="images per /batch_predict request")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--duration", type=float, default=30, help="seconds per concurrency level")
+    parser.add_argument("--image-size", type=int, nargs=2, default=[2048, 1536], metavar=("W", "H"))
+    parser.add_argument("--format", default="JPEG", choices=["JPEG", "PNG", "TIFF"])
+    parser.add_argument("--timeout", type=float, default=180)
+    parser.add_argument("--background-batches", type=int, default=0,
+                        help="/batch_predict clients kept running alongside every level")
+    parser.add_argument("--out", help="write results as JSON to this path")
+    args = parser.parse_args()
+
+    try:
+        ready = requests.get(f"{args.url}/health/ready", timeout=5)
+    except requests.RequestException as e:
+        sys.exit(f"API not reachable at {args.url}: {e}")
+    if ready.status_code != 200:
+        sys.exit(f"API at {args.url} is not ready yet: {ready.text}")
+
+    payloads, images_per_request = make_payloads(args.endpoint, args.batch_size,
+                                                 tuple(args.image_size), args.format)
+    print(f"{args.endpoint} against {args.url}, {images_per_request} image(s)/request, "
+          f"{args.duration:.0f}s per level")
+    print(f"{'clients':>7} {'req/s':>8} {'img/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+
+    stop = threading.Event()
+    if args.background_batches:
+        background_batches(args.url, args.background_batches, args.batch_size, stop, args.timeout)
+        print(f"with {args.background_batches} background /batch_predict client(s)")
+
+    levels = []
+    for concurrency in args.concurrency:
+        s = run_level(args.url, args.endpoint, payloads, images_per_request, concurrency,
+                      args.duration, args.timeout)
+        levels.append(s)
+        print(f"{concurrency:>7} {s['requests_per_s']:8.2f} {s['images_per_s']:8.2f} {format_ms(s['p50'])} "
+              f"{format_ms(s['p95'])} {format_ms(s['p99'])} {s['error_rate']:7.1%}"
+              + (f"  {s['errors']}" if s["errors"] else ""))
+    stop.set()
+
+    if args.out:
+        harness.write_json(args.out, {
+            "environment": harness.environment(),
+            "target": {"url": args.url, "endpoint": args.endpoint, "images_per_request": images_per_request,
+                       "image_size": args.image_size, "format": args.format, "duration": args.duration,
+                       "background_batches": args.background_batches},
+            "levels": levels,
+        })
+        print(f"wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""Peak memory of /batch_predict as a function of batch size.
+
+Every batch size runs in a fresh interpreter (RSS high-water marks never go
+down), which loads api.py, warms up with a single image, then sends one batch
+through TestClient and reports how far peak RSS rose above the warmed-up
+process. With bounded per-image memory the growth should level off rather
+than rise linearly with batch size.
+
+    python benchmarks/memory_profile.py
+    python benchmarks/memory_profile.py --sizes 1 4 16 64 --format TIFF --plot memory.png
+    python benchmarks/memory_profile.py --no-images    # as the UI calls it (include_images=false)
+    python benchmarks/memory_profile.py --trace        # also tracemalloc peaks (slower)
+
+Linux/macOS only (uses ru_maxrss).
+"""
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+
+import harness
+
+
+def child(args):
+    """Runs in the subprocess: one warmed-up batch, result printed as JSON"""
+    import tracemalloc
+    from fastapi.testclient import TestClient
+
+    api, _ = harness.load_api()
+    from utils import memory
+
+    client = TestClient(api.app)
+    size = tuple(args.image_size)
+    form = {"include_images": "false" if args.no_images else "true"}
+
+    def post(n, seed):
+        files = [("files", (f"case_{i}.{args.format.lower()}", harness.synthetic_image(size, args.format, seed + i)))
+                 for i in range(n)]
+        client.post("/batch_predict", files=files, data=form).raise_for_status()
+
+    post(1, 0)
+    if args.trace:
+        tracemalloc.start()
+    before = memory.max_rss_bytes()
+    rss_before = memory.rss_bytes()
+    post(args.child, 1000)
+    print(json.dumps({
+        "batch_size": args.child,
+        "rss_before": rss_before,
+        "peak_rss": memory.max_rss_bytes(),
+        "peak_growth": max(0, memory.max_rss_bytes() - max(before, rss_before or 0)),
+        "alloc_peak": tracemalloc.get_traced_memory()[1] if args.trace else None,
+    }))
+
+
+def plot(rows, path, title):
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    sizes = [r["batch_size"] for r in rows]
+    fig, ax = plt.subplots(figsize=(7, 4))
+    ax.plot(sizes, [r["peak_growth"] / 2 ** 20 for r in rows], marker="o", label="peak RSS growth")
+    if rows[0]["alloc_peak"] is not None:
+        ax.plot(sizes, [r["alloc_peak"] / 2 ** 20 for r in rows], marker="s", label="tracemalloc peak")
+    ax.set_xlabel("images per /batch_predict request")
+    ax.set_ylabel("MB")
+    ax.set_title(title)
+    ax.grid(alpha=0.3)
+    ax.legend()
+    fig.tight_layout()
+    fig.savefig(path, dpi=120)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--image-size", type=int, nargs=2, default=[2048, 1536], metavar=("W", "H"))
+    parser.add_argument("--format", default="TIFF", choices=["JPEG", "PNG", "TIFF"])
+    parser.add_argument("--no-images", action="store_true", help="send include_images=false")
+    parser.add_argument("--trace", action="store_true", help="also report tracemalloc peaks")
+    parser.add_argument("--out", help="write results as JSON to this path")
+    parser.add_argument("--plot", help="write a PNG chart to this path (needs matplotlib)")
+    parser.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args)
+        return
+
+    standins = harness.prepare_environment(tempfile.mkdtemp(prefix="earscope-mem-"))
+    passthrough = ["--image-size", *map(str, args.image_size), "--format", args.format]
+    passthrough += ["--no-images"] * args.no_images + ["--trace"] * args.trace
+
+    rows = []
+    print(f"{'batch':>5} {'peak RSS MB':>12} {'growth MB':>10} {'MB/image':>9} {'alloc MB':>9}")
+    for n in args.sizes:
+        proc = subprocess.run([sys.executable, __file__, "--child", str(n), *passthrough],
+                              capture_output=True, text=True)
+        if proc.returncode != 0:
+            sys.exit(f"batch size {n} failed:\n{proc.stderr}")
+        row = json.loads(proc.stdout.strip().splitlines()[-1])
+        rows.append(row)
+        alloc = f"{row['alloc_peak'] / 2 ** 20:9.1f}" if row["alloc_peak"] is not None else f"{'-':>9}"
+        print(f"{n:>5} {row['peak_rss'] / 2 ** 20:12.1f} {row['peak_growth'] / 2 ** 20:10.1f} "
+              f"{row['peak_growth'] / 2 ** 20 / n:9.2f} {alloc}")
+
+    title = f"{args.format} {args.image_size[0]}x{args.image_size[1]}" + (", no images" if args.no_images else "")
+    if args.out:
+        harness.write_json(args.out, {"environment": harness.environment(), "standins": standins,
+                                      "config": title, "results": rows})
+        print(f"wrote {args.out}")
+    if args.plot:
+        plot(rows, args.plot, f"/batch_predict peak memory ({title})")
+        print(f"wrote {args.plot}")
+
+
+if __name__ == "__main__":
+    main()
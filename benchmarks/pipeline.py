@@ -0,0 +1,144 @@
+"""Time each stage of the API pipeline in isolation and end to end.
+
+Stages: decode + resize (per input format), normalisation, stage 1 and stage 2
+inference, Grad-CAM, base64 PNG encoding of the overlay, and full /predict and
+/batch_predict requests through FastAPI's TestClient. Inputs are synthetic
+images of realistic sizes (see harness.IMAGE_CASES). Without the trained .pth
+files, randomly initialised mobilenet_v3_large stand-ins are used.
+
+    python benchmarks/pipeline.py --out before.json
+    git checkout my-branch
+    python benchmarks/pipeline.py --out after.json
+    python benchmarks/pipeline.py --compare before.json after.json
+
+    python benchmarks/pipeline.py --only gradcam --repeat 50    # substring filter
+
+--compare prints the median change per benchmark and marks those slower than
+--threshold (default 10%).
+"""
+import argparse
+import sys
+
+import harness
+
+BATCH_SIZE = 8
+
+
+def build_benchmarks(api, client):
+    """Return [(name, fn)]; every fn is self-contained so it can be timed alone"""
+    import numpy as np
+    import torch
+
+    benchmarks = []
+    for label, size, fmt in harness.IMAGE_CASES:
+        data = harness.synthetic_image(size, fmt)
+        benchmarks.append((f"load_resized[{label}]", lambda data=data: api.load_resized(data)))
+
+    resized = api.load_resized(harness.synthetic_image())
+    orig_img, img_tensor = api.normalize_to_tensor(resized)
+    orig_hwc = np.transpose(orig_img, (1, 2, 0))
+    models = api.registry.active
+    overlay = api.generate_gradcam(models.stage1, api.target_layers(models.stage1), img_tensor, orig_hwc)
+
+    def forward(model):
+        with torch.no_grad():
+            model(img_tensor)
+
+    benchmarks += [
+        ("normalize_to_tensor", lambda: api.normalize_to_tensor(resized)),
+        ("stage1_inference", lambda: forward(models.stage1)),
+        ("stage2_inference", lambda: forward(models.stage2)),
+        ("gradcam_stage1", lambda: api.generate_gradcam(models.stage1, api.target_layers(models.stage1),
+                                                        img_tensor, orig_hwc)),
+        ("gradcam_stage2", lambda: api.generate_gradcam(models.stage2, api.target_layers(models.stage2),
+                                                        img_tensor, orig_hwc)),
+        ("encode_image_to_base64", lambda: api.encode_image_to_base64(overlay)),
+    ]
+
+    for label, size, fmt in harness.IMAGE_CASES:
+        data = harness.synthetic_image(size, fmt, seed=1)
+        name = f"{label}.{fmt.lower()}"
+        benchmarks.append((f"predict[{label}]", lambda data=data, name=name: _post(
+            client, "/predict", files={"file": (name, data)})))
+
+    batch = [("files", (f"case_{i}.jpg", harness.synthetic_image(seed=i + 10, fmt="JPEG")))
+             for i in range(BATCH_SIZE)]
+    benchmarks.append((f"batch_predict[{BATCH_SIZE}x jpeg_2048x1536]",
+                       lambda: _post(client, "/batch_predict", files=batch)))
+    return benchmarks
+
+
+def _post(client, path, **kwargs):
+    response = client.post(path, **kwargs)
+    response.raise_for_status()
+
+
+def run_benchmarks(only=None, repeat=20, warmup=3):
+    """Run every benchmark in-process against api.py; returns (results, standins)"""
+    from fastapi.testclient import TestClient
+
+    api, standins = harness.load_api()
+    if standins:
+        print(f"note: using random mobilenet_v3_large stand-ins for {', '.join(standins)}", file=sys.stderr)
+    client = TestClient(api.app)
+
+    results = {}
+    for name, fn in build_benchmarks(api, client):
+        if only and only not in name:
+            continue
+        # End-to-end requests are slow enough that fewer repeats are still stable
+        n = max(3, repeat // 4) if "predict" in name else repeat
+        results[name] = harness.summarize(harness.measure(fn, repeat=n, warmup=warmup))
+        stats = results[name]
+        print(f"{name:40} median {stats['median'] * 1e3:9.2f} ms   p95 {stats['p95'] * 1e3:9.2f} ms   "
+              f"(n={stats['n']})")
+    return results, standins
+
+
+def run(args):
+    results, standins = run_benchmarks(args.only, args.repeat, args.warmup)
+    payload = {"environment": harness.environment(), "standins": standins, "results": results}
+    if args.out:
+        harness.write_json(args.out, payload)
+        print(f"wrote {args.out}")
+
+
+def compare(base_path, new_path, threshold):
+    """Print median changes between two result files; returns the number of regressions"""
+    base, new = harness.read_json(base_path), harness.read_json(new_path)
+    if base.get("standins") != new.get("standins"):
+        print("warning: runs used different models (stand-ins vs trained weights)")
+    regressions = 0
+    print(f"{'benchmark':40} {'base ms':>10} {'new ms':>10} {'change':>8}")
+    for name in sorted(set(base["results"]) | set(new["results"])):
+        old, cur = base["results"].get(name), new["results"].get(name)
+        if old is None or cur is None:
+            print(f"{name:40} {'(only in ' + ('new' if old is None else 'base') + ')':>21}")
+            continue
+        change = cur["median"] / old["median"] - 1
+        slower = change > threshold
+        regressions += slower
+        print(f"{name:40} {old['median'] * 1e3:10.2f} {cur['median'] * 1e3:10.2f} {change:+8.1%}"
+              f"{'  SLOWER' if slower else ''}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", help="write results as JSON to this path")
+    parser.add_argument("--only", help="run only benchmarks whose name contains this string")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "NEW"), help="compare two result files")
+    parser.add_argument("--threshold", type=float, default=0.10, help="relative slowdown to flag in --compare")
+    args = parser.parse_args()
+
+    if args.compare:
+        regressions = compare(*args.compare, args.threshold)
+        print(f"\n{regressions} benchmark(s) slower than {args.threshold:.0%}")
+    else:
+        run(args)
+
+
+if __name__ == "__main__":
+    main()
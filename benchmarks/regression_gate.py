@@ -0,0 +1,111 @@
+"""Fail when the API pipeline got slower than the committed baseline.
+
+Runs the scenarios from pipeline.py in-process against api.py (FastAPI
+TestClient for the end-to-end requests) and compares each scenario's p50 and
+p95 with benchmarks/baseline.json. A scenario fails when a metric exceeds
+baseline * (1 + tolerance). Exits 1 on any failure, with one line per metric.
+
+    python benchmarks/regression_gate.py
+    python benchmarks/regression_gate.py --only predict
+    python benchmarks/regression_gate.py --update-baseline   # record on the reference machine
+    python benchmarks/regression_gate.py --allow-unrecorded  # while adding new scenarios
+
+Tolerances live in the baseline file: "tolerance" holds the defaults and a
+scenario may override them with its own "tolerance" entry. A scenario with no
+recorded baseline (missing, or null values) fails the gate, since nothing was
+checked, unless --allow-unrecorded is given. Baselines are only meaningful on
+the machine (and with the same model files or stand-ins) they were recorded on;
+both are stored in the file.
+"""
+import argparse
+import os
+import sys
+
+import harness
+import pipeline
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+METRICS = {"p50": "median", "p95": "p95"}
+DEFAULT_TOLERANCE = {"p50": 0.15, "p95": 0.30}
+
+
+def check(baseline, results):
+    """Compare results with the baseline; returns (rows, failures, unrecorded)"""
+    defaults = dict(DEFAULT_TOLERANCE, **baseline.get("tolerance", {}))
+    rows, failures, unrecorded = [], 0, []
+    for name, stats in results.items():
+        expected = baseline.get("scenarios", {}).get(name, {})
+        tolerance = dict(defaults, **expected.get("tolerance", {}))
+        for metric, key in METRICS.items():
+            base = expected.get(metric)
+            current = stats[key]
+            if base is None:
+                unrecorded.append(name)
+                rows.append((name, metric, None, current, None, "not recorded"))
+                continue
+            limit = base * (1 + tolerance[metric])
+            status = "FAIL" if current > limit else "ok"
+            failures += status == "FAIL"
+            rows.append((name, metric, base, current, limit, status))
+    return rows, failures, sorted(set(unrecorded))
+
+
+def _ms(seconds):
+    return f"{seconds * 1e3:10.2f}" if seconds is not None else f"{'-':>10}"
+
+
+def print_rows(rows):
+    print(f"\n{'scenario':40} {'metric':>6} {'baseline':>10} {'current':>10} {'limit':>10} {'change':>8}  status")
+    for name, metric, base, current, limit, status in rows:
+        change = f"{current / base - 1:+8.1%}" if base else f"{'':>8}"
+        print(f"{name:40} {metric:>6} {_ms(base)} {_ms(current)} {_ms(limit)} {change}  {status}")
+
+
+def update_baseline(baseline, results, standins):
+    scenarios = baseline.setdefault("scenarios", {})
+    for name, stats in results.items():
+        entry = scenarios.setdefault(name, {})
+        for metric, key in METRICS.items():
+            entry[metric] = round(stats[key], 6)
+    baseline["environment"] = harness.environment()
+    baseline["standins"] = standins
+    baseline.setdefault("tolerance", dict(DEFAULT_TOLERANCE))
+    harness.write_json(BASELINE_PATH, baseline)
+    print(f"\nupdated {BASELINE_PATH} ({len(results)} scenarios)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", help="run only scenarios whose name contains this string")
+    parser.add_argument("--repeat", type=int, default=30)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--update-baseline", action="store_true", help="record current timings as the baseline")
+    parser.add_argument("--allow-unrecorded", action="store_true",
+                        help="report scenarios without a baseline instead of failing on them")
+    args = parser.parse_args()
+
+    baseline = harness.read_json(BASELINE_PATH) if os.path.exists(BASELINE_PATH) else {}
+    results, standins = pipeline.run_benchmarks(args.only, args.repeat, args.warmup)
+
+    if args.update_baseline:
+        update_baseline(baseline, results, standins)
+        return
+
+    if baseline.get("standins") is not None and baseline["standins"] != standins:
+        print("warning: baseline was recorded with different models (stand-ins vs trained weights)")
+
+    rows, failures, unrecorded = check(baseline, results)
+    print_rows(rows)
+    if unrecorded:
+        print(f"\n{len(unrecorded)} scenario(s) have no baseline yet; record one with --update-baseline")
+    if failures:
+        print(f"\nFAIL: {failures} metric(s) over tolerance")
+        sys.exit(1)
+    if unrecorded and not args.allow_unrecorded:
+        print(f"\nFAIL: {len(unrecorded)} scenario(s) unchecked (pass --allow-unrecorded to accept)")
+        sys.exit(1)
+    print("\nPASS")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Sweep runtime settings on this host and recommend the fastest one.
+
+Each combination of worker processes, torch intra-op/inter-op threads,
+inference executor size and core pinning is started as `serve.py` with the
+matching EARSCOPE_* variables (see utils/runtime.py) and driven at the same
+offered load by --clients concurrent clients. The best setting is the one with
+the highest image throughput, without errors, and within --p95-slo if given.
+
+    python benchmarks/thread_sweep.py
+    python benchmarks/thread_sweep.py --workers 1 2 4 --intra 1 2 4 8 --pin off auto --p95-slo 2.0
+    python benchmarks/thread_sweep.py --write-config runtime.json   # then EARSCOPE_RUNTIME_CONFIG=runtime.json
+
+Combinations using more than --max-oversubscription x the physical cores
+worth of torch threads are skipped.
+"""
+import argparse
+import itertools
+import json
+import tempfile
+
+import requests
+
+import harness
+import load_test
+import worker_scaling
+from utils import runtime
+
+
+def combinations(args, cores):
+    intra_options = args.intra or sorted({1, 2, 4, 8, 16, cores} & set(range(1, cores + 1)))
+    for workers, intra, inter, inference_workers, pin in itertools.product(
+            args.workers, intra_options, args.inter, args.inference_workers, args.pin):
+        if workers * inference_workers * intra > cores * args.max_oversubscription:
+            continue
+        if pin == "auto" and workers == 1:
+            continue  # same as "off" for a single worker
+        yield {"workers": workers, "intra_op_threads": intra, "inter_op_threads": inter,
+               "inference_workers": inference_workers, "pin_cores": pin}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2])
+    parser.add_argument("--intra", type=int, nargs="+", help="intra-op threads (default: powers of two up to cores)")
+    parser.add_argument("--inter", type=int, nargs="+", default=[1])
+    parser.add_argument("--inference-workers", type=int, nargs="+", default=[1, 2])
+    parser.add_argument("--pin", nargs="+", default=["off", "auto"])
+    parser.add_argument("--max-oversubscription", type=float, default=1.0)
+    parser.add_argument("--clients", type=int, default=8, help="concurrent clients, the same for every setting")
+    parser.add_argument("--endpoint", default="predict", choices=load_test.ENDPOINTS)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--port", type=int, default=8011)
+    parser.add_argument("--timeout", type=float, default=180)
+    parser.add_argument("--p95-slo", type=float, help="only recommend settings with p95 latency below this (s)")
+    parser.add_argument("--out", help="write all results as JSON to this path")
+    parser.add_argument("--write-config", help="write the recommended settings as a runtime config file")
+    args = parser.parse_args()
+
+    cores = runtime.physical_cores()
+    standins = harness.prepare_environment(tempfile.mkdtemp(prefix="earscope-sweep-"))
+    payloads, images_per_request = load_test.make_payloads(args.endpoint, args.batch_size, (2048, 1536), "JPEG")
+    print(f"{cores} physical core(s); {args.clients} clients on {args.endpoint}, {args.duration:.0f}s per setting\n")
+    print(f"{'workers':>7} {'intra':>5} {'inter':>5} {'exec':>4} {'pin':>5} {'img/s':>8} {'p50 ms':>9} "
+          f"{'p95 ms':>9} {'errors':>7}")
+
+    rows = []
+    for setting in combinations(args, cores):
+        env = {f"EARSCOPE_{k.upper()}": str(v) for k, v in setting.items()}
+        with worker_scaling.serve(setting["workers"], args.port, env=env) as (url, _):
+            s = worker_scaling.measure(url, args.clients, args, payloads, images_per_request)
+            s["effective"] = requests.get(f"{url}/admin/runtime", timeout=10).json()
+        s["setting"] = setting
+        rows.append(s)
+        print(f"{setting['workers']:>7} {setting['intra_op_threads']:>5} {setting['inter_op_threads']:>5} "
+              f"{setting['inference_workers']:>4} {setting['pin_cores']:>5} {s['images_per_s']:8.2f} "
+              f"{load_test.format_ms(s['p50'])} {load_test.format_ms(s['p95'])} {s['error_rate']:7.1%}")
+
+    eligible = [r for r in rows if r["error_rate"] == 0 and r["p95"] is not None
+                and (args.p95_slo is None or r["p95"] <= args.p95_slo)]
+    if args.out:
+        harness.write_json(args.out, {"environment": harness.environment(), "standins": standins,
+                                      "physical_cores": cores, "clients": args.clients, "results": rows})
+        print(f"\nwrote {args.out}")
+    if not eligible:
+        print("\nno setting met the criteria")
+        return
+
+    best = max(eligible, key=lambda r: r["images_per_s"])
+    print(f"\nrecommended ({best['images_per_s']:.2f} img/s, p95 {best['p95'] * 1e3:.0f} ms):")
+    print(json.dumps(best["setting"], indent=2))
+    if args.write_config:
+        harness.write_json(args.write_config, best["setting"])
+        print(f"wrote {args.write_config}; use it with {runtime.CONFIG_ENV}={args.write_config}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""Throughput of serve.py as the number of forked workers grows.
+
+For each worker count, starts `serve.py --workers N` (default thread split:
+physical cores / N per worker), drives it with load_test.py's client loop at
+--clients-per-worker x N concurrent clients, and records throughput, latency
+and the total proportional set size (PSS) of the server processes. PSS counts
+shared pages once, so it shows whether the model weights stay shared
+copy-on-write as workers are added.
+
+    python benchmarks/worker_scaling.py --workers 1 2 4 --duration 30 --out scaling.json
+    python benchmarks/worker_scaling.py --endpoint batch_predict --batch-size 8
+
+POSIX only, like serve.py. PSS is reported on Linux only.
+"""
+import argparse
+import contextlib
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+
+import harness
+import load_test
+
+STARTUP_TIMEOUT = 180
+
+
+def wait_ready(url, proc):
+    """Wait until a worker reports ready, i.e. has warmed up its models"""
+    deadline = time.monotonic() + STARTUP_TIMEOUT
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"serve.py exited with status {proc.returncode}")
+        try:
+            if requests.get(f"{url}/health/ready", timeout=2).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError("serve.py did not start in time")
+
+
+def process_tree(pid):
+    """pid and all its descendants (Linux)"""
+    pids = [pid]
+    for p in pids:
+        try:
+            with open(f"/proc/{p}/task/{p}/children") as f:
+                pids += [int(c) for c in f.read().split()]
+        except OSError:
+            pass
+    return pids
+
+
+def total_pss(pid):
+    """Summed PSS in bytes of a process tree, or None where smaps_rollup is unavailable"""
+    total = 0
+    for p in process_tree(pid):
+        try:
+            with open(f"/proc/{p}/smaps_rollup") as f:
+                for line in f:
+                    if line.startswith("Pss:"):
+                        total += int(line.split()[1]) * 1024
+                        break
+        except OSError:
+            return None
+    return total
+
+
+@contextlib.contextmanager
+def serve(workers, port, args=(), env=None):
+    """Run serve.py until the block exits; yields (base URL, process)"""
+    url = f"http://127.0.0.1:{port}"
+    cmd = [sys.executable, os.path.join(harness.ROOT, "serve.py"), "--workers", str(workers),
+           "--port", str(port), "--log-level", "warning", *args]
+    proc = subprocess.Popen(cmd, cwd=harness.ROOT, env=dict(os.environ, **(env or {})))
+    try:
+        wait_ready(url, proc)
+        yield url, proc
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        try:
+            proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def measure(url, clients, args, payloads, images_per_request):
+    """Warm every worker with a short pass, then one measured load_test level"""
+    load_test.run_level(url, args.endpoint, payloads, images_per_request, clients, 5, args.timeout)
+    return load_test.run_level(url, args.endpoint, payloads, images_per_request, clients,
+                               args.duration, args.timeout)
+
+
+def run_workers(workers, args, payloads, images_per_request):
+    extra = ["--threads", str(args.threads)] if args.threads else []
+    with serve(workers, args.port, extra) as (url, proc):
+        summary = measure(url, workers * args.clients_per_worker, args, payloads, images_per_request)
+        summary["workers"] = workers
+        summary["pss_bytes"] = total_pss(proc.pid)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--threads", type=int, help="torch threads per worker (default: serve.py's split)")
+    parser.add_argument("--clients-per-worker", type=int, default=2)
+    parser.add_argument("--endpoint", default="predict", choices=load_test.ENDPOINTS)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--port", type=int, default=8010)
+    parser.add_argument("--timeout", type=float, default=180)
+    parser.add_argument("--out", help="write results as JSON to this path")
+    args = parser.parse_args()
+
+    standins = harness.prepare_environment(tempfile.mkdtemp(prefix="earscope-scaling-"))
+    payloads, images_per_request = load_test.make_payloads(args.endpoint, args.batch_size, (2048, 1536), "JPEG")
+
+    rows = []
+    print(f"{'workers':>7} {'clients':>7} {'img/s':>8} {'speedup':>8} {'eff.':>6} {'p50 ms':>9} {'p95 ms':>9} "
+          f"{'errors':>7} {'PSS MB':>8}")
+    for workers in args.workers:
+        s = run_workers(workers, args, payloads, images_per_request)
+        rows.append(s)
+        speedup = s["images_per_s"] / rows[0]["images_per_s"] * rows[0]["workers"] if rows[0]["images_per_s"] else 0
+        pss = f"{s['pss_bytes'] / 2 ** 20:8.0f}" if s["pss_bytes"] else f"{'-':>8}"
+        print(f"{workers:>7} {s['concurrency']:>7} {s['images_per_s']:8.2f} {speedup:8.2f} {speedup / workers:6.0%} "
+              f"{load_test.format_ms(s['p50'])} {load_test.format_ms(s['p95'])} {s['error_rate']:7.1%} {pss}")
+
+    if args.out:
+        harness.write_json(args.out, {"environment": harness.environment(), "standins": standins,
+                                      "endpoint": args.endpoint, "levels": rows})
+        print(f"wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
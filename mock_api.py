@@ -0,0 +1,215 @@
+"""Stand-in for api.py that needs no models, for UI work and capacity planning.
+
+Serves /predict, /batch_predict, /outputs, /models and /health/* with the same response shapes as
+the real API, after a simulated processing delay. Point utils/api_client.py at
+it with USE_MOCK_API = True (or EARSCOPE_API_URL=http://127.0.0.1:8002).
+
+    python mock_api.py
+    python mock_api.py --latency lognormal:0.35,0.4 --slots 2 --error-rate 0.01
+
+Latency specs, in seconds per image (batches pay once per image):
+    fixed:S            always S
+    uniform:LO,HI      uniform between LO and HI
+    normal:MU,SIGMA    normal, clipped at 0
+    lognormal:MED,SIG  lognormal with median MED and shape SIGMA (long right tail)
+
+--slots bounds how many images are "processed" at once, like the CPU-bound
+real API; requests beyond that queue. The same settings can be given as
+EARSCOPE_MOCK_LATENCY, EARSCOPE_MOCK_SLOTS and EARSCOPE_MOCK_ERROR_RATE.
+"""
+import argparse
+import asyncio
+import base64
+import io
+import math
+import os
+import random
+import uuid
+
+from fastapi import FastAPI, File, Form, HTTPException, UploadFile
+from fastapi.responses import JSONResponse, Response
+from fastapi.middleware.cors import CORSMiddleware
+from PIL import Image
+
+CLASS_NAMES_STAGE1 = ["Normal", "Abnormal", "Earwax"]
+CLASS_NAMES_STAGE2 = ["AOM", "COM"]
+
+# Real overlays are 500x500 PNGs; the mock returns one of the same size so payloads are realistic
+OVERLAY_SIZE = (500, 500)
+
+LATENCY = os.environ.get("EARSCOPE_MOCK_LATENCY", "lognormal:0.35,0.4")
+SLOTS = int(os.environ.get("EARSCOPE_MOCK_SLOTS", "0"))  # 0 = unlimited
+ERROR_RATE = float(os.environ.get("EARSCOPE_MOCK_ERROR_RATE", "0"))
+
+
+# ------------------------
+# Simulation
+# ------------------------
+def parse_latency(spec):
+    """Turn a latency spec such as "lognormal:0.35,0.4" into a zero-argument sampler"""
+    kind, _, args = spec.partition(":")
+    params = [float(x) for x in args.split(",")] if args else []
+    samplers = {
+        "fixed": (1, lambda s: s),
+        "uniform": (2, lambda lo, hi: random.uniform(lo, hi)),
+        "normal": (2, lambda mu, sigma: max(0.0, random.gauss(mu, sigma))),
+        "lognormal": (2, lambda median, sigma: random.lognormvariate(math.log(median), sigma)),
+    }
+    if kind not in samplers or len(params) != samplers[kind][0]:
+        raise ValueError(f"Invalid latency spec {spec!r}; see mock_api.py --help")
+    sample = samplers[kind][1]
+    return lambda: sample(*params)
+
+
+def configure(latency=None, slots=None, error_rate=None):
+    global sample_latency, slot_semaphore, ERROR_RATE
+    if latency is not None:
+        sample_latency = parse_latency(latency)
+    if slots is not None:
+        slot_semaphore = asyncio.Semaphore(slots) if slots > 0 else None
+    if error_rate is not None:
+        ERROR_RATE = error_rate
+
+
+sample_latency = parse_latency(LATENCY)
+slot_semaphore = asyncio.Semaphore(SLOTS) if SLOTS > 0 else None
+
+
+async def simulate_work(images):
+    """Sleep for one latency sample per image, holding a processing slot if slots are limited"""
+    if random.random() < ERROR_RATE:
+        raise HTTPException(status_code=503, detail="Simulated overload", headers={"Retry-After": "1"})
+    delay = sum(sample_latency() for _ in range(images))
+    if slot_semaphore is None:
+        await asyncio.sleep(delay)
+    else:
+        async with slot_semaphore:
+            await asyncio.sleep(delay)
+
+
+def make_overlay_png():
+    img = Image.effect_noise(OVERLAY_SIZE, 24).convert("RGB")
+    buf = io.BytesIO()
+    img.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+OVERLAY_PNG = make_overlay_png()
+OVERLAY_B64 = base64.b64encode(OVERLAY_PNG).decode("utf-8")
+
+
+def fake_result(analysis_id):
+    """Random but internally consistent prediction in the real API's shape"""
+    probs1 = [random.random() for _ in CLASS_NAMES_STAGE1]
+    total = sum(probs1)
+    probs1 = [p / total for p in probs1]
+    pred1 = max(range(len(probs1)), key=probs1.__getitem__)
+    stage1_class = CLASS_NAMES_STAGE1[pred1]
+    if stage1_class == "Abnormal":
+        referral = "Urgent"
+    elif probs1[pred1] < 0.70:
+        referral = "Routine"
+    else:
+        referral = "No Referral"
+
+    result = {
+        "analysis_id": analysis_id,
+        "stage1_prediction": stage1_class,
+        "stage1_probabilities": dict(zip(CLASS_NAMES_STAGE1, probs1)),
+        "referral": referral,
+        "confidence": probs1[pred1],
+        "model_version": "mock",
+        "gradcam_url": f"/outputs/{analysis_id}_gradcam.png",
+    }
+    if stage1_class == "Abnormal":
+        p = random.random()
+        probs2 = [p, 1 - p]
+        pred2 = 0 if p >= 0.5 else 1
+        result["stage2_prediction"] = CLASS_NAMES_STAGE2[pred2]
+        result["stage2_probabilities"] = dict(zip(CLASS_NAMES_STAGE2, probs2))
+        result["stage2_confidence"] = probs2[pred2]
+    return result
+
+
+def new_analysis_id():
+    return f"A-{uuid.uuid4().hex[:12].upper()}"
+
+
+# ------------------------
+# FastAPI App
+# ------------------------
+app = FastAPI(title="EarScope Mock API", description="Model-free stand-in for capacity planning")
+
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+
+@app.post("/predict")
+async def predict(file: UploadFile = File(...), patient_id: str = Form(None), clinician: str = Form(None)):
+    await file.read()
+    await simulate_work(1)
+    result = fake_result(new_analysis_id())
+    result["gradcam"] = OVERLAY_B64
+    return JSONResponse(content=result)
+
+
+@app.post("/batch_predict")
+async def batch_predict(files: list[UploadFile] = File(...), clinician: str = Form(None),
+                        batch_id: str = Form(None), include_images: bool = Form(True)):
+    batch_id = batch_id or f"B-{uuid.uuid4().hex[:8].upper()}"
+    for file in files:
+        await file.read()
+    await simulate_work(len(files))
+
+    results = []
+    for file in files:
+        result = fake_result(new_analysis_id())
+        result["filename"] = file.filename
+        if include_images:
+            result["original_image"] = OVERLAY_B64
+        results.append(result)
+    return JSONResponse(content={"batch_id": batch_id, "results": results})
+
+
+@app.get("/outputs/{name}")
+async def outputs(name: str):
+    return Response(content=OVERLAY_PNG, media_type="image/png")
+
+
+@app.get("/models")
+async def list_models():
+    return {"active": {"version": "mock", "state": "active"}, "previous": None, "loading": None, "events": []}
+
+
+@app.get("/health/live")
+async def health_live():
+    return {"status": "alive", "pid": os.getpid()}
+
+
+@app.get("/health/ready")
+async def health_ready():
+    return {"status": "ready", "model_version": "mock", "warmup_s": 0.0}
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8002)
+    parser.add_argument("--latency", default=LATENCY, help="per-image latency spec")
+    parser.add_argument("--slots", type=int, default=SLOTS, help="images processed concurrently (0 = unlimited)")
+    parser.add_argument("--error-rate", type=float, default=ERROR_RATE, help="fraction of requests answered 503")
+    args = parser.parse_args()
+
+    configure(args.latency, args.slots, args.error_rate)
+    uvicorn.run(app, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
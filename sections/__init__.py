@@ -0,0 +1,25 @@
+import importlib
+import uuid
+
+import streamlit as st
+
+# Sidebar label -> (module, option_menu icon). Modules are imported on first
+# navigation, so a session only pays for the pages it actually opens.
+SECTIONS = {
+    "Dashboard": ("sections.dashboard", "speedometer2"),
+    "Single Analysis": ("sections.single_analysis", "camera"),
+    "Batch Processing": ("sections.batch_processing", "images"),
+    "Analysis History": ("sections.history", "clock-history"),
+    "Help & Support": ("sections.help_support", "question-circle"),
+    "About": ("sections.about", "info-circle"),
+}
+
+def load(name):
+    """Import (once per process) and return the section module for a sidebar label"""
+    return importlib.import_module(SECTIONS[name][0])
+
+def client_id():
+    """ID of this browser session, sent as X-Client-ID so the API's per-client limits apply per user"""
+    if "client_id" not in st.session_state:
+        st.session_state.client_id = f"ui-{uuid.uuid4().hex[:12]}"
+    return st.session_state.client_id
@@ -0,0 +1,67 @@
+import streamlit as st
+
+def render():
+    st.markdown("""
+    <style>
+    .about-header {
+        background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
+        padding: 2rem;
+        border-radius: 15px;
+        text-align: center;
+        margin-bottom: 2rem;
+        color: white;
+    }
+    .about-header h1 {
+        color: white !important;
+        margin: 0;
+        font-size: 2.5rem;
+    }
+    .about-header p {
+        color: #f0f4ff;
+        font-size: 1.2rem;
+        margin: 0.5rem 0 0 0;
+    }
+    .about-section {
+        background: white;
+        padding: 1.5rem;
+        border-radius: 12px;
+        box-shadow: 0 2px 10px rgba(0,0,0,0.05);
+        margin: 1rem 0;
+        border-left: 4px solid #667eea;
+    }
+    </style>
+    """, unsafe_allow_html=True)
+
+    # Header
+    st.markdown("""
+    <div class="about-header">
+        <h1>ℹ️ About EarScope AI</h1>
+        <p>AI assisted otitis media screening tool</p>
+    </div>
+    """, unsafe_allow_html=True)
+
+    st.markdown("""
+    <div class="about-section">
+        <h3>🩺 What it does</h3>
+        <p>EarScope AI screens otoscopy images for middle ear infection. A first model
+        classifies each image as Normal, Abnormal or Earwax; abnormal images are passed
+        to a second model that distinguishes acute (AOM) from chronic (COM) otitis media.
+        Grad-CAM heatmaps show which regions of the eardrum drove each prediction.</p>
+    </div>
+    """, unsafe_allow_html=True)
+
+    st.markdown("""
+    <div class="about-section">
+        <h3>📋 Referral criteria</h3>
+        <ul>
+            <li><b>Urgent</b> &mdash; the image is classified as Abnormal.</li>
+            <li><b>Routine</b> &mdash; Normal or Earwax, but with confidence below 70%.</li>
+            <li><b>No Referral</b> &mdash; Normal or Earwax with confidence of 70% or more.</li>
+        </ul>
+    </div>
+    """, unsafe_allow_html=True)
+
+    st.warning(
+        "⚠️ EarScope AI is a screening aid. Its results do not replace examination "
+        "and diagnosis by a qualified clinician."
+    )
@@ -1,255 +1,101 @@
 import streamlit as st
-import requests
-import base64
+import html
 import io
+from concurrent.futures import ThreadPoolExecutor
 from PIL import Image
-from utils.api_client import API_URL
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image as RLImage, Table, TableStyle
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from reportlab.lib import colors
-from reportlab.lib.enums import TA_CENTER, TA_LEFT
-import tempfile
-import os
+from utils import api_client, image_prep
+from sections import client_id
+from sections.common import render_report_download
 from datetime import datetime
 
-def create_pdf_report(result, original_image, filename):
-    """Create a PDF report for a single case"""
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=0.5*inch, bottomMargin=0.5*inch)
-
-    # Get styles
-    styles = getSampleStyleSheet()
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=16,
-        spaceAfter=12,
-        alignment=TA_CENTER,
-        textColor=colors.HexColor('#1f2937')
-    )
-
-    heading_style = ParagraphStyle(
-        'CustomHeading',
-        parent=styles['Heading2'],
-        fontSize=14,
-        spaceAfter=8,
-        textColor=colors.HexColor('#374151')
-    )
-
-    normal_style = ParagraphStyle(
-        'CustomNormal',
-        parent=styles['Normal'],
-        fontSize=11,
-        spaceAfter=6
-    )
-
-    story = []
-
-    # Title
-    story.append(Paragraph("Otoscopy AI Analysis Report", title_style))
-    story.append(Spacer(1, 12))
-
-    # Patient info
-    story.append(Paragraph("Patient Information", heading_style))
-    patient_data = [
-        ['Patient ID:', filename],
-        ['Analysis Date:', datetime.now().strftime('%Y-%m-%d %H:%M:%S')],
-        ['Report Generated:', datetime.now().strftime('%Y-%m-%d %H:%M:%S')]
-    ]
-
-    patient_table = Table(patient_data, colWidths=[2*inch, 4*inch])
-    patient_table.setStyle(TableStyle([
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 11),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-    ]))
-    story.append(patient_table)
-    story.append(Spacer(1, 16))
-
-    # Diagnostic Results
-    story.append(Paragraph("Diagnostic Results", heading_style))
-
-    # Primary Classification
-    primary_pred = result.get("stage1_prediction", "Unknown")
-    primary_conf = result.get("stage1_probabilities", {}).get(primary_pred, 0) * 100
-
-    results_data = [
-        ['Primary Classification:', primary_pred],
-        ['Confidence Level:', f'{primary_conf:.1f}%'],
-    ]
-
-    # Secondary Classification if available
-    if "stage2_prediction" in result:
-        secondary_pred = result["stage2_prediction"]
-        secondary_conf = result["stage2_probabilities"][secondary_pred] * 100
-        results_data.extend([
-            ['Secondary Classification:', secondary_pred],
-            ['Secondary Confidence:', f'{secondary_conf:.1f}%'],
-        ])
-
-    # Referral recommendation
-    referral = result.get("referral", "Unknown")
-    results_data.append(['Referral Recommendation:', referral])
-
-    results_table = Table(results_data, colWidths=[2.5*inch, 3.5*inch])
-    results_table.setStyle(TableStyle([
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 11),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-        ('GRID', (0, 0), (-1, -1), 1, colors.lightgrey),
-    ]))
-    story.append(results_table)
-    story.append(Spacer(1, 20))
-
-    # Images section
-    story.append(Paragraph("Image Analysis", heading_style))
-
-    # Convert original image to bytes for ReportLab
-    orig_img_bytes = io.BytesIO()
-    original_image.save(orig_img_bytes, format='PNG')
-    orig_img_bytes.seek(0)
-
-    # Add original image
-    story.append(Paragraph("Original Image:", normal_style))
-    orig_img = RLImage(orig_img_bytes, width=3*inch, height=3*inch)
-    story.append(orig_img)
-    story.append(Spacer(1, 12))
-
-    # Add Grad-CAM if available
-    if "gradcam_url" in result:
-        try:
-            # Download Grad-CAM image
-            gradcam_response = requests.get(f"{API_URL}{result['gradcam_url']}")
-            if gradcam_response.status_code == 200:
-                gradcam_img_bytes = io.BytesIO(gradcam_response.content)
-
-                story.append(Paragraph("Grad-CAM Heatmap Analysis:", normal_style))
-                gradcam_img = RLImage(gradcam_img_bytes, width=3*inch, height=3*inch)
-                story.append(gradcam_img)
-        except Exception as e:
-            story.append(Paragraph(f"Grad-CAM image could not be included: {str(e)}", normal_style))
-
-    # Footer
-    story.append(Spacer(1, 20))
-    footer_style = ParagraphStyle(
-        'Footer',
-        parent=styles['Normal'],
-        fontSize=9,
-        alignment=TA_CENTER,
-        textColor=colors.grey
-    )
-    story.append(Paragraph("Generated by Otoscopy AI Analysis System", footer_style))
-
-    # Build PDF
-    doc.build(story)
-    buffer.seek(0)
-    return buffer
-
-def create_batch_pdf_report(results, uploaded_files):
-    """Create a comprehensive PDF report for all cases"""
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=0.5*inch, bottomMargin=0.5*inch)
-
-    styles = getSampleStyleSheet()
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=18,
-        spaceAfter=16,
-        alignment=TA_CENTER,
-        textColor=colors.HexColor('#1f2937')
-    )
+# Made once per case when results arrive; 2x the displayed width for sharp HiDPI rendering.
+# Kept in session state as JPEG (~50 KB) rather than a decoded image (~1.5 MB).
+THUMBNAIL_SIZE = (700, 700)
+THUMBNAIL_QUALITY = 85
+THUMBNAIL_WORKERS = 4
+
+CARDS_PER_PAGE = 20
+REFERRAL_LEVELS = ["Urgent", "Routine", "No Referral"]
+URGENCY_ORDER = {level: i for i, level in enumerate(REFERRAL_LEVELS)}
+SORT_KEYS = {
+    "Patient ID": (lambda r: r["filename"], False),
+    "Confidence": (lambda r: r.get("confidence", 0), True),
+    "Referral": (lambda r: (URGENCY_ORDER.get(r.get("referral"), len(URGENCY_ORDER)), -r.get("confidence", 0)), False),
+}
+
+def make_thumbnail(data):
+    """Shrink image bytes into a small JPEG thumbnail, or None if undecodable"""
+    try:
+        img = Image.open(io.BytesIO(data))
+        img.draft("RGB", THUMBNAIL_SIZE)
+        img.thumbnail(THUMBNAIL_SIZE)
+        out = io.BytesIO()
+        img.convert("RGB").save(out, format="JPEG", quality=THUMBNAIL_QUALITY)
+        return out.getvalue()
+    except Exception:
+        return None
+
+def build_case_index(results, uploads):
+    """Map each result's analysis ID to its result and thumbnail
+
+    uploads[i] is the (filename, bytes) that results[i] was computed from, as
+    returned by batch_predict_chunked. Built once per batch so every view looks
+    cases up in O(1) instead of rescanning uploads and re-decoding originals on
+    each rerun.
+    """
+    with ThreadPoolExecutor(max_workers=THUMBNAIL_WORKERS) as pool:
+        thumbnails = pool.map(lambda upload: make_thumbnail(upload[1]), uploads)
+        return {
+            r.get("analysis_id", r["filename"]): {"result": r, "thumbnail": thumb}
+            for r, thumb in zip(results, thumbnails)
+        }
 
-    heading_style = ParagraphStyle(
-        'CustomHeading',
-        parent=styles['Heading2'],
-        fontSize=14,
-        spaceAfter=8,
-        textColor=colors.HexColor('#374151')
+def batch_view(results, sort_by, referrals):
+    """Sorted, filtered results, recomputed only when the batch or the controls change"""
+    key = (st.session_state.get("batch_version"), sort_by, tuple(referrals))
+    cached = st.session_state.get("batch_view")
+    if cached is None or cached["key"] != key:
+        sort_key, reverse = SORT_KEYS[sort_by]
+        selected = set(referrals)
+        view = sorted((r for r in results if r.get("referral") in selected), key=sort_key, reverse=reverse)
+        cached = {"key": key, "results": view}
+        st.session_state.batch_view = cached
+        st.session_state.batch_page = 1
+    return cached["results"]
+
+def run_batch(files, chunk_size, concurrency, optimize=True, batch_id=None, append=False):
+    """Upload files in concurrent chunks, merging results as each chunk returns"""
+    progress = st.progress(0.0, text=f"Analyzing 0 of {len(files)} images...")
+
+    def on_chunk(done, total):
+        progress.progress(done / total, text=f"Analyzing {done} of {total} images...")
+
+    outcome = api_client.batch_predict_chunked(
+        files, chunk_size=int(chunk_size), concurrency=int(concurrency), batch_id=batch_id, on_chunk=on_chunk,
+        prepare=image_prep.prepare_upload if optimize else None, client_id=client_id(),
     )
-
-    story = []
-
-    # Title page
-    story.append(Paragraph("Batch Otoscopy AI Analysis Report", title_style))
-    story.append(Spacer(1, 20))
-
-    # Summary statistics
-    total_cases = len(results)
-    urgent_cases = sum(1 for r in results if r.get("referral", "").lower() == "urgent")
-    routine_cases = sum(1 for r in results if r.get("referral", "").lower() == "routine")
-    no_referral_cases = total_cases - urgent_cases - routine_cases
-
-    story.append(Paragraph("Batch Summary", heading_style))
-    summary_data = [
-        ['Total Cases Analyzed:', str(total_cases)],
-        ['Urgent Referrals:', str(urgent_cases)],
-        ['Routine Referrals:', str(routine_cases)],
-        ['No Referral Needed:', str(no_referral_cases)],
-        ['Analysis Date:', datetime.now().strftime('%Y-%m-%d %H:%M:%S')]
-    ]
-
-    summary_table = Table(summary_data, colWidths=[2.5*inch, 2*inch])
-    summary_table.setStyle(TableStyle([
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 12),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-        ('GRID', (0, 0), (-1, -1), 1, colors.lightgrey),
-    ]))
-    story.append(summary_table)
-    story.append(Spacer(1, 30))
-
-    # Individual case details
-    for i, result in enumerate(results):
-        if i > 0:
-            story.append(Spacer(1, 20))
-
-        filename = result["filename"]
-        story.append(Paragraph(f"Case {i+1}: {filename}", heading_style))
-
-        # Get original image
-        try:
-            original_file = next(f for f in uploaded_files if f.name == filename)
-            original_image = Image.open(original_file)
-
-            # Case results table
-            primary_pred = result.get("stage1_prediction", "Unknown")
-            primary_conf = result.get("stage1_probabilities", {}).get(primary_pred, 0) * 100
-            referral = result.get("referral", "Unknown")
-
-            case_data = [
-                ['Primary Classification:', primary_pred],
-                ['Confidence:', f'{primary_conf:.1f}%'],
-                ['Referral:', referral]
-            ]
-
-            if "stage2_prediction" in result:
-                secondary_pred = result["stage2_prediction"]
-                secondary_conf = result["stage2_probabilities"][secondary_pred] * 100
-                case_data.insert(-1, ['Secondary Classification:', secondary_pred])
-                case_data.insert(-1, ['Secondary Confidence:', f'{secondary_conf:.1f}%'])
-
-            case_table = Table(case_data, colWidths=[2*inch, 3*inch])
-            case_table.setStyle(TableStyle([
-                ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, -1), 10),
-                ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
-            ]))
-            story.append(case_table)
-
-        except StopIteration:
-            story.append(Paragraph(f"Original image not found for {filename}", styles['Normal']))
-
-    # Build PDF
-    doc.build(story)
-    buffer.seek(0)
-    return buffer
+    progress.empty()
+
+    failed = outcome["failed"]
+    if not outcome["results"] and not append:
+        st.error(f"🚫 Batch analysis failed: {next(iter(failed.values()), 'no results returned')}")
+        return
+
+    results = outcome["results"]
+    index = build_case_index(results, outcome["uploads"])
+    if append:
+        results = st.session_state.get("batch_results", []) + results
+        index = dict(st.session_state.get("batch_index", {}), **index)
+    st.session_state.batch_results = results
+    st.session_state.batch_index = index
+    st.session_state.batch_version = st.session_state.get("batch_version", 0) + 1
+    st.session_state.batch_id = outcome["batch_id"]
+    st.session_state.batch_retry = outcome["failed_uploads"]
+
+    if failed:
+        st.warning(f"⚠️ {len(failed)} of {len(files)} images could not be analyzed: {', '.join(failed)}")
+    else:
+        st.success("✅ Batch analysis completed!")
 
 def render():
     st.markdown(
@@ -292,65 +138,81 @@ def render():
         accept_multiple_files=True
     )
 
+    with st.expander("⚙️ Upload settings"):
+        set_col1, set_col2 = st.columns(2)
+        with set_col1:
+            chunk_size = st.number_input("Images per request", min_value=1, max_value=64, value=8)
+        with set_col2:
+            concurrency = st.number_input("Parallel requests", min_value=1, max_value=api_client.BULK_CLIENT_LIMIT,
+                                          value=3)
+        optimize = st.checkbox(
+            "Downscale images to model input size before upload", value=True,
+            help="Does the server's 500x500 resize before upload and re-encodes losslessly, so the model "
+                 "gets exactly the same input as for the full-size upload; uploads are much smaller.",
+        )
+
     if uploaded_files and st.button("🚀 Run Batch Analysis"):
-        with st.spinner("Analyzing all images..."):
-            upload_files = [("files", (f.name, f, "multipart/form-data")) for f in uploaded_files]
-            try:
-                response = requests.post(f"{API_URL}/batch_predict", files=upload_files, timeout=180)
-                if response.status_code == 200:
-                    st.session_state.batch_results = response.json()["results"]
-                    st.session_state.uploaded_files = uploaded_files  # keep originals for later
-                    st.success("✅ Batch analysis completed!")
-                else:
-                    st.error(f"❌ Error {response.status_code}: {response.text}")
-            except Exception as e:
-                st.error(f"🚫 API connection failed: {e}")
+        run_batch([(f.name, f.getvalue()) for f in uploaded_files], chunk_size, concurrency, optimize)
+
+    retry_files = st.session_state.get("batch_retry")
+    if retry_files and st.button(f"🔁 Retry {len(retry_files)} failed image(s)"):
+        run_batch(retry_files, chunk_size, concurrency, optimize, batch_id=st.session_state.batch_id, append=True)
 
     # Show results if available
     if "batch_results" in st.session_state:
         results = st.session_state.batch_results
-        uploaded_files = st.session_state.uploaded_files
+        case_index = st.session_state.get("batch_index", {})
 
         # Controls row
         control_col1, control_col2, control_col3 = st.columns([2, 2, 2])
 
         with control_col1:
             # Sorting
-            sort_by = st.selectbox("🔽 Sort results by", ["Patient ID", "Confidence", "Referral"])
-            if sort_by == "Confidence":
-                results = sorted(results, key=lambda x: x.get("confidence", 0), reverse=True)
-            elif sort_by == "Patient ID":
-                results = sorted(results, key=lambda x: x["filename"])
-            elif sort_by == "Referral":
-                urgency_order = {"Urgent": 0, "Routine": 1, "No Referral": 2}
-                results = sorted(results, key=lambda x: urgency_order.get(x["referral"], 3))
+            sort_by = st.selectbox("🔽 Sort results by", list(SORT_KEYS))
+
+        with control_col2:
+            referrals = st.multiselect("🚦 Referral", REFERRAL_LEVELS, default=REFERRAL_LEVELS)
+
+        results = batch_view(results, sort_by, referrals)
 
         with control_col3:
             # Save All PDF Button
             if st.button("📋 Generate Batch PDF Report", key="save-all-pdf"):
                 try:
-                    with st.spinner("Generating comprehensive PDF report..."):
-                        # Generate batch PDF
-                        pdf_buffer = create_batch_pdf_report(results, uploaded_files)
-
-                        # Download button for batch report
-                        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-                        st.download_button(
-                            label="📄 Download Batch PDF Report",
-                            data=pdf_buffer,
-                            file_name=f"batch_otoscopy_report_{timestamp}.pdf",
-                            mime="application/pdf",
-                            key="download-batch-pdf"
-                        )
-                        st.success(f"✅ Batch PDF report with {len(results)} cases generated successfully!")
-
+                    # Rendered by the API's report workers from the stored results; one PDF
+                    # per REPORT_MAX_CASES cases, the most the API puts in a report
+                    ids = [r["analysis_id"] for r in results]
+                    size = api_client.REPORT_MAX_CASES
+                    st.session_state.batch_report_ids = [
+                        api_client.create_report(ids[i:i + size])["report_id"] for i in range(0, len(ids), size)
+                    ]
                 except Exception as e:
                     st.error(f"❌ Error generating batch PDF: {str(e)}")
 
+            report_ids = st.session_state.get("batch_report_ids") or []
+            if len(report_ids) > 1:
+                st.caption(f"Split into {len(report_ids)} reports of up to {api_client.REPORT_MAX_CASES} cases each.")
+            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+            for part, report_id in enumerate(report_ids, 1):
+                suffix = f"_part{part}" if len(report_ids) > 1 else ""
+                render_report_download(report_id, f"batch_otoscopy_report_{timestamp}{suffix}.pdf",
+                                       f"download-batch-pdf-{part}")
+
         st.markdown("---")
 
+        # Only the current page is rendered; sorting and filtering are cached in batch_view
+        page_count = max(1, -(-len(results) // CARDS_PER_PAGE))
+        st.session_state.batch_page = min(st.session_state.get("batch_page", 1), page_count)
+        page_col1, page_col2 = st.columns([1, 3])
+        with page_col1:
+            page = st.number_input("Page", min_value=1, max_value=page_count, key="batch_page")
+        with page_col2:
+            start = (page - 1) * CARDS_PER_PAGE
+            st.caption(f"Showing {min(start + 1, len(results))}–{min(start + CARDS_PER_PAGE, len(results))} "
+                       f"of {len(results)} results ({len(st.session_state.batch_results)} in batch)")
+
         # Display each case as card
-        for i, res in enumerate(results):
+        for res in results[start:start + CARDS_PER_PAGE]:
             filename = res["filename"]
             prediction = res.get("stage1_prediction", "Unknown")
             conf = res.get("confidence", 0) * 100
@@ -370,9 +232,9 @@ def render():
                     <div style="background:{bg_color}; padding:1rem; border-radius:12px; 
                                 margin-bottom:1rem; display:flex; justify-content:space-between; align-items:center;">
                         <div>
-                            <b>{filename}</b><br>
-                            Prediction: {prediction} ({conf:.1f}%)<br>
-                            Referral: {referral}
+                            <b>{html.escape(filename)}</b><br>
+                            Prediction: {html.escape(prediction)} ({conf:.1f}%)<br>
+                            Referral: {html.escape(referral)}
                         </div>
                         
                     </div>
@@ -381,7 +243,11 @@ def render():
                 )
 
                 # Instead of custom button hack, use Streamlit button with key
-                if st.button(f"🔍 View {filename}", key=f"view-{i}"):
+                # The open case lives in session state so buttons inside it survive reruns
+                case_key = res.get("analysis_id", filename)
+                if st.button(f"🔍 View {filename}", key=f"view-{case_key}"):
+                    st.session_state.batch_view_case = case_key
+                if st.session_state.get("batch_view_case") == case_key:
                     st.markdown(f"### 🧾 Patient: {filename}")
                     
                 
@@ -464,17 +330,19 @@ def render():
                     img_col1, img_col2 = st.columns(2)
                     with img_col1:
                         st.markdown("##### 🖼️ Original Image")
-                        try:
-                            original_file = next(f for f in uploaded_files if f.name == filename)
-                            img = Image.open(original_file)
-                            st.image(img, width=350)
-                        except StopIteration:
+                        thumbnail = case_index.get(case_key, {}).get("thumbnail")
+                        if thumbnail is not None:
+                            st.image(thumbnail, width=350)
+                        else:
                             st.warning("⚠️ Original image not found in upload session.")
 
                     with img_col2:
                         st.markdown("##### 🔥 Heatmap Analysis")
                         if "gradcam_url" in res:
-                            st.image(f"{API_URL}{res['gradcam_url']}", width=350)
+                            try:
+                                st.image(api_client.fetch_artifact(res["gradcam_url"]), width=350)
+                            except Exception as e:
+                                st.warning(f"⚠️ Heatmap could not be loaded: {e}")
                         else:
                             st.warning("⚠️ No heatmap available.")
 
@@ -482,26 +350,16 @@ def render():
                     st.markdown("---")
                     col_pdf, col_spacer = st.columns([1, 3])
                     with col_pdf:
-                        if st.button(f"💾 Save PDF Report", key=f"save-pdf-{i}"):
+                        if st.button(f"💾 Save PDF Report", key=f"save-pdf-{case_key}"):
                             try:
-                                # Get original image
-                                original_file = next(f for f in uploaded_files if f.name == filename)
-                                original_image = Image.open(original_file)
-
-                                # Generate PDF
-                                pdf_buffer = create_pdf_report(res, original_image, filename)
-
-                                # Download button
-                                st.download_button(
-                                    label="📄 Download PDF Report",
-                                    data=pdf_buffer,
-                                    file_name=f"otoscopy_report_{filename.split('.')[0]}.pdf",
-                                    mime="application/pdf",
-                                    key=f"download-pdf-{i}"
-                                )
-                                st.success("✅ PDF report generated successfully!")
-
+                                job = api_client.create_report([res["analysis_id"]])
+                                st.session_state[f"case_report_{case_key}"] = job["report_id"]
                             except Exception as e:
                                 st.error(f"❌ Error generating PDF: {str(e)}")
 
+                        if st.session_state.get(f"case_report_{case_key}"):
+                            render_report_download(st.session_state[f"case_report_{case_key}"],
+                                                   f"otoscopy_report_{filename.split('.')[0]}.pdf",
+                                                   f"download-pdf-{case_key}")
+
                     st.markdown("---")
@@ -0,0 +1,27 @@
+import streamlit as st
+from utils import api_client
+
+# Widgets used by more than one section. Kept out of the pages themselves so
+# that importing a helper does not load another page and its dependencies.
+
+def render_report_download(report_id, file_name, key):
+    """Wait briefly for a server-side report, then offer it for download"""
+    try:
+        with st.spinner("Rendering PDF report on the server..."):
+            status = api_client.wait_for_report(report_id)
+        if status["status"] == "ready":
+            st.download_button(
+                label="📄 Download PDF Report",
+                data=api_client.download_report(report_id),
+                file_name=file_name,
+                mime="application/pdf",
+                key=key
+            )
+            st.success("✅ PDF report generated successfully!")
+        elif status["status"] == "failed":
+            st.error(f"❌ Error generating PDF: {status.get('error', 'unknown error')}")
+        else:
+            st.info("⏳ The report is still rendering; it will be ready shortly.")
+            st.button("🔄 Check again", key=f"{key}-poll")
+    except Exception as e:
+        st.error(f"❌ Error generating PDF: {str(e)}")
@@ -1,7 +1,90 @@
 import streamlit as st
+import html
 import pandas as pd
-from datetime import datetime, timedelta
-import random
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from utils import api_client
+from sections import client_id
+from sections.common import render_report_download
+
+DATE_RANGES = {
+    "All Time": "all",
+    "Today": "today",
+    "This Week": "week",
+    "This Month": "month",
+    "Last 30 Days": "30d",
+}
+
+SORT_OPTIONS = {
+    "Newest first": ("date", "desc"),
+    "Oldest first": ("date", "asc"),
+    "Highest confidence": ("confidence", "desc"),
+    "Lowest confidence": ("confidence", "asc"),
+    "Best match": ("relevance", "asc"),
+}
+
+PAGE_SIZE = 15
+
+# Background fetches of the next history page, shared across reruns
+_prefetch_pool = ThreadPoolExecutor(max_workers=2)
+
+
+def fetch_history(filters, sort, order, limit=PAGE_SIZE, cursor=None):
+    """Fetch one page of filtered history records from the API"""
+    params = dict(filters, sort=sort, order=order, limit=limit)
+    if cursor:
+        params["cursor"] = cursor
+    page = api_client.get_history(params)
+    for h in page["results"]:
+        h["date"] = datetime.fromisoformat(h["date"])
+    return page
+
+
+def fetch_history_stats(filters):
+    """Fetch summary numbers and trend counts from the API"""
+    return api_client.get_history_stats(filters)
+
+
+def load_history_view(filters, sort, order):
+    """Return the loaded pages for the current filters, prefetching the next page
+
+    Only the pages the user has asked for are held in session state; changing
+    any filter starts again from the first page.
+    """
+    key = (tuple(sorted(filters.items())), sort, order)
+    view = st.session_state.get("history_view")
+    if view is None or view["key"] != key:
+        first = fetch_history(filters, sort, order)
+        view = {
+            "key": key,
+            "query": (filters, sort, order),
+            "records": first["results"],
+            "total": first["total"],
+            "total_capped": first.get("total_capped", False),
+            "cursor": first["next_cursor"],
+            "prefetch": None,
+            "stats": fetch_history_stats(filters),
+        }
+        st.session_state.history_view = view
+
+    if view["cursor"] and view["prefetch"] is None:
+        view["prefetch"] = _prefetch_pool.submit(fetch_history, filters, sort, order, cursor=view["cursor"])
+    return view
+
+
+def load_more_history():
+    """Append the prefetched page to the visible records"""
+    view = st.session_state.history_view
+    try:
+        page = view["prefetch"].result()
+    except Exception:
+        # Prefetch failed (e.g. API briefly unavailable); try once more in the foreground
+        filters, sort, order = view["query"]
+        page = fetch_history(filters, sort, order, cursor=view["cursor"])
+    view["records"].extend(page["results"])
+    view["cursor"] = page["next_cursor"]
+    view["prefetch"] = None
+
 
 def render():
     st.markdown("""
@@ -115,62 +198,72 @@ def render():
     </div>
     """, unsafe_allow_html=True)
 
-    # Generate mock historical data
-    def generate_mock_history():
-        conditions = ["Normal", "AOM", "COM", "Earwax"]
-        referrals = ["No Referral", "Routine", "Urgent"]
-
-        history_data = []
-        for i in range(25):
-            days_ago = random.randint(0, 30)
-            analysis_date = datetime.now() - timedelta(days=days_ago)
-
-            condition = random.choice(conditions)
-            if condition == "Normal":
-                referral = random.choice(["No Referral", "Routine"])
-                confidence = random.uniform(0.85, 0.98)
-            elif condition == "Earwax":
-                referral = random.choice(["Routine", "No Referral"])
-                confidence = random.uniform(0.75, 0.95)
-            else:  # AOM or COM
-                referral = random.choice(["Urgent", "Routine"])
-                confidence = random.uniform(0.80, 0.95)
-
-            history_data.append({
-                "id": f"A-{1000 + i}",
-                "patient_id": f"P-{2000 + i}",
-                "date": analysis_date,
-                "time": analysis_date.strftime("%H:%M"),
-                "filename": f"otoscopy_{i+1:03d}.jpg",
-                "condition": condition,
-                "confidence": confidence,
-                "referral": referral,
-                "processed_by": random.choice(["Dr. Smith", "Dr. Johnson", "Dr. Williams", "Dr. Brown"]),
-                "batch_id": f"B-{random.randint(100, 999)}" if random.random() > 0.7 else None
-            })
-
-        return sorted(history_data, key=lambda x: x["date"], reverse=True)
-
-    # Initialize session state for history data
-    if "history_data" not in st.session_state:
-        st.session_state.history_data = generate_mock_history()
-
-    history_data = st.session_state.history_data
-
-    # Summary Statistics
+    # Summary Statistics (filled in once the stats have been fetched)
     st.markdown("### 📊 Summary Statistics")
+    summary_area = st.container()
+
+    # Filters
+    st.markdown("### 🔍 Filter & Search")
+
+    with st.container():
+        st.markdown('<div class="filter-container">', unsafe_allow_html=True)
+
+        col1, col2, col3, col4, col5 = st.columns(5)
+
+        with col1:
+            date_filter = st.selectbox("📅 Date Range", list(DATE_RANGES))
+
+        with col2:
+            condition_filter = st.selectbox(
+                "🔬 Condition",
+                ["All Conditions", "Normal", "AOM", "COM", "Earwax"]
+            )
+
+        with col3:
+            referral_filter = st.selectbox(
+                "📋 Referral",
+                ["All Referrals", "No Referral", "Routine", "Urgent"]
+            )
 
-    total_analyses = len(history_data)
-    urgent_cases = len([h for h in history_data if h["referral"] == "Urgent"])
-    avg_confidence = sum([h["confidence"] for h in history_data]) / len(history_data) if history_data else 0
-    recent_analyses = len([h for h in history_data if h["date"] >= datetime.now() - timedelta(days=7)])
+        with col4:
+            sort_option = st.selectbox("🔽 Sort", list(SORT_OPTIONS))
+
+        with col5:
+            search_term = st.text_input("🔍 Search", placeholder="Patient ID, Analysis ID, file, clinician...")
 
-    col1, col2, col3, col4 = st.columns(4)
+        st.markdown('</div>', unsafe_allow_html=True)
+
+    # Filtering, sorting and paging all happen in the history store
+    filters = {"date_range": DATE_RANGES[date_filter]}
+    if condition_filter != "All Conditions":
+        filters["condition"] = condition_filter
+    if referral_filter != "All Referrals":
+        filters["referral"] = referral_filter
+    if search_term:
+        filters["search"] = search_term
+    sort, order = SORT_OPTIONS[sort_option]
+
+    try:
+        view = load_history_view(filters, sort, order)
+    except Exception as e:
+        st.error(f"🚫 Could not load analysis history: {e}")
+        return
+
+    filtered_data = view["records"]
+    # Broad searches are not counted in full; the API only says there are more than it looked at
+    if view.get("total_capped"):
+        total_results = "many"
+    else:
+        total_results = f"{view['total']:,}"
+    stats = view["stats"]
+
+    summary = stats["summary"]
+    col1, col2, col3, col4 = summary_area.columns(4)
 
     with col1:
         st.markdown(f"""
         <div class="summary-card">
-            <div class="summary-number" style="color: #667eea;">{total_analyses}</div>
+            <div class="summary-number" style="color: #667eea;">{summary['total']}</div>
             <div class="summary-label">Total Analyses</div>
         </div>
         """, unsafe_allow_html=True)
@@ -178,7 +271,7 @@ def render():
     with col2:
         st.markdown(f"""
         <div class="summary-card">
-            <div class="summary-number" style="color: #ef4444;">{urgent_cases}</div>
+            <div class="summary-number" style="color: #ef4444;">{summary['urgent']}</div>
             <div class="summary-label">Urgent Cases</div>
         </div>
         """, unsafe_allow_html=True)
@@ -186,7 +279,7 @@ def render():
     with col3:
         st.markdown(f"""
         <div class="summary-card">
-            <div class="summary-number" style="color: #10b981;">{avg_confidence:.1%}</div>
+            <div class="summary-number" style="color: #10b981;">{summary['avg_confidence']:.1%}</div>
             <div class="summary-label">Avg Confidence</div>
         </div>
         """, unsafe_allow_html=True)
@@ -194,126 +287,76 @@ def render():
     with col4:
         st.markdown(f"""
         <div class="summary-card">
-            <div class="summary-number" style="color: #8b5cf6;">{recent_analyses}</div>
+            <div class="summary-number" style="color: #8b5cf6;">{summary['this_week']}</div>
             <div class="summary-label">This Week</div>
         </div>
         """, unsafe_allow_html=True)
 
-    # Filters
-    st.markdown("### 🔍 Filter & Search")
-
-    with st.container():
-        st.markdown('<div class="filter-container">', unsafe_allow_html=True)
-
-        col1, col2, col3, col4 = st.columns(4)
-
-        with col1:
-            date_filter = st.selectbox(
-                "📅 Date Range",
-                ["All Time", "Today", "This Week", "This Month", "Last 30 Days"]
-            )
-
-        with col2:
-            condition_filter = st.selectbox(
-                "🔬 Condition",
-                ["All Conditions", "Normal", "AOM", "COM", "Earwax"]
-            )
-
-        with col3:
-            referral_filter = st.selectbox(
-                "📋 Referral",
-                ["All Referrals", "No Referral", "Routine", "Urgent"]
-            )
-
-        with col4:
-            search_term = st.text_input("🔍 Search", placeholder="Patient ID, Analysis ID...")
-
-        st.markdown('</div>', unsafe_allow_html=True)
-
-    # Apply filters
-    filtered_data = history_data.copy()
-
-    # Date filter
-    now = datetime.now()
-    if date_filter == "Today":
-        filtered_data = [h for h in filtered_data if h["date"].date() == now.date()]
-    elif date_filter == "This Week":
-        week_start = now - timedelta(days=now.weekday())
-        filtered_data = [h for h in filtered_data if h["date"] >= week_start]
-    elif date_filter == "This Month":
-        month_start = now.replace(day=1)
-        filtered_data = [h for h in filtered_data if h["date"] >= month_start]
-    elif date_filter == "Last 30 Days":
-        thirty_days_ago = now - timedelta(days=30)
-        filtered_data = [h for h in filtered_data if h["date"] >= thirty_days_ago]
-
-    # Condition filter
-    if condition_filter != "All Conditions":
-        filtered_data = [h for h in filtered_data if h["condition"] == condition_filter]
-
-    # Referral filter
-    if referral_filter != "All Referrals":
-        filtered_data = [h for h in filtered_data if h["referral"] == referral_filter]
-
-    # Search filter
-    if search_term:
-        filtered_data = [h for h in filtered_data if
-                        search_term.lower() in h["patient_id"].lower() or
-                        search_term.lower() in h["id"].lower() or
-                        search_term.lower() in h["filename"].lower()]
-
     # Results header
-    st.markdown(f"### 📋 Analysis Records ({len(filtered_data)} results)")
+    st.markdown(f"### 📋 Analysis Records ({total_results} results)")
 
     # Bulk actions
     col1, col2, col3 = st.columns([2, 1, 1])
     with col1:
-        if st.button("📥 Export to CSV"):
-            df = pd.DataFrame(filtered_data)
-            csv = df.to_csv(index=False)
-            st.download_button(
-                label="Download CSV",
-                data=csv,
-                file_name=f"analysis_history_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-                mime="text/csv"
-            )
+        # Exports stream straight from the API to the browser, so the whole
+        # filtered archive never passes through this process
+        export_params = dict(filters, sort=sort, order=order)
+        csv_col, parquet_col = st.columns(2)
+        with csv_col:
+            st.link_button("📥 Export to CSV", api_client.export_url("csv", export_params))
+        with parquet_col:
+            st.link_button("📦 Export to Parquet", api_client.export_url("parquet", export_params))
 
     with col2:
-        if st.button("📄 Generate Report"):
-            st.success("📄 Comprehensive report generation initiated!")
+        if st.button("📄 Generate Report", disabled=not filtered_data):
+            try:
+                # Covers the records loaded on this page, rendered by the API's report workers
+                job = api_client.create_report([h["id"] for h in filtered_data[:api_client.REPORT_MAX_CASES]])
+                st.session_state.history_report_id = job["report_id"]
+            except Exception as e:
+                st.error(f"❌ Error generating report: {e}")
+
+        if st.session_state.get("history_report_id"):
+            render_report_download(st.session_state.history_report_id,
+                                   f"analysis_history_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf",
+                                   "download-history-pdf")
 
     with col3:
         if st.button("🔄 Refresh Data"):
-            st.session_state.history_data = generate_mock_history()
+            st.session_state.pop("history_view", None)
             st.rerun()
 
     # Analysis records
     if filtered_data:
-        for i, analysis in enumerate(filtered_data[:15]):  # Show first 15 results
+        for i, analysis in enumerate(filtered_data):
 
             # Determine status badge classes
             condition_class = f"status-{analysis['condition'].lower()}"
             referral_class = f"status-{analysis['referral'].lower().replace(' ', '-')}"
+            # Uploaded filenames and IDs are user input; the card is raw HTML
+            escaped = {k: html.escape(str(analysis[k])) for k in ("id", "patient_id", "filename", "condition", "referral")}
+            escaped["processed_by"] = html.escape(analysis["processed_by"] or "—")
+            escaped["batch_id"] = html.escape(analysis["batch_id"] or "Single Analysis")
 
             st.markdown(f"""
             <div class="analysis-card">
                 <div style="display: flex; justify-content: space-between; align-items: center; margin-bottom: 1rem;">
                     <div>
-                        <h4 style="margin: 0; color: #374151;">Analysis {analysis['id']}</h4>
+                        <h4 style="margin: 0; color: #374151;">Analysis {escaped['id']}</h4>
                         <p style="margin: 0.2rem 0 0 0; color: #6b7280; font-size: 0.9rem;">
-                            Patient: {analysis['patient_id']} | {analysis['date'].strftime('%Y-%m-%d')} at {analysis['time']}
+                            Patient: {escaped['patient_id']} | {analysis['date'].strftime('%Y-%m-%d')} at {analysis['date'].strftime('%H:%M')}
                         </p>
                     </div>
                     <div style="text-align: right;">
-                        <span class="status-badge {condition_class}">{analysis['condition']}</span>
-                        <span class="status-badge {referral_class}">{analysis['referral']}</span>
+                        <span class="status-badge {html.escape(condition_class)}">{escaped['condition']}</span>
+                        <span class="status-badge {html.escape(referral_class)}">{escaped['referral']}</span>
                     </div>
                 </div>
 
                 <div style="display: grid; grid-template-columns: 1fr 1fr 1fr; gap: 1rem; margin-bottom: 1rem;">
                     <div>
-                        <strong>File:</strong> {analysis['filename']}<br>
-                        <strong>Processed by:</strong> {analysis['processed_by']}
+                        <strong>File:</strong> {escaped['filename']}<br>
+                        <strong>Processed by:</strong> {escaped['processed_by']}
                     </div>
                     <div>
                         <strong>Confidence:</strong> {analysis['confidence']:.1%}<br>
@@ -322,7 +365,7 @@ def render():
                         </div>
                     </div>
                     <div>
-                        <strong>Batch ID:</strong> {analysis['batch_id'] or 'Single Analysis'}<br>
+                        <strong>Batch ID:</strong> {escaped['batch_id']}<br>
                         <strong>Status:</strong> <span style="color: #10b981;">✅ Completed</span>
                     </div>
                 </div>
@@ -330,19 +373,31 @@ def render():
                 <div style="text-align: right;">
                     <button class="action-button">👁️ View Details</button>
                     <button class="action-button">📄 Download Report</button>
-                    <button class="action-button">🔄 Reprocess</button>
                 </div>
             </div>
             """, unsafe_allow_html=True)
 
+            if st.button("🔄 Reprocess", key=f"reprocess-{analysis['id']}"):
+                try:
+                    with st.spinner("Re-scoring stored case..."):
+                        outcome = api_client.reprocess([analysis["id"]], client_id())
+                    if outcome["missing"]:
+                        st.warning("⚠️ The original image for this case was not retained; please re-upload it.")
+                    else:
+                        st.session_state.pop("history_view", None)
+                        st.rerun()
+                except Exception as e:
+                    st.error(f"❌ Reprocessing failed: {e}")
+
         # Pagination info
-        if len(filtered_data) > 15:
+        if view["cursor"]:
             st.markdown(f"""
             <div style="text-align: center; padding: 1rem; color: #6b7280;">
-                Showing 15 of {len(filtered_data)} results.
-                <a href="#" style="color: #667eea;">Load more results</a>
+                Showing {len(filtered_data)} of {total_results} results.
+                {"Refine the search to narrow them down." if view.get("total_capped") else ""}
             </div>
             """, unsafe_allow_html=True)
+            st.button("⬇️ Load more results", on_click=load_more_history, key="history_load_more")
 
     else:
         st.markdown("""
@@ -352,16 +407,14 @@ def render():
         </div>
         """, unsafe_allow_html=True)
 
-    # Historical Trends
-    if filtered_data:
+    # Historical Trends (aggregated server-side over the whole filtered set)
+    if stats["daily"]:
         st.markdown("### 📈 Historical Trends")
 
-        # Create trend data
-        df = pd.DataFrame(filtered_data)
-        df['date_only'] = df['date'].dt.date
-
-        # Group by date and condition
-        trend_data = df.groupby(['date_only', 'condition']).size().unstack(fill_value=0)
+        trend_data = (
+            pd.DataFrame(stats["daily"])
+            .pivot_table(index="date", columns="condition", values="count", fill_value=0)
+        )
 
         # Create a simple chart using Streamlit's built-in charting
         if not trend_data.empty:
@@ -371,11 +424,9 @@ def render():
         col1, col2 = st.columns(2)
 
         with col1:
-            condition_counts = df['condition'].value_counts()
-            st.bar_chart(condition_counts, height=300)
+            st.bar_chart(pd.Series(stats["conditions"]), height=300)
             st.caption("Condition Distribution")
 
         with col2:
-            referral_counts = df['referral'].value_counts()
-            st.bar_chart(referral_counts, height=300)
-            st.caption("Referral Distribution")
\ No newline at end of file
+            st.bar_chart(pd.Series(stats["referrals"]), height=300)
+            st.caption("Referral Distribution")
@@ -1,12 +1,54 @@
 import streamlit as st
-import requests
 import base64
+import hashlib
 import io
+import time
+from collections import OrderedDict
 from PIL import Image
-from utils.api_client import API_URL
-from sections.batch_processing import create_pdf_report
+from utils import api_client, image_prep
+from sections import client_id
+from sections.common import render_report_download
 from datetime import datetime
 
+# Results are keyed by image content, so the same pixels under another name hit
+# the cache and a different image with a reused name does not. The cache lives in
+# the session: each result is an analysis recorded in history for the user who
+# uploaded it, and must not be handed to another session uploading the same file.
+RESULT_CACHE_ENTRIES = 8  # each result carries its ~0.5 MB base64 heatmap
+RESULT_CACHE_TTL = 3600
+
+
+def cached_result(key):
+    """This session's earlier result for key, unless expired or made by a model version since replaced"""
+    cache = st.session_state.setdefault("single_results", OrderedDict())
+    entry = cache.get(key)
+    if entry is None:
+        return None
+    stored_at, result = entry
+    try:
+        current = result.get("model_version") == api_client.active_model_version()
+    except Exception:
+        current = True  # cannot tell; keep showing it rather than fail on a cached image
+    if time.monotonic() - stored_at > RESULT_CACHE_TTL or not current:
+        del cache[key]
+        return None
+    cache.move_to_end(key)
+    return result
+
+
+def analyze_image(digest, optimize, filename, data):
+    """Call /predict for an image, reusing this session's result for the same (content hash, optimize)"""
+    key = (digest, optimize)
+    result = cached_result(key)
+    if result is None:
+        upload_bytes = image_prep.prepare_upload(data) if optimize else data
+        result = api_client.predict(filename, upload_bytes, client_id=client_id())
+        cache = st.session_state.single_results
+        cache[key] = (time.monotonic(), result)
+        while len(cache) > RESULT_CACHE_ENTRIES:
+            cache.popitem(last=False)
+    return result
+
 
 def render():
     st.markdown(
@@ -178,21 +220,25 @@ def render():
                             type=["jpg", "jpeg", "png", "tiff", "tif", "webp"],
                             key="single_file",
                             label_visibility="collapsed")
+    optimize = st.checkbox("Downscale image before upload", value=True,
+                           help="Does the server's 500x500 resize before upload and re-encodes losslessly; "
+                                "the model gets exactly the same input as for the full-size image.")
 
     # Auto-analyze when file is uploaded
     if file:
-        # Automatically run analysis when file is uploaded
-        if st.session_state.get("last_uploaded_file") != file.name:
-            st.session_state.last_uploaded_file = file.name
+        # Automatically run analysis when a new image is uploaded
+        data = file.getvalue()
+        cache_key = (hashlib.sha256(data).hexdigest(), optimize)
+        if st.session_state.get("single_cache_key") != cache_key:
+            st.session_state.single_cache_key = cache_key
+            st.session_state.single_result = None
+            st.session_state.pop("single_report_id", None)
             with st.spinner('🔄 Analyzing image... This may take a few moments'):
-                files = {"file": (file.name, file, "multipart/form-data")}
                 try:
-                    response = requests.post(f"{API_URL}/predict", files=files, timeout=30)
-                    if response.status_code == 200:
-                        st.session_state.single_result = response.json()
-                        st.success("✅ Analysis completed successfully!")
-                    else:
-                        st.error(f"❌ Error {response.status_code}: {response.text}")
+                    st.session_state.single_result = analyze_image(*cache_key, file.name, data)
+                    st.success("✅ Analysis completed successfully!")
+                except api_client.APIError as e:
+                    st.error(f"❌ Error {e.status_code}: {e.detail}")
                 except Exception as e:
                     st.error(f"🚫 API connection failed: {e}")
         
@@ -326,29 +372,14 @@ def render():
         with col2:
             if st.button("📄 Download PDF Report", key="single_pdf_download"):
                 try:
-                    with st.spinner("Generating PDF report..."):
-                        # Get the uploaded file from session state
-                        if file:
-                            # Open the uploaded file as PIL Image
-                            original_image = Image.open(file)
-
-                            # Generate PDF
-                            pdf_buffer = create_pdf_report(result, original_image, file.name)
-
-                            # Create download button
-                            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-                            filename = f"otoscopy_report_{file.name.split('.')[0]}_{timestamp}.pdf"
-
-                            st.download_button(
-                                label="📥 Download Report",
-                                data=pdf_buffer,
-                                file_name=filename,
-                                mime="application/pdf",
-                                key="download_single_pdf"
-                            )
-                            st.success("✅ PDF report generated successfully!")
-                        else:
-                            st.error("❌ No image available for PDF generation")
-
+                    # Rendered by the API's report workers from the stored result
+                    job = api_client.create_report([result["analysis_id"]])
+                    st.session_state.single_report_id = job["report_id"]
                 except Exception as e:
                     st.error(f"❌ Error generating PDF: {str(e)}")
+
+            if st.session_state.get("single_report_id") and file:
+                timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+                render_report_download(st.session_state.single_report_id,
+                                       f"otoscopy_report_{file.name.split('.')[0]}_{timestamp}.pdf",
+                                       "download_single_pdf")
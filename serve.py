@@ -0,0 +1,141 @@
+"""Multi-process API server: load the models once, then fork workers that share them.
+
+    python serve.py --workers 4
+    python serve.py --workers 2 --threads 4 --port 8000
+
+The parent imports api.py (models, history schema), freezes the garbage
+collector so its bookkeeping does not write to (and so copy) the shared pages,
+opens the listening socket and forks the workers, which all serve that socket
+with uvicorn. Model weights are therefore in memory once, shared copy-on-write,
+instead of once per process as with `uvicorn api:app --workers N`.
+
+serve.py is a CPU server: the preloaded models are put on the CPU even on a
+GPU host, because a CUDA context created before fork() is unusable in the
+children. To serve on a GPU run `uvicorn api:app` (one process) instead.
+
+Thread counts, core pinning and executor sizes come from utils/runtime.py
+(EARSCOPE_* variables or EARSCOPE_RUNTIME_CONFIG) and are applied in each
+worker after the fork; by default each worker gets physical cores / workers
+torch threads so the workers together do not oversubscribe the CPU. The parent
+must not run any torch ops before forking (OpenMP thread pools do not survive
+fork), so warmup happens in the workers. Each answers /health/live from the
+start. Workers record their warm state in a shared array created before the
+fork, and any of them answers /health/ready with 200 only once all are warm, so
+whichever worker a probe reaches gives the same answer. A crashed worker is
+restarted with its flag cleared, which makes the server not ready until the
+new process has warmed up. SIGTERM or SIGINT stops all of them. POSIX only; on
+Windows run `uvicorn api:app` as before.
+"""
+import argparse
+import gc
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import time
+import traceback
+
+from utils import runtime
+
+# Seconds to wait before restarting a crashed worker, so a crash loop does not spin
+RESTART_DELAY = 1.0
+
+
+def bind_socket(host, port, backlog=2048):
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(app, sock, index, settings, log_level):
+    import uvicorn
+
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, signal.SIG_DFL)
+    os.environ["EARSCOPE_WORKER"] = str(index)
+    applied = runtime.apply(settings, index, settings["workers"])
+    print(f"worker {index} (pid {os.getpid()}): {applied['intra_op_threads']} intra-op / "
+          f"{applied['inter_op_threads']} inter-op thread(s), {applied['inference_workers']} inference worker(s), "
+          f"cpus {applied['cpus']}", flush=True)
+
+    server = uvicorn.Server(uvicorn.Config(app, log_level=log_level))
+    server.run(sockets=[sock])
+
+
+def main():
+    settings = runtime.load_settings()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=settings["workers"])
+    parser.add_argument("--threads", type=int, default=settings["intra_op_threads"],
+                        help="torch intra-op threads per inference call (default: physical cores / workers)")
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+    settings.update(workers=args.workers, intra_op_threads=args.threads)
+
+    if not hasattr(os, "fork"):
+        sys.exit("serve.py needs fork(); on this platform run `uvicorn api:app` instead")
+
+    # api.py leaves runtime settings to the workers when preloaded
+    os.environ["EARSCOPE_PRELOAD"] = "1"
+    import api  # loads both models once, before forking
+
+    # Per-worker warm flags in shared memory, inherited by every fork
+    api.worker_ready = multiprocessing.RawArray("b", args.workers)
+
+    gc.collect()
+    gc.freeze()
+    sock = bind_socket(args.host, args.port)
+    print(f"EarScope API on http://{args.host}:{args.port} with {args.workers} worker(s)", flush=True)
+
+    children = {}
+    stopping = False
+
+    def spawn(index):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                run_worker(api.app, sock, index, settings, args.log_level)
+                os._exit(0)
+            except BaseException:
+                traceback.print_exc()
+                os._exit(1)
+        children[pid] = index
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    for index in range(args.workers):
+        spawn(index)
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        index = children.pop(pid, None)
+        if index is not None:
+            api.worker_ready[index] = 0  # not ready until its replacement has warmed up
+        if index is not None and not stopping:
+            print(f"worker {index} (pid {pid}) exited with status {status}; restarting", flush=True)
+            time.sleep(RESTART_DELAY)
+            spawn(index)
+    sock.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -2,9 +2,8 @@ import streamlit as st
 from streamlit_option_menu import option_menu
 import urllib.parse
 
-# Import section UIs
-from sections import single_analysis, batch_processing, history, dashboard, help_support
-# about temporarily disabled due to persistent encoding issue
+# Section UIs are imported lazily on navigation (see sections/__init__.py)
+import sections
 
 # ------------------------
 # Page Config
@@ -130,17 +129,8 @@ with st.sidebar:
     # Sidebar Menu
     mode = option_menu(
         menu_title=None,
-        options=[
-            "Dashboard",
-            "Single Analysis",
-            "Batch Processing",
-            "Analysis History",
-            "Help & Support",
-            "About"
-        ],
-        icons=[
-            "speedometer2", "camera", "images", "clock-history", "question-circle", "info-circle"
-        ],
+        options=list(sections.SECTIONS),
+        icons=[icon for _, icon in sections.SECTIONS.values()],
         default_index=0,
         styles={
             "container": {"padding": "0!important", "background-color": "#f8faff"},
@@ -169,17 +159,6 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # Routing
-if mode == "Dashboard":
-    dashboard.render()
-elif mode == "Single Analysis":
-    single_analysis.render()
-elif mode == "Batch Processing":
-    batch_processing.render()
-elif mode == "Analysis History":
-    history.render()
-elif mode == "Help & Support":
-    help_support.render()
-elif mode == "About":
-    about.render()
+sections.load(mode).render()
 
 
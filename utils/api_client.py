@@ -1,8 +1,311 @@
+import os
+import threading
+import time
+import urllib.parse
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
 # API Configuration
-# Switch between real API (port 8000) and mock API (port 8002) for testing
+# Switch between real API (port 8000) and mock API (mock_api.py, port 8002) for testing
 USE_MOCK_API = False  # Set to False to use real API
 
 if USE_MOCK_API:
     API_URL = "http://127.0.0.1:8002"  # Mock API
 else:
     API_URL = "http://127.0.0.1:8000"  # Real API
+
+API_URL = os.environ.get("EARSCOPE_API_URL", API_URL)
+# Where the user's browser reaches the API, for links it follows itself (history
+# exports). API_URL is what this process uses and is often a loopback or internal
+# address; set this when the UI is served to other machines.
+PUBLIC_API_URL = os.environ.get("EARSCOPE_PUBLIC_API_URL", API_URL).rstrip("/")
+
+# Per-endpoint timeouts in seconds, overridable with e.g. EARSCOPE_TIMEOUT_BATCH_PREDICT=300
+TIMEOUTS = {
+    "predict": 30,
+    "batch_predict": 180,
+    "history": 10,
+    "reprocess": 120,
+    "artifact": 10,
+    "reports": 30,
+    "models": 5,
+}
+for _name in TIMEOUTS:
+    _override = os.environ.get(f"EARSCOPE_TIMEOUT_{_name.upper()}")
+    if _override:
+        TIMEOUTS[_name] = float(_override)
+
+# 503 (overloaded) and 429 (too many requests from this client) mean the API shed
+# the request without doing any work, so it is safe to retry even for POSTs, after
+# the Retry-After it sends. Read errors are not retried: the request may have run.
+RETRY = Retry(
+    total=3,
+    connect=3,
+    read=0,
+    status=3,
+    status_forcelist=(429, 503),
+    allowed_methods=None,
+    backoff_factor=0.5,
+    respect_retry_after_header=True,
+    raise_on_status=False,
+)
+
+POOL_SIZE = 16
+
+# The API admits this many bulk requests (/batch_predict, /reprocess) per client at
+# once and answers 429 beyond it (SCHEDULER_QUEUES in api.py). Sessions of this UI
+# also share the UI server's per-address limit, so a 429 can come early under load.
+BULK_CLIENT_LIMIT = 4
+
+# Grad-CAM overlays are ~0.5 MB PNGs; this holds a few hundred cases
+ARTIFACT_CACHE_BYTES = 256 * 1024 * 1024
+
+# Most analyses the API puts in one PDF report (REPORT_MAX_CASES in api.py)
+REPORT_MAX_CASES = 500
+
+
+# Chunk-level retries in batch_predict_chunked: statuses where the API did no work
+RETRYABLE_STATUS = (429, 503)
+
+
+class APIError(Exception):
+    """Non-200 response from the EarScope API"""
+
+    def __init__(self, status_code, detail):
+        super().__init__(f"Error {status_code}: {detail}")
+        self.status_code = status_code
+        self.detail = detail
+
+
+# ------------------------
+# Session
+# ------------------------
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """Process-wide keep-alive session; module state survives Streamlit reruns"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=POOL_SIZE, max_retries=RETRY)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                _session = session
+    return _session
+
+
+def _request(method, path, timeout_key, **kwargs) -> requests.Response:
+    response = get_session().request(method, f"{API_URL}{path}", timeout=TIMEOUTS[timeout_key], **kwargs)
+    if response.status_code != 200:
+        raise APIError(response.status_code, response.text)
+    return response
+
+
+# ------------------------
+# Predictions
+# ------------------------
+def _client_headers(client_id=None):
+    """The API's per-client concurrency limits apply per UI session rather than to the whole UI
+
+    Without an ID every session behind this process shares the limits of its address.
+    """
+    return {"X-Client-ID": urllib.parse.quote(client_id)} if client_id else {}
+
+
+def predict(filename: str, data: bytes, patient_id: str = None, clinician: str = None,
+            client_id: str = None) -> dict:
+    form = {k: v for k, v in (("patient_id", patient_id), ("clinician", clinician)) if v}
+    files = {"file": (filename, data, "application/octet-stream")}
+    return _request("POST", "/predict", "predict", files=files, data=form,
+                    headers=_client_headers(client_id)).json()
+
+
+def batch_predict(files: list, clinician: str = None, batch_id: str = None, client_id: str = None) -> dict:
+    """files is a list of (filename, bytes); returns {"batch_id", "results"}"""
+    form = {k: v for k, v in (("clinician", clinician), ("batch_id", batch_id)) if v}
+    form["include_images"] = "false"  # the UI shows its own uploads, not the API's base64 copies
+    upload = [("files", (name, data, "application/octet-stream")) for name, data in files]
+    return _request("POST", "/batch_predict", "batch_predict", files=upload, data=form,
+                    headers=_client_headers(client_id)).json()
+
+
+def _retryable(error):
+    if isinstance(error, APIError):
+        return error.status_code in RETRYABLE_STATUS
+    return isinstance(error, requests.ConnectionError)
+
+
+def batch_predict_chunked(files: list, chunk_size: int = 8, concurrency: int = 3, retries: int = 2,
+                          clinician: str = None, batch_id: str = None, on_chunk=None, prepare=None,
+                          client_id: str = None) -> dict:
+    """Upload a batch as several /batch_predict calls with bounded concurrency
+
+    At most BULK_CLIENT_LIMIT chunks are in flight, since the API rejects more
+    from one client_id.
+
+    Chunks the API shed (429/503) or that never reached it (connection errors)
+    are retried, only those, up to `retries` more times. Read timeouts and other
+    errors are not: the chunk may already have been analysed and recorded.
+    prepare(bytes) -> bytes, if given, is applied to each image on the worker
+    threads before its chunk is sent (e.g. image_prep.prepare_upload).
+    on_chunk(done_files, total_files) is called from the calling thread as each
+    chunk settles, so it is safe to update Streamlit widgets from it.
+
+    Returns {"batch_id", "results", "uploads", "failed", "failed_uploads"}:
+    results keep upload order and uploads[i] is the (filename, bytes) entry of
+    files that results[i] was computed from, so uploads sharing a name stay
+    apart. failed maps each filename that never succeeded to its last error and
+    failed_uploads lists those entries of files, for a retry.
+    """
+    batch_id = batch_id or f"B-{uuid.uuid4().hex[:8].upper()}"
+    chunks = [files[i:i + chunk_size] for i in range(0, len(files), chunk_size)]
+    chunk_results = [None] * len(chunks)
+    errors = {}
+    done = 0
+
+    def send(chunk):
+        if prepare:
+            chunk = [(name, prepare(data)) for name, data in chunk]
+        return batch_predict(chunk, clinician, batch_id, client_id)
+
+    pending = list(range(len(chunks)))
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, BULK_CLIENT_LIMIT))) as pool:
+        for attempt in range(retries + 1):
+            if attempt:
+                time.sleep(RETRY.backoff_factor * (2 ** attempt))
+            futures = {pool.submit(send, chunks[i]): i for i in pending}
+            pending = []
+            for future in as_completed(futures):
+                i = futures[future]
+                try:
+                    chunk_results[i] = future.result()["results"]
+                    errors.pop(i, None)
+                    done += len(chunks[i])
+                except Exception as e:
+                    errors[i] = e
+                    if _retryable(e):
+                        pending.append(i)
+                if on_chunk:
+                    on_chunk(done, len(files))
+            if not pending:
+                break
+
+    # /batch_predict answers in upload order, so each chunk's results line up with it
+    paired = [(upload, r) for i, chunk in enumerate(chunk_results) if chunk for upload, r in zip(chunks[i], chunk)]
+    return {
+        "batch_id": batch_id,
+        "results": [r for _, r in paired],
+        "uploads": [upload for upload, _ in paired],
+        "failed": {name: str(errors[i]) for i in errors for name, _ in chunks[i]},
+        "failed_uploads": [upload for i in sorted(errors) for upload in chunks[i]],
+    }
+
+
+def active_model_version() -> str:
+    """Version the API analyses new uploads with, or None if it has none loaded"""
+    active = _request("GET", "/models", "models").json()["active"]
+    return active["version"] if active else None
+
+
+# ------------------------
+# History
+# ------------------------
+def get_history(params: dict) -> dict:
+    return _request("GET", "/history", "history", params=params).json()
+
+
+def get_history_stats(params: dict) -> dict:
+    return _request("GET", "/history/stats", "history", params=params).json()
+
+
+def reprocess(analysis_ids: list, client_id: str = None) -> dict:
+    return _request("POST", "/reprocess", "reprocess", json={"analysis_ids": analysis_ids},
+                    headers=_client_headers(client_id)).json()
+
+
+def export_url(fmt: str, params: dict) -> str:
+    """Browser-facing URL of the streaming history export"""
+    return f"{PUBLIC_API_URL}/history/export?{urllib.parse.urlencode(dict(params, format=fmt))}"
+
+
+# ------------------------
+# Report jobs
+# ------------------------
+def create_report(analysis_ids: list) -> dict:
+    """Queue a server-side PDF for the given analyses; returns the job status"""
+    return _request("POST", "/reports", "reports", json={"analysis_ids": analysis_ids}).json()
+
+
+def get_report(report_id: str) -> dict:
+    return _request("GET", f"/reports/{report_id}", "reports").json()
+
+
+def wait_for_report(report_id: str, timeout: float = 20, interval: float = 0.5) -> dict:
+    """Poll a report job until it is no longer pending or timeout seconds pass"""
+    deadline = time.monotonic() + timeout
+    status = get_report(report_id)
+    while status["status"] == "pending" and time.monotonic() < deadline:
+        time.sleep(interval)
+        status = get_report(report_id)
+    return status
+
+
+def download_report(report_id: str) -> bytes:
+    return _request("GET", f"/reports/{report_id}/pdf", "reports").content
+
+
+# ------------------------
+# Artifacts
+# ------------------------
+class ArtifactCache:
+    """Thread-safe LRU of artifact bytes, bounded by total size"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._items = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            data = self._items.get(key)
+            if data is not None:
+                self._items.move_to_end(key)
+            return data
+
+    def put(self, key, data):
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._size -= len(old)
+            self._items[key] = data
+            self._size += len(data)
+            while self._size > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self._size -= len(evicted)
+
+
+# Artifact URLs change whenever their content does (reprocessing adds ?v=),
+# so entries never go stale and one cache can serve every session
+artifact_cache = ArtifactCache(ARTIFACT_CACHE_BYTES)
+
+
+def fetch_artifact(path: str) -> bytes:
+    """Download a generated artifact such as a Grad-CAM overlay (e.g. /outputs/...)"""
+    data = artifact_cache.get(path)
+    if data is None:
+        data = _request("GET", path, "artifact").content
+        artifact_cache.put(path, data)
+    return data
+
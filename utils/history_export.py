@@ -0,0 +1,103 @@
+import csv
+import io
+
+# ------------------------
+# Config
+# ------------------------
+EXPORT_COLUMNS = [
+    "id", "patient_id", "date", "filename", "condition", "confidence",
+    "referral", "processed_by", "batch_id", "gradcam_url", "model_version",
+]
+
+EXPORT_FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+
+# ------------------------
+# CSV
+# ------------------------
+def csv_stream(chunks):
+    """Encode row chunks as CSV, yielding one bytes block per chunk"""
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=EXPORT_COLUMNS, extrasaction="ignore")
+    writer.writeheader()
+    for rows in chunks:
+        writer.writerows(rows)
+        yield buf.getvalue().encode("utf-8")
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue().encode("utf-8")
+
+
+# ------------------------
+# Parquet
+# ------------------------
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that hands back whatever was written since the last drain"""
+
+    def __init__(self):
+        self._parts = []
+        self._pos = 0
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._parts.append(bytes(b))
+        self._pos += len(b)
+        return len(b)
+
+    def tell(self):
+        return self._pos
+
+    def drain(self):
+        data = b"".join(self._parts)
+        self._parts.clear()
+        return data
+
+
+def parquet_available():
+    try:
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def parquet_stream(chunks, compression="zstd"):
+    """Encode row chunks as Parquet, one row group per chunk
+
+    Only the current row group is ever buffered, so memory stays constant
+    no matter how many rows are exported.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ("id", pa.string()),
+        ("patient_id", pa.string()),
+        ("date", pa.string()),
+        ("filename", pa.string()),
+        ("condition", pa.string()),
+        ("confidence", pa.float64()),
+        ("referral", pa.string()),
+        ("processed_by", pa.string()),
+        ("batch_id", pa.string()),
+        ("gradcam_url", pa.string()),
+        ("model_version", pa.string()),
+    ])
+
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression=compression)
+    try:
+        for rows in chunks:
+            writer.write_table(pa.Table.from_pylist(rows, schema=schema))
+            data = sink.drain()
+            if data:
+                yield data
+    finally:
+        writer.close()
+    yield sink.drain()
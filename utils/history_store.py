@@ -0,0 +1,624 @@
+import base64
+import json
+import os
+import re
+import sqlite3
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+# ------------------------
+# Config
+# ------------------------
+DB_PATH = "history.db"
+
+SORT_COLUMNS = {
+    "date": "created_at",
+    "confidence": "confidence",
+    "relevance": "rank",
+}
+
+# bm25 weights for (analysis_id, patient_id, filename, processed_by)
+SEARCH_WEIGHTS = (10.0, 10.0, 3.0, 1.0)
+
+# Searches matching more rows than this are not counted or fully ranked (see _search_history)
+BROAD_MATCH = 2000
+
+# Index that serves each sortable column in (column, seq) order
+SORT_INDEXES = {
+    "created_at": "idx_analyses_created",
+    "confidence": "idx_analyses_confidence",
+}
+
+# Share of the newest rows a broad search must match for date/confidence pages
+# to test each row met along the sort index, rather than list every match first
+DENSE_MATCH = 0.25
+
+MATCH_CLAUSE = "seq IN (SELECT rowid FROM analyses_fts WHERE analyses_fts MATCH ?)"
+ROW_MATCH_CLAUSE = "EXISTS (SELECT 1 FROM analyses_fts WHERE analyses_fts MATCH ? AND rowid = analyses.seq)"
+
+DATE_RANGES = ["all", "today", "week", "month", "30d"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS analyses (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    analysis_id TEXT NOT NULL UNIQUE,
+    patient_id TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    filename TEXT,
+    condition TEXT NOT NULL,
+    confidence REAL NOT NULL,
+    referral TEXT NOT NULL,
+    processed_by TEXT,
+    batch_id TEXT,
+    gradcam_url TEXT,
+    result TEXT NOT NULL,
+    model_version TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_analyses_created ON analyses (created_at, seq);
+CREATE INDEX IF NOT EXISTS idx_analyses_condition ON analyses (condition, created_at);
+CREATE INDEX IF NOT EXISTS idx_analyses_referral ON analyses (referral, created_at);
+CREATE INDEX IF NOT EXISTS idx_analyses_patient ON analyses (patient_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_analyses_confidence ON analyses (confidence, seq);
+"""
+
+# Columns added after the first release: (name, definition), applied by init_db
+MIGRATIONS = [
+    ("model_version", "TEXT"),
+]
+
+# The 1-character prefix index keeps searches like "P-0" from expanding every
+# matching term up front, so LIMITed queries over broad matches stay lazy
+SEARCH_TABLE = """CREATE VIRTUAL TABLE analyses_fts USING fts5 (
+    analysis_id, patient_id, filename, processed_by,
+    content='analyses', content_rowid='seq', prefix='1 2 3'
+)"""
+
+SEARCH_SCHEMA = SEARCH_TABLE + """;
+CREATE TRIGGER IF NOT EXISTS analyses_fts_insert AFTER INSERT ON analyses BEGIN
+    INSERT INTO analyses_fts (rowid, analysis_id, patient_id, filename, processed_by)
+    VALUES (new.seq, new.analysis_id, new.patient_id, new.filename, new.processed_by);
+END;
+CREATE TRIGGER IF NOT EXISTS analyses_fts_delete AFTER DELETE ON analyses BEGIN
+    INSERT INTO analyses_fts (analyses_fts, rowid, analysis_id, patient_id, filename, processed_by)
+    VALUES ('delete', old.seq, old.analysis_id, old.patient_id, old.filename, old.processed_by);
+END;
+CREATE TRIGGER IF NOT EXISTS analyses_fts_update AFTER UPDATE ON analyses BEGIN
+    INSERT INTO analyses_fts (analyses_fts, rowid, analysis_id, patient_id, filename, processed_by)
+    VALUES ('delete', old.seq, old.analysis_id, old.patient_id, old.filename, old.processed_by);
+    INSERT INTO analyses_fts (rowid, analysis_id, patient_id, filename, processed_by)
+    VALUES (new.seq, new.analysis_id, new.patient_id, new.filename, new.processed_by);
+END;
+INSERT INTO analyses_fts (analyses_fts) VALUES ('rebuild');
+"""
+
+# Set to False by init_db when this SQLite build has no FTS5 support
+FTS_ENABLED = True
+
+_local = threading.local()
+
+
+def _reset_connections():
+    """SQLite connections must not be used across fork(); each child opens its own"""
+    global _local
+    _local = threading.local()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_connections)
+
+
+# ------------------------
+# Connections
+# ------------------------
+def get_connection():
+    """Return this thread's connection to the history database"""
+    conn = getattr(_local, "conn", None)
+    if conn is None or getattr(_local, "path", None) != DB_PATH:
+        conn = sqlite3.connect(DB_PATH, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        _local.conn = conn
+        _local.path = DB_PATH
+    return conn
+
+
+def init_db(path=None):
+    """Create the history schema (idempotent) and switch to WAL mode"""
+    global DB_PATH, FTS_ENABLED
+    if path:
+        DB_PATH = path
+    conn = get_connection()
+    conn.executescript(SCHEMA)
+    columns = {row["name"] for row in conn.execute("PRAGMA table_info(analyses)")}
+    for name, definition in MIGRATIONS:
+        if name not in columns:
+            conn.execute(f"ALTER TABLE analyses ADD COLUMN {name} {definition}")
+
+    # The search index is built once, back-filling any rows that predate it, and
+    # rebuilt when its definition changes
+    fts = conn.execute(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'analyses_fts'"
+    ).fetchone()
+    if fts and fts["sql"] != SEARCH_TABLE:
+        conn.execute("DROP TABLE analyses_fts")
+        fts = None
+    if not fts:
+        try:
+            conn.executescript(SEARCH_SCHEMA)
+        except sqlite3.OperationalError:
+            FTS_ENABLED = False
+    conn.commit()
+
+
+# ------------------------
+# Writing
+# ------------------------
+def new_analysis_id():
+    return f"A-{uuid.uuid4().hex[:12].upper()}"
+
+
+def new_batch_id():
+    return f"B-{uuid.uuid4().hex[:8].upper()}"
+
+
+def condition_of(result):
+    """The reported (condition, confidence): stage 2 when it ran, else stage 1"""
+    if "stage2_prediction" in result:
+        condition = result["stage2_prediction"]
+        return condition, float(result["stage2_probabilities"][condition])
+    condition = result["stage1_prediction"]
+    return condition, float(result["stage1_probabilities"][condition])
+
+
+def _stored_json(result):
+    # Images are kept out of the stored JSON; they live on disk or are re-derivable
+    return json.dumps({k: v for k, v in result.items() if k not in ("gradcam", "original_image")})
+
+
+def make_record(analysis_id, result, filename=None, patient_id=None, clinician=None, batch_id=None):
+    """Flatten an API result into a history row"""
+    condition, confidence = condition_of(result)
+
+    if not patient_id:
+        patient_id = filename.rsplit(".", 1)[0] if filename else analysis_id
+
+    return {
+        "analysis_id": analysis_id,
+        "patient_id": patient_id,
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "filename": filename,
+        "condition": condition,
+        "confidence": confidence,
+        "referral": result["referral"],
+        "processed_by": clinician,
+        "batch_id": batch_id,
+        "gradcam_url": result.get("gradcam_url"),
+        "model_version": result.get("model_version"),
+        "result": _stored_json(result),
+    }
+
+
+def record_results(records):
+    """Insert history rows in a single transaction"""
+    if not records:
+        return
+    conn = get_connection()
+    with conn:
+        conn.executemany(
+            """
+            INSERT INTO analyses (analysis_id, patient_id, created_at, filename, condition, confidence,
+                                  referral, processed_by, batch_id, gradcam_url, model_version, result)
+            VALUES (:analysis_id, :patient_id, :created_at, :filename, :condition, :confidence,
+                    :referral, :processed_by, :batch_id, :gradcam_url, :model_version, :result)
+            """,
+            records,
+        )
+
+
+def update_results(results):
+    """Overwrite predictions for existing analyses (used when re-scoring stored cases)"""
+    rows = []
+    for result in results:
+        condition, confidence = condition_of(result)
+        rows.append({
+            "analysis_id": result["analysis_id"],
+            "condition": condition,
+            "confidence": confidence,
+            "referral": result["referral"],
+            "gradcam_url": result.get("gradcam_url"),
+            "model_version": result.get("model_version"),
+            "result": _stored_json(result),
+        })
+    conn = get_connection()
+    with conn:
+        conn.executemany(
+            """
+            UPDATE analyses
+            SET condition = :condition, confidence = :confidence, referral = :referral,
+                gradcam_url = COALESCE(:gradcam_url, gradcam_url),
+                model_version = COALESCE(:model_version, model_version), result = :result
+            WHERE analysis_id = :analysis_id
+            """,
+            rows,
+        )
+
+
+# ------------------------
+# Querying
+# ------------------------
+def get_records(analysis_ids):
+    """Map analysis ID to its history row for the IDs that exist"""
+    if not analysis_ids:
+        return {}
+    placeholders = ", ".join("?" * len(analysis_ids))
+    rows = get_connection().execute(
+        f"SELECT * FROM analyses WHERE analysis_id IN ({placeholders})", list(analysis_ids)
+    ).fetchall()
+    return {r["analysis_id"]: r for r in rows}
+
+
+def _date_floor(date_range, now=None):
+    now = now or datetime.now()
+    if date_range == "today":
+        start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    elif date_range == "week":
+        start = (now - timedelta(days=now.weekday())).replace(hour=0, minute=0, second=0, microsecond=0)
+    elif date_range == "month":
+        start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    elif date_range == "30d":
+        start = now - timedelta(days=30)
+    else:
+        return None
+    return start.isoformat(timespec="seconds")
+
+
+def _search_terms(search):
+    """Split input into words, each a list of tokens (\"P-20\" -> [\"P\", \"20\"])"""
+    words = [re.findall(r"\w+", w) for w in (search or "").split()]
+    return [w for w in words if w]
+
+
+def _fts_query(terms):
+    """Each word becomes a phrase whose last token is a prefix match"""
+    return " ".join('"{}"*'.format(" ".join(tokens)) for tokens in terms)
+
+
+def _build_filters(date_range="all", condition=None, referral=None, search=None):
+    """Return (clauses, params) for a WHERE over analyses
+
+    An indexed search becomes a `seq IN (matching rowids)` clause rather than a
+    join, so SQLite cannot pick a plan that re-runs the full-text query per row.
+    """
+    clauses, params = [], []
+
+    terms = _search_terms(search)
+    if terms and FTS_ENABLED:
+        clauses.append(MATCH_CLAUSE)
+        params.append(_fts_query(terms))
+    elif terms:
+        for tokens in terms:
+            clauses.append(
+                "(patient_id LIKE ? OR analysis_id LIKE ? OR filename LIKE ? OR processed_by LIKE ?)"
+            )
+            params.extend([f"%{tokens[-1]}%"] * 4)
+
+    since = _date_floor(date_range)
+    if since:
+        clauses.append("created_at >= ?")
+        params.append(since)
+    if condition:
+        clauses.append("condition = ?")
+        params.append(condition)
+    if referral:
+        clauses.append("referral = ?")
+        params.append(referral)
+
+    return clauses, params
+
+
+def _where(clauses):
+    return f"WHERE {' AND '.join(clauses)}" if clauses else ""
+
+
+def row_to_dict(row):
+    return {
+        "id": row["analysis_id"],
+        "patient_id": row["patient_id"],
+        "date": row["created_at"],
+        "filename": row["filename"],
+        "condition": row["condition"],
+        "confidence": row["confidence"],
+        "referral": row["referral"],
+        "processed_by": row["processed_by"],
+        "batch_id": row["batch_id"],
+        "gradcam_url": row["gradcam_url"],
+        "model_version": row["model_version"],
+    }
+
+
+def encode_cursor(sort, order, sort_value, seq):
+    payload = json.dumps([sort, order, sort_value, seq]).encode("utf-8")
+    return base64.urlsafe_b64encode(payload).decode("ascii")
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def decode_cursor(cursor, sort, order, relevance=False):
+    """Return (sort_value, seq) for a cursor issued for the same sort
+
+    Relevance pages of an indexed search key on a [phase, value] pair, all
+    others on the sort column's value. Cursors come from clients, so anything
+    not shaped like one we issued is rejected before it reaches a query.
+    """
+    try:
+        c_sort, c_order, sort_value, seq = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (ValueError, TypeError):
+        raise ValueError("Malformed history cursor")
+    if (c_sort, c_order) != (sort, order):
+        raise ValueError("History cursor was issued for a different sort order")
+    if relevance:
+        well_formed = (isinstance(sort_value, list) and len(sort_value) == 2
+                       and sort_value[0] in ("ranked", "older") and _is_number(sort_value[1]))
+    else:
+        well_formed = isinstance(sort_value, str) or _is_number(sort_value)
+    if not well_formed or not isinstance(seq, int) or isinstance(seq, bool):
+        raise ValueError("Malformed history cursor")
+    return sort_value, seq
+
+
+def _fetch_page(source, source_params, sort_expr, direction, clauses, params, limit, keyset=None):
+    """Up to limit rows ordered by (sort_expr, seq), continuing after keyset = (sort_value, seq)"""
+    clauses, params = list(clauses), list(params)
+    if keyset is not None:
+        comparison = ">" if direction == "ASC" else "<"
+        clauses.append(f"({sort_expr}, analyses.seq) {comparison} (?, ?)")
+        params += list(keyset)
+    return get_connection().execute(
+        f"""
+        SELECT analyses.*, {sort_expr} AS sort_key FROM {source} {_where(clauses)}
+        ORDER BY sort_key {direction}, analyses.seq {direction} LIMIT ?
+        """,
+        list(source_params) + params + [limit],
+    ).fetchall()
+
+
+def _page(keyed_rows, limit, sort, order, total, total_capped=False):
+    """keyed_rows are (cursor sort value, row) pairs, one more than limit if there is a next page"""
+    next_cursor = None
+    if len(keyed_rows) > limit:
+        keyed_rows = keyed_rows[:limit]
+        sort_value, last = keyed_rows[-1]
+        next_cursor = encode_cursor(sort, order, sort_value, last["seq"])
+    return {
+        "total": total,
+        "total_capped": total_capped,
+        "results": [row_to_dict(r) for _, r in keyed_rows],
+        "next_cursor": next_cursor,
+    }
+
+
+def query_history(date_range="all", condition=None, referral=None, search=None,
+                  sort="date", order="desc", limit=15, cursor=None):
+    """Filter, sort and keyset-paginate history rows inside SQLite
+
+    Pages are addressed by an opaque cursor holding the last row's sort key,
+    so each page costs the same regardless of how deep into the archive it is.
+    The total is only counted for the first page.
+    """
+    terms = _search_terms(search)
+    if terms and FTS_ENABLED:
+        return _search_history(terms, search, date_range, condition, referral, sort, order, limit, cursor)
+
+    clauses, params = _build_filters(date_range, condition, referral, search)
+    column = SORT_COLUMNS.get(sort, "created_at")
+    direction = "ASC" if order == "asc" else "DESC"
+    if column == "rank":
+        # Without an indexed search fall back to newest first
+        column, direction = "created_at", "DESC"
+
+    total = None
+    if cursor is None:
+        total = get_connection().execute(f"SELECT COUNT(*) FROM analyses {_where(clauses)}", params).fetchone()[0]
+    keyset = decode_cursor(cursor, sort, order) if cursor is not None else None
+    rows = _fetch_page("analyses", [], column, direction, clauses, params, limit + 1, keyset)
+    return _page([(r["sort_key"], r) for r in rows], limit, sort, order, total)
+
+
+def _older_matches(fts, below, skip, clauses, params, count, chunk_size=256):
+    """Up to count filtered matches with seq < below, newest first
+
+    Walks the full-text index backwards in rowid order a chunk at a time, so
+    only as many matches are read as it takes to fill the page.
+    """
+    conn = get_connection()
+    cur = conn.execute(
+        "SELECT rowid FROM analyses_fts WHERE analyses_fts MATCH ? AND rowid < ? ORDER BY rowid DESC",
+        [fts, below],
+    )
+    found = []
+    while len(found) < count:
+        chunk = cur.fetchmany(chunk_size)
+        if not chunk:
+            break
+        seqs = ", ".join(str(r[0]) for r in chunk if r[0] not in skip)
+        if seqs:
+            found += conn.execute(
+                f"SELECT * FROM analyses {_where([f'seq IN ({seqs})'] + clauses)} ORDER BY seq DESC", params
+            ).fetchall()
+    return found[:count]
+
+
+def _search_history(terms, search, date_range, condition, referral, sort, order, limit, cursor):
+    """query_history for an indexed search
+
+    Searches matching up to BROAD_MATCH rows are counted, and ranked by bm25 in
+    full. Broader ones (a single letter, a common prefix) are neither: their
+    total is reported as capped, only the newest BROAD_MATCH matches are ranked
+    and the older ones follow newest first, and date/confidence pages walk the
+    sort column's index instead of sorting every match.
+    """
+    conn = get_connection()
+    fts = _fts_query(terms)
+    clauses, params = _build_filters(date_range, condition, referral)
+    matched = conn.execute(
+        "SELECT COUNT(*) FROM (SELECT 1 FROM analyses_fts WHERE analyses_fts MATCH ? LIMIT ?)",
+        [fts, BROAD_MATCH + 1],
+    ).fetchone()[0]
+    broad = matched > BROAD_MATCH
+
+    total = boundary = None
+    if cursor is None and not broad:
+        total = conn.execute(
+            f"SELECT COUNT(*) FROM analyses NOT INDEXED {_where([MATCH_CLAUSE] + clauses)}", [fts] + params
+        ).fetchone()[0]
+    if broad:
+        # Oldest rowid among the newest BROAD_MATCH matches
+        boundary = conn.execute(
+            "SELECT rowid FROM analyses_fts WHERE analyses_fts MATCH ? ORDER BY rowid DESC LIMIT 1 OFFSET ?",
+            [fts, BROAD_MATCH - 1],
+        ).fetchone()[0]
+
+    column = SORT_COLUMNS.get(sort, "created_at")
+    if column != "rank":
+        direction = "ASC" if order == "asc" else "DESC"
+        # Few matches are looked up by rowid and sorted; many are found by walking the
+        # index, and when most rows match, each row met is checked against the search
+        # on its own instead of listing every match up front
+        source, match = "analyses NOT INDEXED", MATCH_CLAUSE
+        if broad:
+            source = f"analyses INDEXED BY {SORT_INDEXES[column]}"
+            newest = conn.execute("SELECT MAX(seq) FROM analyses").fetchone()[0]
+            if BROAD_MATCH / (newest - boundary + 1) >= DENSE_MATCH:
+                match = ROW_MATCH_CLAUSE
+        keyset = decode_cursor(cursor, sort, order) if cursor is not None else None
+        rows = _fetch_page(source, [], column, direction, [match] + clauses, [fts] + params,
+                           limit + 1, keyset)
+        return _page([(r["sort_key"], r) for r in rows], limit, sort, order, total, broad)
+
+    # Relevance: best bm25 match first, with exact ID hits ahead of everything else
+    needle = (search or "").strip()
+    exact = [r[0] for r in conn.execute(
+        "SELECT seq FROM analyses WHERE analysis_id IN (?, ?) OR patient_id IN (?, ?, ?)",
+        [needle, needle.upper(), needle, needle.upper(), needle.lower()],
+    )]
+    weights = ", ".join(str(w) for w in SEARCH_WEIGHTS)
+    scored = f"SELECT rowid, bm25(analyses_fts, {weights}) AS rank FROM analyses_fts WHERE analyses_fts MATCH ?"
+    matches, match_params = scored, [fts]
+    if broad:
+        # A plain rowid range keeps bm25 to the window; exact hits outside it are scored separately
+        matches, match_params = f"{scored} AND rowid >= ?", [fts, boundary]
+        older_exact = [seq for seq in exact if seq < boundary]
+        if older_exact:
+            matches += f" UNION ALL {scored} AND rowid IN ({', '.join(map(str, older_exact))})"
+            match_params.append(fts)
+    ranked = f"({matches}) AS matches CROSS JOIN analyses ON analyses.seq = matches.rowid"
+    boost = f" - 1000.0 * (analyses.seq IN ({', '.join(map(str, exact))}))" if exact else ""
+    rank_expr = f"(matches.rank{boost})"
+
+    phase, keyset = "ranked", None
+    if cursor is not None:
+        (phase, value), seq = decode_cursor(cursor, sort, order, relevance=True)
+        keyset = (value, seq)
+
+    keyed = []
+    if phase == "ranked":
+        rows = _fetch_page(ranked, match_params, rank_expr, "ASC", clauses, params, limit + 1, keyset)
+        keyed = [(["ranked", r["sort_key"]], r) for r in rows]
+        keyset = None
+    if broad and len(keyed) <= limit:
+        # Matches older than the ranked window, newest first
+        below = min(boundary, keyset[1]) if keyset else boundary
+        rows = _older_matches(fts, below, set(exact), clauses, params, limit + 1 - len(keyed))
+        keyed += [(["older", r["seq"]], r) for r in rows]
+    return _page(keyed, limit, sort, order, total, broad)
+
+
+def iter_history(date_range="all", condition=None, referral=None, search=None,
+                 sort="date", order="desc", chunk_size=1000):
+    """Yield filtered history rows as lists of dicts, chunk_size rows at a time
+
+    Uses its own connection so the generator can be advanced from any thread
+    (streaming responses are iterated from a worker pool), and reads from a
+    single WAL snapshot so rows inserted mid-export do not shift the output.
+    """
+    clauses, params = _build_filters(date_range, condition, referral, search)
+    source, column = "analyses", SORT_COLUMNS.get(sort, "created_at")
+    direction = "ASC" if order == "asc" else "DESC"
+    terms = _search_terms(search)
+    if column == "rank" and terms and FTS_ENABLED:
+        clauses, params = _build_filters(date_range, condition, referral)
+        weights = ", ".join(str(w) for w in SEARCH_WEIGHTS)
+        source = (
+            f"(SELECT rowid, bm25(analyses_fts, {weights}) AS rank FROM analyses_fts "
+            f"WHERE analyses_fts MATCH ?) AS matches CROSS JOIN analyses ON analyses.seq = matches.rowid"
+        )
+        params = [_fts_query(terms)] + params
+        column = "matches.rank"
+    elif column == "rank":
+        column = "created_at"
+
+    conn = sqlite3.connect(DB_PATH, timeout=30, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    try:
+        cur = conn.execute(
+            f"SELECT analyses.* FROM {source} {_where(clauses)} "
+            f"ORDER BY {column} {direction}, analyses.seq {direction}",
+            params,
+        )
+        while True:
+            rows = cur.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield [row_to_dict(r) for r in rows]
+    finally:
+        conn.close()
+
+
+def history_stats(date_range="all", condition=None, referral=None, search=None):
+    """Archive-wide summary plus trend counts for the filtered set"""
+    conn = get_connection()
+
+    week_start = _date_floor("week")
+    summary = conn.execute(
+        """
+        SELECT COUNT(*) AS total,
+               SUM(referral = 'Urgent') AS urgent,
+               AVG(confidence) AS avg_confidence,
+               SUM(created_at >= ?) AS this_week
+        FROM analyses
+        """,
+        [week_start],
+    ).fetchone()
+
+    clauses, params = _build_filters(date_range, condition, referral, search)
+    where = _where(clauses)
+    daily = conn.execute(
+        f"""
+        SELECT substr(created_at, 1, 10) AS day, condition, COUNT(*) AS n
+        FROM analyses {where}
+        GROUP BY day, condition ORDER BY day
+        """,
+        params,
+    ).fetchall()
+    conditions = conn.execute(
+        f"SELECT condition, COUNT(*) AS n FROM analyses {where} GROUP BY condition", params
+    ).fetchall()
+    referrals = conn.execute(
+        f"SELECT referral, COUNT(*) AS n FROM analyses {where} GROUP BY referral", params
+    ).fetchall()
+
+    return {
+        "summary": {
+            "total": summary["total"],
+            "urgent": summary["urgent"] or 0,
+            "avg_confidence": summary["avg_confidence"] or 0.0,
+            "this_week": summary["this_week"] or 0,
+        },
+        "daily": [{"date": r["day"], "condition": r["condition"], "count": r["n"]} for r in daily],
+        "conditions": {r["condition"]: r["n"] for r in conditions},
+        "referrals": {r["referral"]: r["n"] for r in referrals},
+    }
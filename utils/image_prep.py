@@ -0,0 +1,73 @@
+import io
+
+import numpy as np
+from PIL import Image
+
+# ------------------------
+# Config
+# ------------------------
+# api.py resizes every input to this size before inference
+MODEL_INPUT_SIZE = (500, 500)
+
+# Lossless encodings only, so the server decodes exactly the pixels we produced
+UPLOAD_ENCODINGS = {
+    "PNG": {"format": "PNG", "compress_level": 6},
+    "WEBP": {"format": "WEBP", "lossless": True, "quality": 80, "method": 4},
+}
+
+
+def _window_bounds(n_in, n_out):
+    """Start and end of each output pixel's input window, as torch's adaptive_avg_pool2d picks them"""
+    i = np.arange(n_out)
+    return (i * n_in) // n_out, -(-((i + 1) * n_in) // n_out)
+
+
+def area_resize(arr, size):
+    """Resize an (H, W, C) uint8 array to size (W, H) exactly like api.load_resized
+
+    That is MONAI's "area" mode (torch adaptive_avg_pool2d, whose windows
+    overlap when the ratio is not an integer, unlike PIL's BOX filter) followed
+    by rounding to uint8. Window sums are taken in integers so halves round the
+    same way as on the server.
+    """
+    sums = np.cumsum(arr, axis=0, dtype=np.int64)
+    sums = np.concatenate([np.zeros_like(sums[:1]), sums])
+    row_start, row_end = _window_bounds(arr.shape[0], size[1])
+    sums = sums[row_end] - sums[row_start]
+
+    sums = np.cumsum(sums, axis=1)
+    sums = np.concatenate([np.zeros_like(sums[:, :1]), sums], axis=1)
+    col_start, col_end = _window_bounds(arr.shape[1], size[0])
+    sums = sums[:, col_end] - sums[:, col_start]
+
+    counts = np.outer(row_end - row_start, col_end - col_start)[:, :, None]
+    return np.clip(np.rint(sums / counts), 0, 255).astype(np.uint8)
+
+
+def prepare_upload(data, encoding="PNG", size=MODEL_INPUT_SIZE):
+    """Downscale an image to the model input size and re-encode it losslessly
+
+    The server's resize is the identity on the result, so the model sees the
+    same input as for the full-size upload (checked by
+    benchmarks/fidelity_downscale.py). Images already at or below the input
+    size are left alone, as is anything where re-encoding does not shrink
+    the payload. The filename is not touched; the API sniffs the format.
+    """
+    try:
+        img = Image.open(io.BytesIO(data))
+        img.load()
+    except Exception:
+        # Let the API report undecodable files exactly as before
+        return data
+
+    if img.width < size[0] or img.height < size[1]:
+        return data
+
+    img = img.convert("RGB")
+    if img.size != size:
+        img = Image.fromarray(area_resize(np.asarray(img), size))
+
+    buf = io.BytesIO()
+    img.save(buf, **UPLOAD_ENCODINGS[encoding])
+    encoded = buf.getvalue()
+    return encoded if len(encoded) < len(data) else data
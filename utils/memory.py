@@ -0,0 +1,67 @@
+import os
+import sys
+import tracemalloc
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+def rss_bytes():
+    """Current resident set size, or None where /proc is unavailable"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return None
+
+def max_rss_bytes():
+    """Peak resident set size of this process so far, or None on Windows"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+class MemoryTracker:
+    """RSS (and, when tracemalloc is tracing, Python/numpy allocation) samples per pipeline stage
+
+    RSS is sampled at stage boundaries, so the request peak is a lower bound.
+    tracemalloc peaks are process-wide: with concurrent requests a stage's
+    peak includes allocations made by other requests at the same time.
+    """
+
+    def __init__(self):
+        self.trace = tracemalloc.is_tracing()
+        self.rss_start = rss_bytes() or 0
+        self.rss_peak = self.rss_start
+        self.alloc_peak = 0
+        self.stages = {}
+
+    @contextmanager
+    def stage(self, name):
+        if self.trace:
+            base = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        try:
+            yield
+        finally:
+            entry = self.stages.setdefault(name, {"rss_max": 0, "alloc_peak": 0})
+            rss = rss_bytes() or 0
+            entry["rss_max"] = max(entry["rss_max"], rss)
+            self.rss_peak = max(self.rss_peak, rss)
+            if self.trace:
+                peak = tracemalloc.get_traced_memory()[1] - base
+                entry["alloc_peak"] = max(entry["alloc_peak"], peak)
+                self.alloc_peak = max(self.alloc_peak, peak)
+
+    def summary(self):
+        return {
+            "rss_start": self.rss_start,
+            "rss_peak": self.rss_peak,
+            "rss_growth": self.rss_peak - self.rss_start,
+            "alloc_peak": self.alloc_peak if self.trace else None,
+            "stages": self.stages,
+        }
@@ -0,0 +1,65 @@
+import bisect
+import threading
+
+# Histogram bucket upper bounds
+BYTES_BUCKETS = tuple(2 ** i * 1024 * 1024 for i in range(3, 14))  # 8 MB .. 8 GB
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+_lock = threading.Lock()
+_metrics = {}  # name -> {"kind", "help", "buckets", "series": {labels: value or histogram state}}
+
+def register(name, kind, help_text, buckets=None):
+    """Declare a metric once at import; kind is "counter", "gauge" or "histogram" """
+    with _lock:
+        _metrics.setdefault(name, {"kind": kind, "help": help_text, "buckets": buckets, "series": {}})
+
+def _labels(labels):
+    return tuple(sorted(labels.items()))
+
+def inc(name, amount=1, **labels):
+    with _lock:
+        series = _metrics[name]["series"]
+        key = _labels(labels)
+        series[key] = series.get(key, 0) + amount
+
+def set_gauge(name, value, **labels):
+    with _lock:
+        _metrics[name]["series"][_labels(labels)] = value
+
+def observe(name, value, **labels):
+    with _lock:
+        metric = _metrics[name]
+        state = metric["series"].setdefault(_labels(labels), {
+            "buckets": [0] * len(metric["buckets"]), "sum": 0.0, "count": 0,
+        })
+        i = bisect.bisect_left(metric["buckets"], value)
+        if i < len(metric["buckets"]):
+            state["buckets"][i] += 1
+        state["sum"] += value
+        state["count"] += 1
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+def render():
+    """All metrics in the Prometheus text exposition format"""
+    lines = []
+    with _lock:
+        for name, metric in _metrics.items():
+            lines.append(f"# HELP {name} {metric['help']}")
+            lines.append(f"# TYPE {name} {metric['kind']}")
+            for labels, value in metric["series"].items():
+                if metric["kind"] != "histogram":
+                    lines.append(f"{name}{_format_labels(labels)} {value}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(metric["buckets"], value["buckets"]):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_format_labels(labels, [('le', bound)])} {cumulative}")
+                lines.append(f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {value['count']}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {value['sum']}")
+                lines.append(f"{name}_count{_format_labels(labels)} {value['count']}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,209 @@
+import hashlib
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+
+# Version lifecycle: loading -> warming -> active -> draining -> standby (kept for
+# rollback) -> retired (weights released once its last request finishes).
+# A load that raises ends in "failed" and never becomes active.
+
+def file_digest(path, chunk_size=1 << 20):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def version_id(stage1_path, stage2_path):
+    """Content-addressed id, so the same weights always get the same version"""
+    return f"{file_digest(stage1_path)[:8]}-{file_digest(stage2_path)[:8]}"
+
+def _now():
+    return datetime.now().isoformat(timespec="seconds")
+
+class ModelVersion:
+    """The stage 1 and stage 2 models of one release and where it is in its lifecycle"""
+
+    def __init__(self, version, stage1_path, stage2_path):
+        self.version = version
+        self.stage1_path = stage1_path
+        self.stage2_path = stage2_path
+        self.stage1 = None
+        self.stage2 = None
+        self.state = "loading"
+        self.error = None
+        self.loaded_at = None
+        self.activated_at = None
+        self.warmup_s = None
+        self.warmed_at = None
+        self.inflight = 0
+        # Held across every forward pass and Grad-CAM on this version: Grad-CAM
+        # registers hooks on the shared modules, so two threads must not overlap
+        self.lock = threading.Lock()
+
+    def info(self):
+        return {
+            "version": self.version,
+            "state": self.state,
+            "stage1_path": self.stage1_path,
+            "stage2_path": self.stage2_path,
+            "loaded_at": self.loaded_at,
+            "activated_at": self.activated_at,
+            "warmup_s": self.warmup_s,
+            "warmed_at": self.warmed_at,
+            "inflight": self.inflight,
+            "error": self.error,
+        }
+
+class ModelRegistry:
+    """Serves requests from the active version while new versions load and warm up
+
+    load_fn(path) returns an eval-mode model; warmup_fn(version) runs it once so
+    the first real request does not pay for lazy initialisation. Requests pin a
+    version with use(), so a swap never changes the models under a running
+    request: the replaced version drains, then stays loaded for rollback().
+    """
+
+    def __init__(self, load_fn, warmup_fn=None, history=20):
+        self._load_fn = load_fn
+        self._warmup_fn = warmup_fn
+        self._lock = threading.Condition()
+        self.active = None
+        self.previous = None
+        self.pending = None
+        self.events = deque(maxlen=history)
+
+    def _event(self, action, version, **extra):
+        self.events.append(dict(at=_now(), action=action, version=version, **extra))
+
+    # ------------------------
+    # Loading
+    # ------------------------
+    def begin(self, stage1_path, stage2_path):
+        """Reserve the loading slot for a new version; raises RuntimeError if one is already loading"""
+        version = ModelVersion(version_id(stage1_path, stage2_path), stage1_path, stage2_path)
+        with self._lock:
+            if self.pending is not None:
+                raise RuntimeError(f"Version {self.pending.version} is still loading")
+            self.pending = version
+        return version
+
+    def finish(self, version, warmup=True):
+        """Load and warm up a version from begin(), then make it active"""
+        try:
+            version.stage1 = self._load_fn(version.stage1_path)
+            version.stage2 = self._load_fn(version.stage2_path)
+            version.loaded_at = _now()
+            if warmup and self._warmup_fn is not None:
+                version.state = "warming"
+                self.warm(version)
+            version.state = "standby"
+        except Exception as e:
+            version.state, version.error = "failed", f"{type(e).__name__}: {e}"
+            version.stage1 = version.stage2 = None
+            with self._lock:
+                self._event("failed", version.version, error=version.error)
+            raise
+        finally:
+            with self._lock:
+                self.pending = None
+        self.activate(version)
+        return version
+
+    def warm(self, version):
+        """Run warmup_fn on version and record how long it took; safe on the active version"""
+        start = time.perf_counter()
+        self._warmup_fn(version)
+        version.warmup_s = round(time.perf_counter() - start, 3)
+        version.warmed_at = _now()
+
+    def load(self, stage1_path, stage2_path, warmup=True):
+        """Load and activate a version on the calling thread; returns it"""
+        return self.finish(self.begin(stage1_path, stage2_path), warmup)
+
+    def load_in_background(self, stage1_path, stage2_path, warmup=True, on_active=None):
+        """Start loading a version on a daemon thread; returns it at once (state "loading")
+
+        on_active(version) is called once it has been swapped in.
+        """
+        version = self.begin(stage1_path, stage2_path)
+
+        def run():
+            try:
+                self.finish(version, warmup)
+            except Exception:
+                return  # recorded on the version and in events
+            if on_active is not None:
+                on_active(version)
+
+        threading.Thread(target=run, name=f"model-load-{version.version}", daemon=True).start()
+        return version
+
+    # ------------------------
+    # Swapping
+    # ------------------------
+    def _retire(self, version):
+        version.state = "retired"
+        if version.inflight == 0:
+            version.stage1 = version.stage2 = None
+
+    def activate(self, version):
+        """Atomically route new requests to version; the old active one drains and becomes previous"""
+        with self._lock:
+            old = self.active
+            if old is version:
+                return
+            if self.previous is not None and self.previous not in (old, version):
+                self._retire(self.previous)
+            if old is not None:
+                old.state = "draining" if old.inflight else "standby"
+            self.previous = old
+            self.active = version
+            version.state, version.activated_at = "active", _now()
+            self._event("activated", version.version, replaced=old.version if old else None)
+
+    def rollback(self):
+        """Swap the previous version back in; raises LookupError if there is none"""
+        with self._lock:
+            if self.previous is None or self.previous.stage1 is None:
+                raise LookupError("No previous model version to roll back to")
+            target = self.previous
+            self.activate(target)
+            self._event("rolled_back", target.version)
+        return target
+
+    @contextmanager
+    def use(self):
+        """Pin the active version for the duration of one request"""
+        with self._lock:
+            version = self.active
+            if version is None:
+                raise RuntimeError("No model version is active")
+            version.inflight += 1
+        try:
+            yield version
+        finally:
+            with self._lock:
+                version.inflight -= 1
+                if version.inflight == 0:
+                    if version.state == "draining":
+                        version.state = "standby"
+                    elif version.state == "retired":
+                        version.stage1 = version.stage2 = None
+                    self._lock.notify_all()
+
+    def wait_drained(self, version, timeout=None):
+        """Block until no request is using version; returns False on timeout"""
+        with self._lock:
+            return self._lock.wait_for(lambda: version.inflight == 0, timeout)
+
+    def info(self):
+        with self._lock:
+            return {
+                "active": self.active.info() if self.active else None,
+                "previous": self.previous.info() if self.previous else None,
+                "loading": self.pending.info() if self.pending else None,
+                "events": list(self.events),
+            }
@@ -0,0 +1,150 @@
+import contextvars
+import cProfile
+import io
+import json
+import os
+import pstats
+import time
+import uuid
+
+# pyinstrument is optional; it samples instead of tracing, so overhead is much
+# lower than cProfile's on the numpy/torch-heavy request paths
+try:
+    from pyinstrument import Profiler as _SamplingProfiler
+except ImportError:
+    _SamplingProfiler = None
+
+# Artifact kind -> (file suffix, media type)
+PROFILE_FILES = {
+    "html": (".html", "text/html"),
+    "pstats": (".prof", "application/octet-stream"),
+    "text": (".txt", "text/plain"),
+    "trace": (".trace.json", "application/json"),
+}
+
+# The profile of the request being handled, if any; run_inference uses it to
+# profile work it hands to the inference executor
+current_profile = contextvars.ContextVar("current_profile", default=None)
+
+def backend():
+    return "pyinstrument" if _SamplingProfiler is not None else "cprofile"
+
+class RequestProfile:
+    """Profile the calling thread (and torch ops, if torch_trace) between start() and stop()
+
+    cProfile/pyinstrument only see the thread that called start(); work on
+    other threads is included by running it through run(). torch.profiler
+    records operators from every thread.
+    """
+
+    def __init__(self, torch_trace=False):
+        self.torch_trace = torch_trace
+        self._profiler = None
+        self._torch = None
+        self._segments = []
+
+    def start(self):
+        if _SamplingProfiler is not None:
+            self._profiler = _SamplingProfiler(async_mode="disabled")
+            self._profiler.start()
+        else:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        if self.torch_trace:
+            import torch.profiler
+            self._torch = torch.profiler.profile(activities=[torch.profiler.ProfilerActivity.CPU])
+            self._torch.__enter__()
+
+    def stop(self):
+        if self._torch is not None:
+            self._torch.__exit__(None, None, None)
+        if isinstance(self._profiler, cProfile.Profile):
+            self._profiler.disable()
+        else:
+            self._profiler.stop()
+
+    def run(self, fn):
+        """Call fn() on this thread, profiling it as part of the request"""
+        if _SamplingProfiler is not None:
+            segment = _SamplingProfiler(async_mode="disabled")
+            segment.start()
+            try:
+                return fn()
+            finally:
+                self._segments.append(segment.stop())
+        segment = cProfile.Profile()
+        try:
+            segment.enable()
+        except ValueError:
+            # Python 3.12+ allows one cProfile per process, and it already sees every thread
+            return fn()
+        try:
+            return fn()
+        finally:
+            segment.disable()
+            self._segments.append(segment)
+
+    def save(self, directory, meta):
+        """Write the profile artifacts plus a metadata file; returns the stored metadata"""
+        profile_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        stem = os.path.join(directory, profile_id)
+        files = []
+        if isinstance(self._profiler, cProfile.Profile):
+            text = io.StringIO()
+            stats = pstats.Stats(self._profiler, stream=text)
+            for segment in self._segments:
+                stats.add(segment)
+            stats.dump_stats(stem + PROFILE_FILES["pstats"][0])
+            stats.sort_stats("cumulative").print_stats(60)
+            with open(stem + PROFILE_FILES["text"][0], "w") as f:
+                f.write(text.getvalue())
+            files += ["pstats", "text"]
+        else:
+            from pyinstrument.renderers import ConsoleRenderer, HTMLRenderer
+            from pyinstrument.session import Session
+
+            session = self._profiler.last_session
+            for segment in self._segments:
+                session = Session.combine(session, segment)
+            with open(stem + PROFILE_FILES["html"][0], "w") as f:
+                f.write(HTMLRenderer().render(session))
+            with open(stem + PROFILE_FILES["text"][0], "w") as f:
+                f.write(ConsoleRenderer(unicode=True).render(session))
+            files += ["html", "text"]
+        if self._torch is not None:
+            self._torch.export_chrome_trace(stem + PROFILE_FILES["trace"][0])
+            files.append("trace")
+
+        meta = dict(meta, id=profile_id, backend=backend(), files=files)
+        with open(stem + ".json", "w") as f:
+            json.dump(meta, f)
+        return meta
+
+def list_profiles(directory):
+    """Metadata of the stored profiles, newest first"""
+    profiles = []
+    for name in os.listdir(directory):
+        if name.endswith(".json") and not name.endswith(PROFILE_FILES["trace"][0]):
+            try:
+                with open(os.path.join(directory, name)) as f:
+                    profiles.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+    return sorted(profiles, key=lambda p: p["id"], reverse=True)
+
+def profile_file(directory, profile_id, kind):
+    """Path of one stored artifact, or None"""
+    if kind not in PROFILE_FILES:
+        return None
+    path = os.path.join(directory, profile_id + PROFILE_FILES[kind][0])
+    return path if os.path.exists(path) else None
+
+def prune_profiles(directory, keep):
+    """Delete all but the newest `keep` profiles"""
+    for meta in list_profiles(directory)[keep:]:
+        for kind in meta.get("files", []) + [None]:
+            suffix = PROFILE_FILES[kind][0] if kind else ".json"
+            try:
+                os.remove(os.path.join(directory, meta["id"] + suffix))
+            except OSError:
+                pass
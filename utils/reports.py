@@ -0,0 +1,301 @@
+import io
+import os
+import tempfile
+from datetime import datetime
+
+from PIL import Image
+from reportlab.lib.pagesizes import A4
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image as RLImage, Table, TableStyle
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import inch
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER
+
+# Report images are downsampled to this resolution at their printed size
+PRINT_DPI = 300
+REPORT_JPEG_QUALITY = 85
+
+def print_image(image, width_in, height_in, dpi=PRINT_DPI):
+    """JPEG-encode a PIL image at print resolution for its rendered size"""
+    size = (int(width_in * dpi), int(height_in * dpi))
+    image.draft("RGB", size)  # JPEG sources decode straight at reduced scale
+    img = image.convert("RGB")
+    if img.width > size[0] or img.height > size[1]:
+        img = img.resize(size, Image.Resampling.LANCZOS)
+    buf = io.BytesIO()
+    img.save(buf, format="JPEG", quality=REPORT_JPEG_QUALITY, optimize=True)
+    buf.seek(0)
+    return buf
+
+def create_pdf_report(result, original_image, gradcam_image, filename):
+    """Create a PDF report for a single case; either image may be None"""
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=0.5*inch, bottomMargin=0.5*inch)
+
+    # Get styles
+    styles = getSampleStyleSheet()
+    title_style = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=16,
+        spaceAfter=12,
+        alignment=TA_CENTER,
+        textColor=colors.HexColor('#1f2937')
+    )
+
+    heading_style = ParagraphStyle(
+        'CustomHeading',
+        parent=styles['Heading2'],
+        fontSize=14,
+        spaceAfter=8,
+        textColor=colors.HexColor('#374151')
+    )
+
+    normal_style = ParagraphStyle(
+        'CustomNormal',
+        parent=styles['Normal'],
+        fontSize=11,
+        spaceAfter=6
+    )
+
+    story = []
+
+    # Title
+    story.append(Paragraph("Otoscopy AI Analysis Report", title_style))
+    story.append(Spacer(1, 12))
+
+    # Patient info
+    story.append(Paragraph("Patient Information", heading_style))
+    patient_data = [
+        ['Patient ID:', result.get("patient_id", filename)],
+        ['Analysis Date:', result.get("analysis_date", datetime.now().strftime('%Y-%m-%d %H:%M:%S'))],
+        ['Report Generated:', datetime.now().strftime('%Y-%m-%d %H:%M:%S')]
+    ]
+
+    patient_table = Table(patient_data, colWidths=[2*inch, 4*inch])
+    patient_table.setStyle(TableStyle([
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 11),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+    ]))
+    story.append(patient_table)
+    story.append(Spacer(1, 16))
+
+    # Diagnostic Results
+    story.append(Paragraph("Diagnostic Results", heading_style))
+
+    # Primary Classification
+    primary_pred = result.get("stage1_prediction", "Unknown")
+    primary_conf = result.get("stage1_probabilities", {}).get(primary_pred, 0) * 100
+
+    results_data = [
+        ['Primary Classification:', primary_pred],
+        ['Confidence Level:', f'{primary_conf:.1f}%'],
+    ]
+
+    # Secondary Classification if available
+    if "stage2_prediction" in result:
+        secondary_pred = result["stage2_prediction"]
+        secondary_conf = result["stage2_probabilities"][secondary_pred] * 100
+        results_data.extend([
+            ['Secondary Classification:', secondary_pred],
+            ['Secondary Confidence:', f'{secondary_conf:.1f}%'],
+        ])
+
+    # Referral recommendation
+    referral = result.get("referral", "Unknown")
+    results_data.append(['Referral Recommendation:', referral])
+
+    results_table = Table(results_data, colWidths=[2.5*inch, 3.5*inch])
+    results_table.setStyle(TableStyle([
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 11),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+        ('GRID', (0, 0), (-1, -1), 1, colors.lightgrey),
+    ]))
+    story.append(results_table)
+    story.append(Spacer(1, 20))
+
+    # Images section
+    story.append(Paragraph("Image Analysis", heading_style))
+
+    # Add original image as a print-resolution JPEG
+    story.append(Paragraph("Original Image:", normal_style))
+    if original_image is not None:
+        orig_img = RLImage(print_image(original_image, 3, 3), width=3*inch, height=3*inch)
+        story.append(orig_img)
+    else:
+        story.append(Paragraph("Original image was not retained for this analysis.", normal_style))
+    story.append(Spacer(1, 12))
+
+    # Add Grad-CAM if available
+    if gradcam_image is not None:
+        story.append(Paragraph("Grad-CAM Heatmap Analysis:", normal_style))
+        gradcam_img = RLImage(print_image(gradcam_image, 3, 3), width=3*inch, height=3*inch)
+        story.append(gradcam_img)
+
+    # Footer
+    story.append(Spacer(1, 20))
+    footer_style = ParagraphStyle(
+        'Footer',
+        parent=styles['Normal'],
+        fontSize=9,
+        alignment=TA_CENTER,
+        textColor=colors.grey
+    )
+    story.append(Paragraph("Generated by Otoscopy AI Analysis System", footer_style))
+
+    # Build PDF
+    doc.build(story)
+    buffer.seek(0)
+    return buffer
+
+def create_batch_pdf_report(cases):
+    """Create a comprehensive PDF report for all cases
+
+    cases is a list of {"result", "original_path", "gradcam_path"} dicts.
+    Case images are written as print-resolution JPEGs to a temporary directory
+    and referenced lazily, so ReportLab only loads each one while drawing its
+    page and memory stays flat however many cases there are.
+    """
+    with tempfile.TemporaryDirectory(prefix="batch_report_") as image_dir:
+        return _build_batch_pdf_report(cases, image_dir)
+
+def _lazy_print_image(image, path, width_in, height_in):
+    with open(path, "wb") as f:
+        f.write(print_image(image, width_in, height_in).getvalue())
+    return RLImage(path, width=width_in*inch, height=height_in*inch, lazy=2)
+
+def _build_batch_pdf_report(cases, image_dir):
+    results = [case["result"] for case in cases]
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=0.5*inch, bottomMargin=0.5*inch)
+
+    styles = getSampleStyleSheet()
+    title_style = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=18,
+        spaceAfter=16,
+        alignment=TA_CENTER,
+        textColor=colors.HexColor('#1f2937')
+    )
+
+    heading_style = ParagraphStyle(
+        'CustomHeading',
+        parent=styles['Heading2'],
+        fontSize=14,
+        spaceAfter=8,
+        textColor=colors.HexColor('#374151')
+    )
+
+    story = []
+
+    # Title page
+    story.append(Paragraph("Batch Otoscopy AI Analysis Report", title_style))
+    story.append(Spacer(1, 20))
+
+    # Summary statistics
+    total_cases = len(results)
+    urgent_cases = sum(1 for r in results if r.get("referral", "").lower() == "urgent")
+    routine_cases = sum(1 for r in results if r.get("referral", "").lower() == "routine")
+    no_referral_cases = total_cases - urgent_cases - routine_cases
+
+    story.append(Paragraph("Batch Summary", heading_style))
+    summary_data = [
+        ['Total Cases Analyzed:', str(total_cases)],
+        ['Urgent Referrals:', str(urgent_cases)],
+        ['Routine Referrals:', str(routine_cases)],
+        ['No Referral Needed:', str(no_referral_cases)],
+        ['Analysis Date:', datetime.now().strftime('%Y-%m-%d %H:%M:%S')]
+    ]
+
+    summary_table = Table(summary_data, colWidths=[2.5*inch, 2*inch])
+    summary_table.setStyle(TableStyle([
+        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 12),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+        ('GRID', (0, 0), (-1, -1), 1, colors.lightgrey),
+    ]))
+    story.append(summary_table)
+    story.append(Spacer(1, 30))
+
+    # Individual case details
+    for i, case in enumerate(cases):
+        result = case["result"]
+        if i > 0:
+            story.append(Spacer(1, 20))
+
+        filename = result.get("filename") or result.get("analysis_id", "")
+        story.append(Paragraph(f"Case {i+1}: {filename}", heading_style))
+
+        # Case results table
+        primary_pred = result.get("stage1_prediction", "Unknown")
+        primary_conf = result.get("stage1_probabilities", {}).get(primary_pred, 0) * 100
+        referral = result.get("referral", "Unknown")
+
+        case_data = [
+            ['Primary Classification:', primary_pred],
+            ['Confidence:', f'{primary_conf:.1f}%'],
+            ['Referral:', referral]
+        ]
+
+        if "stage2_prediction" in result:
+            secondary_pred = result["stage2_prediction"]
+            secondary_conf = result["stage2_probabilities"][secondary_pred] * 100
+            case_data.insert(-1, ['Secondary Classification:', secondary_pred])
+            case_data.insert(-1, ['Secondary Confidence:', f'{secondary_conf:.1f}%'])
+
+        case_table = Table(case_data, colWidths=[2*inch, 3*inch])
+        case_table.setStyle(TableStyle([
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 10),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
+        ]))
+        story.append(case_table)
+
+        # Original image and Grad-CAM side by side
+        image_row = []
+        for kind in ("original", "gradcam"):
+            path = case.get(f"{kind}_path")
+            if path and os.path.exists(path):
+                with Image.open(path) as image:
+                    image_row.append(_lazy_print_image(image, os.path.join(image_dir, f"{i}_{kind}.jpg"), 2.5, 2.5))
+
+        if image_row:
+            story.append(Spacer(1, 8))
+            story.append(Table([image_row], colWidths=[3*inch] * len(image_row)))
+        else:
+            story.append(Paragraph(f"Images not retained for {filename}", styles['Normal']))
+
+    # Build PDF
+    doc.build(story)
+    buffer.seek(0)
+    return buffer
+
+
+def render_report_file(cases, out_path):
+    """Render a single- or multi-case report to out_path (runs in a worker process)
+
+    Writes to a temporary name first so a half-written PDF is never served.
+    """
+    if len(cases) == 1:
+        case = cases[0]
+        images = []
+        for kind in ("original", "gradcam"):
+            path = case.get(f"{kind}_path")
+            images.append(Image.open(path) if path and os.path.exists(path) else None)
+        result = case["result"]
+        buffer = create_pdf_report(result, images[0], images[1], result.get("filename") or result.get("analysis_id"))
+    else:
+        buffer = create_batch_pdf_report(cases)
+
+    tmp_path = f"{out_path}.part"
+    with open(tmp_path, "wb") as f:
+        f.write(buffer.getvalue())
+    os.replace(tmp_path, out_path)
+    return out_path
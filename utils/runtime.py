@@ -0,0 +1,134 @@
+import json
+import os
+
+# Settings, lowest precedence first: these defaults, then the JSON file named by
+# EARSCOPE_RUNTIME_CONFIG, then EARSCOPE_<NAME> environment variables.
+DEFAULTS = {
+    "workers": 2,              # serve.py worker processes
+    "intra_op_threads": 0,     # torch threads per inference call; 0 = cores / inference_workers
+    "inter_op_threads": 1,     # torch inter-op pool; the models have no parallel branches
+    "inference_workers": 1,    # images in flight per worker process; model passes still take turns
+    "report_workers": 2,       # PDF rendering processes
+    "pin_cores": "off",        # "off", "auto" (split cores between workers) or "0-3;4-7" per worker
+}
+CONFIG_ENV = "EARSCOPE_RUNTIME_CONFIG"
+
+# Effective settings of this process once apply() has run
+effective = None
+
+def load_settings(path=None):
+    settings = dict(DEFAULTS)
+    path = path or os.environ.get(CONFIG_ENV)
+    if path:
+        with open(path) as f:
+            overrides = json.load(f)
+        unknown = set(overrides) - set(DEFAULTS)
+        if unknown:
+            raise ValueError(f"Unknown runtime settings in {path}: {', '.join(sorted(unknown))}")
+        settings.update(overrides)
+    for name, default in DEFAULTS.items():
+        value = os.environ.get(f"EARSCOPE_{name.upper()}")
+        if value is not None:
+            settings[name] = type(default)(value)
+    return settings
+
+# ------------------------
+# CPU topology
+# ------------------------
+def parse_cpu_list(text):
+    """"0-3,8,10-11" -> [0, 1, 2, 3, 8, 10, 11]"""
+    cpus = []
+    for part in text.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        lo, _, hi = part.partition("-")
+        cpus.extend(range(int(lo), int(hi or lo) + 1))
+    return cpus
+
+def available_cpus():
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+def _read(path):
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+def core_of(cpu):
+    """(package, core) a logical CPU belongs to; hyperthread siblings share it"""
+    base = f"/sys/devices/system/cpu/cpu{cpu}/topology"
+    package, core = _read(f"{base}/physical_package_id"), _read(f"{base}/core_id")
+    return (package, core) if core is not None else (None, cpu)
+
+def physical_cores(cpus=None):
+    """Number of physical cores among cpus (default: those this process may run on)"""
+    return len({core_of(cpu) for cpu in (cpus or available_cpus())})
+
+def numa_order(cpus):
+    """cpus grouped by NUMA node, then by core, so contiguous slices stay node- and core-local"""
+    node_of = {}
+    nodes = os.listdir("/sys/devices/system/node") if os.path.isdir("/sys/devices/system/node") else []
+    for node in nodes:
+        if node.startswith("node") and node[4:].isdigit():
+            for cpu in parse_cpu_list(_read(f"/sys/devices/system/node/{node}/cpulist") or ""):
+                node_of[cpu] = int(node[4:])
+
+    def key(cpu):
+        package, core = core_of(cpu)
+        return node_of.get(cpu, 0), str(package), int(core), cpu
+
+    return sorted(cpus, key=key)
+
+def worker_cpus(pin_cores, worker_index, worker_count, cpus=None):
+    """CPUs a worker should be pinned to, or None to leave affinity alone"""
+    cpus = cpus or available_cpus()
+    if pin_cores == "off":
+        return None
+    if pin_cores == "auto":
+        if worker_count <= 1:
+            return None
+        ordered = numa_order(cpus)
+        share = len(ordered) // worker_count
+        if share == 0:
+            return None
+        return ordered[worker_index * share:(worker_index + 1) * share]
+    groups = [g for g in pin_cores.split(";") if g.strip()]
+    return parse_cpu_list(groups[worker_index % len(groups)])
+
+# ------------------------
+# Apply
+# ------------------------
+def apply(settings, worker_index=0, worker_count=1):
+    """Pin this process and size torch's thread pools; returns the effective settings
+
+    Call once per process before any inference: torch only accepts the
+    inter-op thread count before its first parallel work.
+    """
+    global effective
+    import torch
+
+    pinned = worker_cpus(settings["pin_cores"], worker_index, worker_count)
+    if pinned and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, pinned)
+    cpus = available_cpus()
+
+    intra = settings["intra_op_threads"]
+    if intra <= 0:
+        cores = physical_cores(cpus)
+        if not pinned:
+            cores //= max(1, worker_count)  # the other workers run on the same cores
+        intra = max(1, cores // max(1, settings["inference_workers"]))
+    torch.set_num_threads(intra)
+    try:
+        torch.set_num_interop_threads(settings["inter_op_threads"])
+    except RuntimeError:
+        pass  # already fixed for this process (set earlier, or parallel work has run)
+
+    effective = dict(settings, intra_op_threads=torch.get_num_threads(),
+                     inter_op_threads=torch.get_num_interop_threads(),
+                     worker_index=worker_index, worker_count=worker_count, cpus=cpus)
+    return effective
@@ -0,0 +1,151 @@
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+# Retry-After bounds in seconds for rejected requests
+RETRY_AFTER_MIN = 1
+RETRY_AFTER_MAX = 60
+
+class Rejected(Exception):
+    """A request turned away before any work was done, so the client may safely retry it"""
+
+    def __init__(self, status_code, detail, retry_after):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+class Queue:
+    def __init__(self, name, weight, max_pending, client_limit, address_limit):
+        self.name = name
+        self.weight = weight
+        self.max_pending = max_pending      # requests admitted at once (waiting or running)
+        self.client_limit = client_limit    # of which from one client
+        self.address_limit = address_limit  # of which from all clients at one address
+        self.waiters = deque()
+        self.pass_value = 0.0
+        self.admitted = 0
+        self.clients = {}
+        self.addresses = {}
+        self.request_s = None  # moving average of admitted request duration
+
+class Scheduler:
+    """Admission control and weighted fair sharing of inference slots between queues
+
+    A request is admitted to its queue once (admit/leave), which enforces the
+    queue's depth, per-client and per-address limits, and then takes a slot per unit of work
+    with slot(). While slots are contended the queue with the lowest pass value
+    goes next and its pass advances by 1/weight (stride scheduling): a queue with
+    weight 8 gets eight slots for each one of a weight-1 queue, and an idle
+    queue's share goes to the others. Not thread-safe; use from one event loop.
+    """
+
+    def __init__(self, slots, queues):
+        self.slots = slots
+        self.free = slots
+        self.queues = {name: Queue(name, **config) for name, config in queues.items()}
+        self.virtual_time = 0.0
+
+    # ------------------------
+    # Admission
+    # ------------------------
+    def retry_after(self, queue):
+        estimate = queue.request_s if queue.request_s is not None else RETRY_AFTER_MIN
+        return max(RETRY_AFTER_MIN, min(RETRY_AFTER_MAX, math.ceil(estimate)))
+
+    def admit(self, name, client, address):
+        """Admit one request or raise Rejected (429 over the client's or address's limit, 503 when full)
+
+        client identifies the caller within its address; clients at one
+        address share that address's limit however many there are.
+        """
+        queue = self.queues[name]
+        if queue.clients.get((address, client), 0) >= queue.client_limit:
+            raise Rejected(429, f"Too many concurrent {name} requests from this client", self.retry_after(queue))
+        if queue.addresses.get(address, 0) >= queue.address_limit:
+            raise Rejected(429, f"Too many concurrent {name} requests from this address", self.retry_after(queue))
+        if queue.admitted >= queue.max_pending:
+            raise Rejected(503, f"The {name} queue is full, retry later", self.retry_after(queue))
+        queue.admitted += 1
+        queue.clients[(address, client)] = queue.clients.get((address, client), 0) + 1
+        queue.addresses[address] = queue.addresses.get(address, 0) + 1
+        return name, (address, client), time.monotonic()
+
+    def leave(self, ticket):
+        name, key, start = ticket
+        queue = self.queues[name]
+        queue.admitted -= 1
+        for counts, k in ((queue.clients, key), (queue.addresses, key[0])):
+            remaining = counts[k] - 1
+            if remaining:
+                counts[k] = remaining
+            else:
+                del counts[k]
+        elapsed = time.monotonic() - start
+        queue.request_s = elapsed if queue.request_s is None else 0.8 * queue.request_s + 0.2 * elapsed
+
+    # ------------------------
+    # Slots
+    # ------------------------
+    @asynccontextmanager
+    async def slot(self, name):
+        """Hold one inference slot; yields the seconds spent waiting for it"""
+        queue = self.queues[name]
+        start = time.monotonic()
+        if self.free > 0 and not any(q.waiters for q in self.queues.values()):
+            self.free -= 1
+        else:
+            if not queue.waiters:
+                # A queue that was idle starts level with the others instead of spending saved-up credit
+                queue.pass_value = max(queue.pass_value, self.virtual_time)
+            waiter = asyncio.get_running_loop().create_future()
+            queue.waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    self._release()  # granted just as the request was cancelled
+                else:
+                    queue.waiters.remove(waiter)
+                raise
+        try:
+            yield time.monotonic() - start
+        finally:
+            self._release()
+
+    def _release(self):
+        while True:
+            ready = [q for q in self.queues.values() if q.waiters]
+            if not ready:
+                self.free += 1
+                return
+            queue = min(ready, key=lambda q: q.pass_value)
+            waiter = queue.waiters.popleft()
+            if waiter.done():
+                continue  # cancelled while queued
+            self.virtual_time = queue.pass_value
+            queue.pass_value += 1 / queue.weight
+            waiter.set_result(None)
+            return
+
+    def stats(self):
+        return {
+            "slots": self.slots,
+            "free_slots": self.free,
+            "queues": {
+                name: {
+                    "weight": q.weight,
+                    "waiting": len(q.waiters),
+                    "admitted": q.admitted,
+                    "max_pending": q.max_pending,
+                    "clients": len(q.clients),
+                    "client_limit": q.client_limit,
+                    "addresses": len(q.addresses),
+                    "address_limit": q.address_limit,
+                    "request_s": round(q.request_s, 3) if q.request_s is not None else None,
+                }
+                for name, q in self.queues.items()
+            },
+        }